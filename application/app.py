@@ -1,6 +1,7 @@
 import os
 from pathlib import Path # For robust path manipulation
 import logging # For better logging
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import HTMLResponse, FileResponse
@@ -10,7 +11,11 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi import UploadFile, File
 
 # Import database components
-from application.database.database import Base, engine 
+from application.database.database import Base, engine, create_fulltext_index
+from application.database.models import ensure_category_closure, ensure_category_listing_counts, ensure_listing_sort_keys, ensure_listing_tags, ensure_search_suggestions, ensure_listing_terms, ensure_listing_term_postings, ensure_listing_availability, ensure_table_versions
+from application.search_engine import SEARCH_ENGINE_ENABLED, build_search_engine
+from application.view_counter import view_counter
+from application.trending import ensure_trending, trending_recorder
 
 # Import routers
 from application.router import search
@@ -34,11 +39,103 @@ except Exception as e:
     logger.error(f"Error during Base.metadata.create_all: {e}")
     # Depending on the error, you might want to raise it or handle it.
 
+# --- Ensure the listing full-text index exists ---
+# create_all only fires the index DDL for a freshly created listings table,
+# so databases created before the index existed get it here.
+create_fulltext_index(engine)
+
+# --- Ensure the listing sort-key columns exist ---
+# Listings tables created before sort=price_asc/.../seller_rating lack the columns and indexes behind them.
+try:
+    ensure_listing_sort_keys(engine)
+except Exception as e:
+    logger.error(f"Error adding the listing sort-key columns, sorted searches will fail: {e}")
+
+# --- Ensure the ETag versions exist ---
+# Listings tables created before conditional GET lack listings.revision, which every listing query reads.
+try:
+    ensure_table_versions(engine)
+except Exception as e:
+    logger.error(f"Error adding the listing revision column, listing queries will fail: {e}")
+
+# --- Ensure the listing tag tables are filled ---
+# Listings created before listing_tags existed have keywords but no tag rows yet.
+try:
+    ensure_listing_tags(engine)
+except Exception as e:
+    logger.error(f"Error filling the listing tag tables, tag searches may miss listings: {e}")
+
+# --- Ensure the search suggestions table is filled ---
+# Listings and categories created before search_suggestions existed are not suggested yet.
+try:
+    ensure_search_suggestions(engine)
+except Exception as e:
+    logger.error(f"Error filling the search suggestions, /api/search/suggest may miss completions: {e}")
+
+# --- Ensure the listing vocabulary is filled ---
+# Approved listings created before listing_terms existed are missing from fuzzy search corrections.
+try:
+    ensure_listing_terms(engine)
+except Exception as e:
+    logger.error(f"Error filling the listing vocabulary, fuzzy searches may miss corrections: {e}")
+
+# --- Ensure every listing has its term postings ---
+# Listings created before listing_term_postings existed are missing from relevance searches without the engine.
+try:
+    ensure_listing_term_postings(engine)
+except Exception as e:
+    logger.error(f"Error filling the listing term postings, relevance searches may miss listings: {e}")
+
+# --- Ensure listings with a free-text availability have availability slots ---
+# Listings created before listing_availability existed (and seed data) only have the text.
+try:
+    ensure_listing_availability(engine)
+except Exception as e:
+    logger.error(f"Error filling the listing availability slots, available_at searches may miss listings: {e}")
+
+# --- Ensure the category closure table is filled ---
+# Categories created before the table existed have no ancestor/descendant rows yet.
+try:
+    ensure_category_closure(engine)
+except Exception as e:
+    logger.error(f"Error filling the category closure table, subtree searches may miss listings: {e}")
+
+# --- Ensure every category has an approved listing counter ---
+# Counters are maintained on every listing write; this backfills them for databases that predate them.
+try:
+    ensure_category_listing_counts(engine)
+except Exception as e:
+    logger.error(f"Error filling the category listing counts, /api/categories may report zero listings: {e}")
+
+# --- Recompute the trending rankings from the recent activity buckets ---
+# Needs the closure table above; also prunes buckets that fell out of the trending window.
+try:
+    ensure_trending(engine)
+except Exception as e:
+    logger.error(f"Error rebuilding the trending listings, /api/listings/trending may be stale: {e}")
+
+# --- Build the optional in-memory search engine (SEARCH_ENGINE=memory) ---
+if SEARCH_ENGINE_ENABLED:
+    try:
+        build_search_engine(engine)
+    except Exception as e:
+        logger.error(f"Error building the in-memory search engine, searching the database instead: {e}")
+
+# --- Background work tied to the server's lifetime ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    view_counter.start() # Writes buffered listing views every VIEW_FLUSH_INTERVAL_SECONDS
+    trending_recorder.start() # Writes listing activity buckets every TRENDING_FLUSH_INTERVAL_SECONDS
+    yield
+    view_counter.stop() # Writes the views counted since the last flush
+    trending_recorder.stop()
+
 # --- Create FastAPI app ---
 app = FastAPI(
     title="Agora API",
     description="SFSU Community Marketplace API",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # --- Add CORS middleware ---
@@ -0,0 +1,83 @@
+# application/availability.py
+"""
+Weekly availability of skill listings.
+
+A slot is (day_of_week, start_minute, end_minute): Monday is day 0 and minutes count from midnight,
+so 'Tuesday 18:00-21:00' is (1, 1080, 1260). Slots never cross midnight; a range that does is
+stored as two slots. Sellers can send slots directly (ListingCreate.availability_slots); otherwise
+they are read from the free-text `availability` ("Tuesday and Thursday evenings", "Weekends") by
+parse_availability. Searches with available_at match them through the listing_availability index.
+"""
+import re
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+MINUTES_PER_DAY = 24 * 60
+
+DAY_NAMES = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+_DAY_WORDS = {
+    **{name: (day,) for day, name in enumerate(DAY_NAMES)},
+    **{name[:3]: (day,) for day, name in enumerate(DAY_NAMES)},
+    "tues": (1,), "thur": (3,), "thurs": (3,),
+    "weekday": (0, 1, 2, 3, 4), "weekdays": (0, 1, 2, 3, 4),
+    "weekend": (5, 6), "weekends": (5, 6),
+    "daily": tuple(range(7)), "everyday": tuple(range(7)),
+}
+# Parts of the day a free-text availability may name, as (start_minute, end_minute)
+_PERIOD_WORDS = {
+    "morning": (6 * 60, 12 * 60), "mornings": (6 * 60, 12 * 60),
+    "afternoon": (12 * 60, 17 * 60), "afternoons": (12 * 60, 17 * 60),
+    "evening": (17 * 60, 22 * 60), "evenings": (17 * 60, 22 * 60),
+    "night": (20 * 60, MINUTES_PER_DAY), "nights": (20 * 60, MINUTES_PER_DAY),
+}
+
+Slot = Tuple[int, int, int] # (day_of_week, start_minute, end_minute)
+
+
+def parse_availability(text: Optional[str]) -> List[Slot]:
+    """
+    Best-effort slots for a free-text availability: the named days (every day if none) at the named
+    parts of the day (all day if none). Text naming neither ("By appointment") gives no slots.
+    """
+    days, periods = [], []
+    for word in re.findall(r"[a-z]+", (text or "").lower()):
+        days.extend(_DAY_WORDS.get(word, ()))
+        if word in _PERIOD_WORDS:
+            periods.append(_PERIOD_WORDS[word])
+    if not days and not periods:
+        return []
+    days = sorted(set(days)) or list(range(7))
+    periods = sorted(set(periods)) or [(0, MINUTES_PER_DAY)]
+    return [(day, start, end) for day in days for start, end in periods]
+
+
+def normalize_slots(slots: Iterable[Slot]) -> List[Slot]:
+    """Validated, sorted, de-duplicated slots. Raises ValueError for a day or minute out of range, or an empty range."""
+    normalized = set()
+    for day, start, end in slots:
+        if not 0 <= day < 7 or not 0 <= start < end <= MINUTES_PER_DAY:
+            raise ValueError(f"Invalid availability slot ({day}, {start}, {end})")
+        normalized.add((day, start, end))
+    return sorted(normalized)
+
+
+def parse_available_at(value: str) -> Tuple[int, int]:
+    """
+    (day_of_week, minute) of an available_at value: a day and a time ('tue 18:30', 'Tuesday 6:30')
+    or an ISO datetime ('2025-05-06T18:30'). Raises ValueError otherwise.
+    """
+    value = value.strip()
+    match = re.fullmatch(r"([A-Za-z]+)\s+(\d{1,2}):(\d{2})", value)
+    if match:
+        days = _DAY_WORDS.get(match.group(1).lower())
+        hour, minute = int(match.group(2)), int(match.group(3))
+        if days and len(days) == 1 and hour < 24 and minute < 60:
+            return days[0], hour * 60 + minute
+    else:
+        try:
+            moment = datetime.fromisoformat(value)
+        except ValueError:
+            pass
+        else:
+            return moment.weekday(), moment.hour * 60 + moment.minute
+    raise ValueError(f"Invalid available_at '{value}'. Use a day and time like 'tue 18:30', or an ISO datetime.")
@@ -0,0 +1,157 @@
+# application/cache.py
+"""
+In-process caching helpers.
+
+- TTLCache: a thread-safe LRU cache whose entries also expire after a fixed TTL
+  (or never, for keys that change with the data, such as table versions).
+  Every instance registers itself so its hit/miss statistics can be reported
+  (see GET /api/admin/cache-stats).
+- Generation counters: a cheap way to invalidate everything derived from a table.
+  Writers bump the counter for the table they changed; readers include the current
+  generation in their cache keys, so stale entries simply stop being looked up and
+  age out of the LRU.
+- SingleFlight: coalesces concurrent cache misses for one key into a single load whose
+  result every waiting caller shares.
+
+Caches and counters live in the worker process. With several gunicorn workers, a write
+handled by one worker is only seen by the others once their entries expire, so the TTL
+is the upper bound on staleness across workers.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+_MISSING = object()
+
+# --- Generation Counters ---
+_generations: Dict[str, int] = {}
+_generations_lock = threading.Lock()
+
+def get_generation(name: str) -> int:
+    """Current generation of `name` (e.g. 'listings')."""
+    return _generations.get(name, 0)
+
+def bump_generation(name: str) -> int:
+    """Invalidate everything cached under the current generation of `name`."""
+    with _generations_lock:
+        _generations[name] = _generations.get(name, 0) + 1
+        return _generations[name]
+
+
+# --- LRU + TTL Cache ---
+_registry: Dict[str, "TTLCache"] = {}
+
+class TTLCache:
+    """Thread-safe LRU cache with a per-entry time-to-live; ttl=None keeps entries until the LRU evicts them."""
+
+    def __init__(self, name: str, maxsize: int = 256, ttl: Optional[float] = 60.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict() # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        _registry[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return # Caching disabled
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl if self.ttl is not None else None, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight:
+    """
+    Runs at most one load per key at a time. The first caller for a key runs the load; callers
+    arriving while it runs wait for it and get its result (or its exception) instead of loading again.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.shared = 0 # Callers served by another caller's load
+
+    def do(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.loads += 1
+            else:
+                self.shared += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = load()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+def get_cache(name: str) -> Optional[TTLCache]:
+    return _registry.get(name)
+
+def all_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Statistics for every TTLCache created in this worker."""
+    return {name: cache.stats() for name, cache in _registry.items()}
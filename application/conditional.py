@@ -0,0 +1,61 @@
+# application/conditional.py
+"""
+Conditional GET: ETag and Last-Modified validators and 304 Not Modified responses.
+
+Endpoints compute their validators from cheap reads (a listing's revision, the table versions of
+models.TableVersion) before loading or serializing anything, and answer a client whose cached copy is
+still current with an empty 304. ETags are weak (W/"..."): bodies carry counters such as views_count
+that change without a new version, so two responses with one ETag are equivalent, not byte-identical.
+"""
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response, status
+
+
+def weak_etag(*parts) -> str:
+    return 'W/"' + "-".join(str(part) for part in parts) + '"'
+
+def http_date(moment: datetime) -> str:
+    """An HTTP-date (RFC 9110), e.g. 'Tue, 15 Nov 1994 08:12:31 GMT'. Naive datetimes are taken as UTC."""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return format_datetime(moment.astimezone(timezone.utc), usegmt=True)
+
+def _parse_http_date(value: str) -> Optional[datetime]:
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment is None:
+        return None
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether If-None-Match names `etag`, by weak comparison (a W/ prefix on either side is ignored)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any((tag[2:] if tag.startswith("W/") else tag) == opaque for tag in (tag.strip() for tag in header.split(",")))
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """
+    Whether the client's copy is current. If-None-Match decides when sent; If-Modified-Since is only
+    consulted without it, since HTTP-dates have one-second resolution.
+    """
+    if "if-none-match" in request.headers:
+        return etag_matches(request, etag)
+    since = _parse_http_date(request.headers.get("if-modified-since", ""))
+    if since is None or last_modified is None:
+        return False
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+def not_modified(headers: dict) -> Response:
+    """An empty 304 carrying the validators and Cache-Control of the response it stands for."""
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
@@ -1,17 +1,24 @@
 import os # Added for file deletion
+import json
+import base64
 from pathlib import Path # Added for file deletion
 from sqlalchemy.orm import Session, joinedload, selectinload # Import joinedload and selectinload
-from sqlalchemy import or_, case, desc # Import desc
-from typing import List, Optional, Dict, Any
+from sqlalchemy import or_, and_, case, desc, false, func, select, table, column, literal_column, type_coerce, String
+from sqlalchemy.dialects.mysql import match as mysql_match
+from typing import Iterator, List, Optional, Dict, Any, Tuple
 from datetime import datetime, timezone
 
-from . import models
+from . import models, listing_events
+from application import search_engine, trending
+from application.availability import normalize_slots, parse_availability
+from application.hyperloglog import HyperLogLog
+from .database import fulltext_available, FULLTEXT_SQLITE_TABLE, FULLTEXT_MIN_QUERY_LENGTH
 # Define Project Root for constructing absolute file paths for deletion
 PROJECT_ROOT_DIR = Path(__file__).resolve().parent.parent.parent
 # BACKEND_STATIC_DIR is PROJECT_ROOT_DIR / "static", image paths in DB are relative to this after /static/
 # e.g., /static/images/listings/listing_id/image.jpg
 
-from application.schemas import ListingCreate, CategoryCreate, UserMinimal, ListingMinimal, ConversationInboxItem, ReviewCreate # Import necessary schemas for potential type hinting or direct use
+from application.schemas import ListingCreate, SavedSearchCreate, CategoryCreate, UserMinimal, ListingMinimal, ConversationInboxItem, ReviewCreate # Import necessary schemas for potential type hinting or direct use
 
 # User operations
 def get_user_by_username(db: Session, username: str):
@@ -78,6 +85,31 @@ def get_categories(
     
     return query.order_by(models.Category.display_order).offset(skip).limit(limit).all()
 
+def get_category_listing_counts(db: Session, category_ids: Optional[List[int]] = None) -> Dict[int, Dict[str, int]]:
+    """
+    {category_id: {'listing_count', 'subtree_listing_count'}} of approved listings, read from the
+    maintained counters (see models.CategoryListingCount) rather than counted over listings.
+    Limited to `category_ids` when given.
+    """
+    counts = models.CategoryListingCount
+    closure = models.CategoryClosure
+    direct = select(counts.category_id, counts.approved_count)
+    subtree = (
+        select(closure.ancestor_id, func.sum(counts.approved_count))
+        .join(counts, counts.category_id == closure.descendant_id)
+        .group_by(closure.ancestor_id)
+    )
+    if category_ids is not None:
+        direct = direct.where(counts.category_id.in_(category_ids))
+        subtree = subtree.where(closure.ancestor_id.in_(category_ids))
+    result = {
+        category_id: {"listing_count": count, "subtree_listing_count": 0}
+        for category_id, count in db.execute(direct)
+    }
+    for category_id, total in db.execute(subtree):
+        result.setdefault(category_id, {"listing_count": 0})["subtree_listing_count"] = int(total or 0)
+    return result
+
 def get_category(db: Session, category_id: int) -> Optional[models.Category]:
     """
     Get a single category by ID.
@@ -94,87 +126,572 @@ def create_category(db: Session, category: CategoryCreate) -> models.Category:
     db.refresh(db_category)
     return db_category
 
+def get_category_tree(db: Session) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    The whole tree of active categories from one query, nested through `children` and split into
+    item categories ('items') and skill categories ('skills') by each root's is_skill_category.
+    Siblings are ordered by display_order, then name. Categories below an inactive one are left out.
+    """
+    rows = db.execute(
+        select(
+            models.Category.category_id, models.Category.name, models.Category.parent_id,
+            models.Category.display_order, models.Category.is_skill_category,
+        )
+        .where(models.Category.is_active == True)
+        .order_by(models.Category.display_order, models.Category.name, models.Category.category_id)
+    ).all()
+    nodes = {
+        row.category_id: {
+            "category_id": row.category_id, "name": row.name, "display_order": row.display_order,
+            "is_skill_category": row.is_skill_category, "children": [],
+        }
+        for row in rows
+    }
+    tree: Dict[str, List[Dict[str, Any]]] = {"items": [], "skills": []}
+    for row in rows: # Already in sibling order, so appending keeps every children list sorted
+        if row.parent_id is None:
+            tree["skills" if row.is_skill_category else "items"].append(nodes[row.category_id])
+        elif row.parent_id in nodes:
+            nodes[row.parent_id]["children"].append(nodes[row.category_id])
+    return tree
+
 # Listing operations
-def get_listings(
-    db: Session, 
-    skip: int = 0, 
-    limit: int = 20,
+def _search_filter(db: Session, search: str):
+    """
+    Filter clause matching `search` against title, description or search_keywords.
+    Uses the full-text index (see database.create_fulltext_index) when the backend has one
+    and the query is long enough for it; otherwise falls back to ILIKE scans.
+    """
+    bind = db.get_bind()
+    if len(search.strip()) >= FULLTEXT_MIN_QUERY_LENGTH and fulltext_available(bind):
+        if bind.dialect.name == "sqlite":
+            # Quoted phrase: the trigram tokenizer turns it into a substring match
+            fts_table = table(FULLTEXT_SQLITE_TABLE, column("rowid"))
+            phrase = '"' + search.replace('"', '""') + '"'
+            return models.Listing.listing_id.in_(
+                select(fts_table.c.rowid).where(literal_column(FULLTEXT_SQLITE_TABLE).op("MATCH")(phrase))
+            )
+        if bind.dialect.name == "mysql":
+            phrase = '"' + search.replace('"', ' ') + '"'
+            return mysql_match(
+                models.Listing.title, models.Listing.description, models.Listing.search_keywords,
+                against=phrase
+            ).in_boolean_mode()
+
+    search_term = f"%{search}%"
+    return or_(
+        models.Listing.title.ilike(search_term),
+        models.Listing.description.ilike(search_term),
+        models.Listing.search_keywords.ilike(search_term)
+    )
+
+# Orders that ignore where the search text matched: sort name -> sort keys, each ending in listing_id so
+# the order is total. Every one is a range scan of a (status, key, listing_id) index on listings.
+SEARCH_SORT_KEYS = {
+    "price_asc": [(models.Listing.effective_price, False), (models.Listing.listing_id, False)],
+    "price_desc": [(models.Listing.effective_price, True), (models.Listing.listing_id, True)],
+    # created_at compared as stored, like the default order (see _listing_search_query)
+    "newest": [(type_coerce(models.Listing.created_at, String), True), (models.Listing.listing_id, True)],
+    "views": [(models.Listing.views_count, True), (models.Listing.listing_id, True)],
+    "seller_rating": [(models.Listing.seller_rating, True), (models.Listing.listing_id, True)],
+}
+# Search orders besides the default (title matches first, then newest)
+SEARCH_SORTS = (search_engine.SORT_RELEVANCE, *SEARCH_SORT_KEYS)
+# Shapes of a search result: full Listing objects, or compact hits (schemas.SearchHit)
+SEARCH_VIEW_FULL = "full"
+SEARCH_VIEW_COMPACT = "compact"
+SEARCH_VIEWS = (SEARCH_VIEW_FULL, SEARCH_VIEW_COMPACT)
+
+def _search_hit_columns():
+    """
+    Columns of a compact search hit (schemas.SearchHit). The seller's username needs a join with users;
+    the thumbnail is a correlated subquery on listing_images (primary image first).
+    """
+    thumbnail = (
+        select(models.ListingImage.thumbnail_path)
+        .where(models.ListingImage.listing_id == models.Listing.listing_id)
+        .order_by(models.ListingImage.is_primary.desc(), models.ListingImage.display_order, models.ListingImage.image_id)
+        .limit(1)
+        .correlate(models.Listing)
+        .scalar_subquery()
+    )
+    return [
+        models.Listing.listing_id,
+        models.Listing.title,
+        models.Listing.price,
+        models.Listing.rate,
+        models.Listing.rate_type,
+        models.Listing.item_condition,
+        models.Listing.is_skill_sharing,
+        thumbnail.label("thumbnail_path"),
+        models.User.username.label("seller_username"),
+    ]
+
+# Many-to-one relationships serialized by schemas.Listing, joined into the page query instead of
+# lazy-loaded per listing (images are a collection; joining them would multiply the paged rows)
+_FULL_LISTING_OPTIONS = (
+    joinedload(models.Listing.seller),
+    joinedload(models.Listing.category),
+)
+
+def get_search_hits(db: Session, listing_ids: List[int]) -> List[Dict[str, Any]]:
+    """Compact search hits for `listing_ids`, in that order, from one Core select over listings and users."""
+    if not listing_ids:
+        return []
+    rows = db.execute(
+        select(*_search_hit_columns())
+        .join_from(models.Listing, models.User, models.Listing.seller_id == models.User.user_id)
+        .where(models.Listing.listing_id.in_(listing_ids))
+    ).mappings().all()
+    hits_by_id = {row["listing_id"]: dict(row) for row in rows}
+    return [hits_by_id[listing_id] for listing_id in listing_ids if listing_id in hits_by_id]
+
+def _term_group_matches(group: Tuple[str, ...]):
+    """
+    The listings using a term of `group` (a query term, or one with its spelling variants) as a whole word, each
+    scored with the summed weights of the fields its best term appears in (title > search_keywords > description,
+    see search_engine.FIELD_WEIGHTS): one index range of listing_term_postings per term.
+    Joined once per group, so a listing matches the same groups as in the engine. The scores are a degraded
+    stand-in for BM25 when the engine is off: no term frequency, rarity or length normalization, so the two
+    only agree on which fields matched; listings that tie fall back to newest first.
+    """
+    postings = models.ListingTermPosting
+    weight = sum(
+        case((postings.fields.op("&")(1 << bit) != 0, field_weight), else_=0)
+        for bit, field_weight in enumerate(search_engine.FIELD_WEIGHTS)
+    )
+    return (
+        select(postings.listing_id, func.max(weight).label("score"))
+        .where(postings.term.in_(group))
+        .group_by(postings.listing_id)
+        .subquery()
+    )
+
+def _listing_search_query(
+    db: Session,
     search: Optional[str] = None,
     category_id: Optional[int] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
     item_condition: Optional[str] = None,
-    is_skill_sharing: Optional[bool] = None, # Add skill sharing filter
-    status: Optional[str] = 'approved'  # Default to 'approved' status for general views
-) -> List[models.Listing]:
+    is_skill_sharing: Optional[bool] = None,
+    status: Optional[str] = 'approved',
+    sort: Optional[str] = None,
+    fuzzy: bool = False,
+    include_descendants: bool = False,
+    tags: Optional[List[str]] = None,
+    available_at: Optional[Tuple[int, int]] = None
+):
     """
-    Get listings with optional filtering and search.
-    Defaults to returning 'approved' listings for general public views.
-    Set status to None to get listings regardless of status (e.g., for admin).
+    Build the filtered listing query shared by the search functions, together with its sort keys.
+    Sort keys are (expression, descending) pairs: title matches first when searching,
+    then newest first, with listing_id as a tiebreaker so the order is total (needed for keyset paging).
+    With sort='relevance' the search is split into terms that must all match, ranked by a field-weighted score.
+    The sorts in SEARCH_SORT_KEYS (price, newest, views, seller rating) only filter by the search text.
+    fuzzy=True does the same, but a term the listings don't use also matches its close spellings
+    (see search_engine.expand_query).
+    include_descendants=True widens category_id to its whole subtree with one join on the category closure table.
+    tags keeps listings carrying every one of them, each an indexed lookup in listing_tags.
+    available_at=(day_of_week, minute) keeps listings with an availability slot covering that time
+    (see availability.parse_available_at), one index range of listing_availability.
+    Raises ValueError for an unknown sort.
     """
+    if sort is not None and sort not in SEARCH_SORTS:
+        raise ValueError(f"Unknown sort '{sort}'. Choose from: {', '.join(SEARCH_SORTS)}")
     query = db.query(models.Listing)
-    print(f"crud.get_listings: Initial query created.")
-    print(f"crud.get_listings: Received params: search='{search}', category_id={category_id}, status='{status}', is_skill_sharing={is_skill_sharing}")
 
     # Filter by status unless status is explicitly set to None
     if status is not None:
         query = query.filter(models.Listing.status == status)
-    
+
+    # created_at is compared as stored (no type processing) so keyset comparisons
+    # agree with ORDER BY even when rows use different datetime string formats on SQLite.
+    sort_keys = [
+        (type_coerce(models.Listing.created_at, String), True),
+        (models.Listing.listing_id, True),
+    ]
+
     # Apply search filter if provided
-    if search:
-        search_term = f"%{search}%"
-        query = query.filter(
-            or_(
-                models.Listing.title.ilike(search_term),
-                models.Listing.description.ilike(search_term),
-                models.Listing.search_keywords.ilike(search_term)
-            )
-        )
-        
+    terms = search_engine.tokenize(search) if sort == search_engine.SORT_RELEVANCE or fuzzy else []
+    if sort in SEARCH_SORT_KEYS:
+        sort_keys = list(SEARCH_SORT_KEYS[sort])
+        if search:
+            query = query.filter(_search_filter(db, search))
+    elif terms:
+        # Relevance and fuzzy: each term group's matches joined in, and their field weights added up as the score
+        groups = search_engine.expand_query(db, search).groups if fuzzy else [(term,) for term in terms]
+        score = 0
+        for group in dict.fromkeys(groups):
+            matched = _term_group_matches(group)
+            query = query.join(matched, matched.c.listing_id == models.Listing.listing_id)
+            score = score + matched.c.score
+        sort_keys.insert(0, (score, True))
+    elif search:
+        query = query.filter(_search_filter(db, search))
         # Prioritize matches in title
-        query = query.order_by(
-            case(
-                (models.Listing.title.ilike(search_term), 1),
-                else_=2
-            ),
-            models.Listing.created_at.desc()
+        title_rank = case(
+            (models.Listing.title.ilike(f"%{search}%"), 1),
+            else_=2
         )
-    else:
-        # Default sorting by creation date (newest first)
-        query = query.order_by(models.Listing.created_at.desc())
-    
+        sort_keys.insert(0, (title_rank, False))
+
     # Apply category filter if provided
-    if category_id:
+    if category_id and include_descendants:
+        # (ancestor_id, descendant_id) is the closure table's primary key, so this is an index range join
+        query = query.join(
+            models.CategoryClosure, models.CategoryClosure.descendant_id == models.Listing.category_id
+        ).filter(models.CategoryClosure.ancestor_id == category_id)
+    elif category_id:
         query = query.filter(models.Listing.category_id == category_id)
-    
+
+    # Apply tag filters if provided: one (tag, listing_id) index range per tag, intersected
+    for tag in dict.fromkeys(models.normalize_tag(tag) for tag in tags or ()):
+        query = query.filter(models.Listing.listing_id.in_(
+            select(models.ListingTag.listing_id).where(models.ListingTag.tag == tag)
+        ))
+
+    # Apply the availability filter if provided: slots of the day starting by the time, kept if they end after it
+    if available_at is not None:
+        day_of_week, minute = available_at
+        slots = models.ListingAvailability
+        query = query.filter(models.Listing.listing_id.in_(
+            select(slots.listing_id).where(slots.day_of_week == day_of_week, slots.start_minute <= minute, slots.end_minute > minute)
+        ))
+
     # Apply price range filters if provided
     if min_price is not None:
         query = query.filter(models.Listing.price >= min_price)
     if max_price is not None:
         query = query.filter(models.Listing.price <= max_price)
-    
+
     # Apply condition filter if provided
     if item_condition:
         query = query.filter(models.Listing.item_condition == item_condition)
-        
+
     # Apply skill sharing filter if provided (True or False)
     if is_skill_sharing is not None:
         query = query.filter(models.Listing.is_skill_sharing == is_skill_sharing)
-        print(f"crud.get_listings: Applied is_skill_sharing filter: {is_skill_sharing}")
-    
-    # Log the final query before pagination
+
+    return query, sort_keys
+
+def _order_by_sort_keys(query, sort_keys):
+    return query.order_by(*[expr.desc() if descending else expr.asc() for expr, descending in sort_keys])
+
+def _is_nullable(expr) -> bool:
+    return bool(getattr(getattr(expr, "expression", None), "nullable", False))
+
+def _keyset_predicate(sort_keys, values):
+    """
+    Rows strictly after `values` in the order given by `sort_keys`, i.e. the expanded form of
+    (k1, k2, ...) > (v1, v2, ...) with per-key direction.
+    NULLs of nullable columns sort first ascending and last descending, as on SQLite and MySQL.
+    """
+    predicate = None
+    for (expr, descending), value in reversed(list(zip(sort_keys, values))):
+        if value is None:
+            after, same = (false() if descending else expr.isnot(None)), expr.is_(None)
+        else:
+            after, same = (expr < value if descending else expr > value), expr == value
+            if descending and _is_nullable(expr):
+                after = or_(after, expr.is_(None))
+        predicate = after if predicate is None else or_(after, and_(same, predicate))
+    return predicate
+
+def encode_search_cursor(values: List[Any], total: Optional[int] = None, count_limit: Optional[int] = None) -> str:
+    """
+    Encode a row's sort-key values as an opaque cursor string.
+    The search total is carried along so following pages don't have to count again, with the
+    count_limit it was counted under (a total above it is capped, not exact).
+    """
+    payload = {"k": [{"dt": v.isoformat()} if isinstance(v, datetime) else v for v in values], "t": total, "l": count_limit}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_search_cursor(cursor: str) -> Tuple[List[Any], Optional[int], Optional[int]]:
+    """
+    Decode a cursor produced by encode_search_cursor into (sort-key values, total, count_limit).
+    Raises ValueError if it is malformed.
+    """
     try:
-        print(f"crud.get_listings: Final query before pagination and execution: {query.statement.compile(compile_kwargs={'literal_binds': True})}")
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
     except Exception as e:
-        print(f"crud.get_listings: Could not compile query for logging: {e}")
+        raise ValueError("Invalid search cursor") from e
+    if not isinstance(payload, dict) or not isinstance(payload.get("k"), list):
+        raise ValueError("Invalid search cursor")
+    total, count_limit = payload.get("t"), payload.get("l")
+    if any(value is not None and not isinstance(value, int) for value in (total, count_limit)):
+        raise ValueError("Invalid search cursor")
+    values = []
+    for value in payload["k"]:
+        if isinstance(value, dict) and isinstance(value.get("dt"), str):
+            value = datetime.fromisoformat(value["dt"])
+        elif value is not None and not isinstance(value, (str, int, float)):
+            raise ValueError("Invalid search cursor")
+        values.append(value)
+    return values, total, count_limit
+
+def _supports_window_functions(db: Session) -> bool:
+    """COUNT(*) OVER () needs SQLite 3.25+ or MySQL 8.0+ (MariaDB 10.2+)."""
+    dialect = db.get_bind().dialect
+    version = dialect.server_version_info or ()
+    if dialect.name == "sqlite":
+        return version >= (3, 25)
+    if dialect.name == "mysql":
+        return version >= ((10, 2) if getattr(dialect, "is_mariadb", False) else (8, 0))
+    return False
+
+def _count_query(query, count_limit: Optional[int] = None):
+    """
+    SELECT COUNT of the rows of `query`; with count_limit, of at most count_limit + 1 of them
+    (a LIMITed subquery), so counting a broad search stops early instead of visiting every match.
+    """
+    ids = query.with_entities(models.Listing.listing_id)
+    if count_limit is None:
+        return ids.with_entities(func.count(models.Listing.listing_id))
+    return select(func.count()).select_from(ids.limit(count_limit + 1).subquery())
 
-    results_before_pagination = query.all()
-    print(f"crud.get_listings: Found {len(results_before_pagination)} results BEFORE pagination. First 5: {[(r.listing_id, r.title, r.status, r.is_skill_sharing) for r in results_before_pagination[:5]]}")
+def _count_matches(db: Session, query, count_limit: Optional[int] = None) -> int:
+    if count_limit is None:
+        return query.with_entities(models.Listing.listing_id).count()
+    return db.execute(_count_query(query, count_limit)).scalar()
 
-    paginated_results = query.offset(skip).limit(limit).all()
+def search_listings(
+    db: Session,
+    limit: int = 20,
+    skip: int = 0,
+    cursor: Optional[str] = None,
+    view: str = SEARCH_VIEW_FULL,
+    count_limit: Optional[int] = None,
+    **filters
+) -> Tuple[List[Any], int, Optional[str]]:
+    """
+    Execute a listing search: one page of results plus the total number of matches.
+    Accepts the same filters as get_listings.
+    - view='full': the page holds Listing objects, with seller and category joined in.
+    - view='compact': the page holds search-hit dicts (schemas.SearchHit) selected in the page query
+      itself, without hydrating any Listing. Raises ValueError for an unknown view.
+    - Offset mode (no cursor): the page and the total come from a single query. Ranked keyword
+      searches use COUNT(*) OVER () when the backend supports window functions; other searches
+      use an uncorrelated COUNT subquery so the page itself stays an index range scan.
+    - Cursor mode: the page starts right after the row the cursor points at (keyset pagination),
+      so deep pages cost the same as the first one. The total is carried in the cursor.
+    - count_limit: stop counting past count_limit matches. The total is then capped at count_limit + 1,
+      so a total above count_limit means "more than count_limit" rather than an exact count.
+    Returns (page, total, next_cursor); next_cursor is None on the last page.
+    Keyword searches are answered by the in-memory search engine when it is enabled (see application.search_engine).
+    """
+    if view not in SEARCH_VIEWS:
+        raise ValueError(f"Unknown view '{view}'. Choose from: {', '.join(SEARCH_VIEWS)}")
+    engine = search_engine.get_search_engine(db)
+    if engine is not None and engine.supports(**filters):
+        page, total, next_cursor = _search_listings_in_memory(db, engine, limit=limit, skip=skip, cursor=cursor, view=view, **filters)
+        return page, _cap_total(total, count_limit), next_cursor
+
+    query, sort_keys = _listing_search_query(db, **filters)
+    total = None
+    count_column = None
+    if cursor:
+        values, total, cursor_count_limit = decode_search_cursor(cursor)
+        if len(values) != len(sort_keys):
+            raise ValueError("Search cursor does not match the search parameters")
+        capped = cursor_count_limit is not None and total is not None and total > cursor_count_limit
+        if capped and (count_limit is None or count_limit > cursor_count_limit):
+            total = None # "More than cursor_count_limit" doesn't answer this search: count again
+        page_query = query.filter(_keyset_predicate(sort_keys, values))
+        skip = 0
+    else:
+        page_query = query
+        if filters.get("search") and filters.get("sort") not in SEARCH_SORT_KEYS and _supports_window_functions(db):
+            # Ranked results are sorted after visiting every match anyway, so counting them is free
+            count_column = func.count().over()
+        else:
+            # Unranked pages are an index range scan; a window count would force visiting every match.
+            # An uncorrelated scalar subquery is evaluated once and can use its own (covering) index.
+            count_column = _count_query(query, count_limit).scalar_subquery()
+
+    if view == SEARCH_VIEW_COMPACT:
+        hit_columns = _search_hit_columns()
+        page_query = page_query.with_entities(*hit_columns).join(models.User, models.Listing.seller_id == models.User.user_id)
+    else:
+        hit_columns = [models.Listing]
+        page_query = page_query.options(*_FULL_LISTING_OPTIONS)
+
+    # Select the sort keys alongside each row so the next cursor carries the exact values the DB compares.
+    extra_columns = [expr for expr, _ in sort_keys]
+    if count_column is not None:
+        extra_columns.append(count_column)
+    rows = _order_by_sort_keys(page_query.add_columns(*extra_columns), sort_keys).offset(skip).limit(limit + 1).all()
+
+    if count_column is not None and rows:
+        total = rows[0][-1]
+    elif total is None:
+        # Past the last row (or a cursor without a total): count separately
+        total = _count_matches(db, query, count_limit)
+    total = _cap_total(total, count_limit) # Window counts are exact; keep totals consistent across modes
+
+    width, key_count = len(hit_columns), len(sort_keys)
+    next_cursor = encode_search_cursor(list(rows[limit - 1][width:width + key_count]), total, count_limit) if len(rows) > limit else None
+    if view == SEARCH_VIEW_COMPACT:
+        names = [column.key for column in hit_columns]
+        return [dict(zip(names, row[:width])) for row in rows[:limit]], total, next_cursor
+    return [row[0] for row in rows[:limit]], total, next_cursor
+
+def _cap_total(total: int, count_limit: Optional[int]) -> int:
+    return total if count_limit is None else min(total, count_limit + 1)
+
+def get_search_correction(db: Session, search: Optional[str]) -> Optional[str]:
+    """
+    'Did you mean' text for `search`: the query with every term the listings don't use replaced by
+    its closest spelling that they do, or None when there is nothing to correct.
+    """
+    return search_engine.expand_query(db, search).did_you_mean
+
+def _search_listings_in_memory(db: Session, engine, limit: int, skip: int, cursor: Optional[str], view: str, **filters):
+    """search_listings backed by the in-memory index: the ids come from memory, only the page is loaded."""
+    after = None
+    if cursor:
+        after, _, _ = decode_search_cursor(cursor)
+    page_ids, total, next_key = engine.search(limit=limit, skip=skip, after=after, **filters)
+    if view == SEARCH_VIEW_COMPACT:
+        page = get_search_hits(db, page_ids)
+    else:
+        listings = db.query(models.Listing).options(*_FULL_LISTING_OPTIONS, selectinload(models.Listing.images)).filter(
+            models.Listing.listing_id.in_(page_ids)
+        ).all() if page_ids else []
+        listings_by_id = {listing.listing_id: listing for listing in listings}
+        page = [listings_by_id[listing_id] for listing_id in page_ids if listing_id in listings_by_id]
+    next_cursor = encode_search_cursor(next_key, total) if next_key is not None else None
+    return page, total, next_cursor
+
+def get_listings(
+    db: Session, 
+    skip: int = 0, 
+    limit: int = 20,
+    search: Optional[str] = None,
+    category_id: Optional[int] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    item_condition: Optional[str] = None,
+    is_skill_sharing: Optional[bool] = None, # Add skill sharing filter
+    status: Optional[str] = 'approved',  # Default to 'approved' status for general views
+    sort: Optional[str] = None, # See SEARCH_SORTS
+    include_descendants: bool = False, # Match listings in subcategories of category_id too
+    tags: Optional[List[str]] = None, # Match listings carrying all of these tags
+    available_at: Optional[Tuple[int, int]] = None # (day_of_week, minute) a listing must be available at
+) -> List[models.Listing]:
+    """
+    Get listings with optional filtering and search.
+    Defaults to returning 'approved' listings for general public views.
+    Set status to None to get listings regardless of status (e.g., for admin).
+    """
+    print(f"crud.get_listings: Received params: search='{search}', category_id={category_id}, status='{status}', is_skill_sharing={is_skill_sharing}")
+    query, sort_keys = _listing_search_query(
+        db,
+        search=search,
+        category_id=category_id,
+        min_price=min_price,
+        max_price=max_price,
+        item_condition=item_condition,
+        is_skill_sharing=is_skill_sharing,
+        status=status,
+        sort=sort,
+        include_descendants=include_descendants,
+        tags=tags,
+        available_at=available_at
+    )
+    paginated_results = _order_by_sort_keys(query, sort_keys).offset(skip).limit(limit).all()
     print(f"crud.get_listings: Returning {len(paginated_results)} paginated results. Skip: {skip}, Limit: {limit}")
     return paginated_results
 
+def _listing_export_columns():
+    return [
+        models.Listing.listing_id,
+        models.Listing.title,
+        models.Listing.status,
+        models.Listing.category_id,
+        models.Listing.seller_id,
+        models.User.username.label("seller_username"),
+        models.Listing.price,
+        models.Listing.rate,
+        models.Listing.rate_type,
+        models.Listing.item_condition,
+        models.Listing.is_skill_sharing,
+        models.Listing.views_count,
+        models.Listing.search_keywords,
+        models.Listing.availability,
+        models.Listing.description,
+        models.Listing.admin_notes,
+        models.Listing.buyer_id,
+        models.Listing.created_at,
+        models.Listing.updated_at,
+        models.Listing.sold_at,
+    ]
+
+LISTING_EXPORT_FIELDS = [column.key for column in _listing_export_columns()] # Export row keys, in CSV column order
+
+def listing_export_statement(db: Session, **filters):
+    """
+    The select behind a listing export: LISTING_EXPORT_FIELDS of the listings matching the search
+    filters (same as get_listings), in listing_id order. Raises ValueError for invalid filters.
+    """
+    query, _ = _listing_search_query(db, **filters)
+    return (
+        query.with_entities(*_listing_export_columns())
+        .join(models.User, models.Listing.seller_id == models.User.user_id)
+        .order_by(models.Listing.listing_id)
+        .statement
+    )
+
+def stream_listing_export(bind, statement, batch_size: int = 500) -> Iterator[List[Any]]:
+    """
+    Run a listing_export_statement on its own session and yield its rows in batches of `batch_size`,
+    fetched from a server-side cursor so memory stays flat whatever the result size. Having its own
+    session lets a StreamingResponse keep reading after the request's session is closed.
+    """
+    with Session(bind=bind) as session:
+        result = session.execute(statement.execution_options(stream_results=True, yield_per=batch_size))
+        for batch in result.partitions():
+            yield batch
+
+def get_search_suggestions(db: Session, prefix: str, limit: int = 10) -> List[str]:
+    """
+    Typeahead completions for `prefix`: listing titles, search keywords and category names with a word
+    starting with it. Served from the in-memory search engine's prefix index when it is enabled; otherwise
+    from the maintained search_suggestions table, ranked the same way (most used first, phrases starting
+    with the prefix first, then alphabetically). Prefixes up to models.SUGGESTION_PREFIX_LENGTH are the
+    first rows of one index range; longer ones narrow the range of their first characters.
+    """
+    engine = search_engine.get_search_engine(db)
+    if engine is not None:
+        return engine.suggest(prefix, limit)
+
+    prefix = search_engine.normalize_phrase(prefix)
+    if not prefix:
+        return []
+    suggestions = models.SearchSuggestion
+    query = select(suggestions.text).where(suggestions.prefix == prefix[:models.SUGGESTION_PREFIX_LENGTH])
+    starts_phrase = suggestions.starts_phrase
+    if len(prefix) > models.SUGGESTION_PREFIX_LENGTH:
+        # Normalized phrases are lowercase letters, digits and single spaces: nothing to escape
+        starts_phrase = suggestions.phrase.like(f"{prefix}%")
+        query = query.where(or_(starts_phrase, suggestions.phrase.like(f"% {prefix}%")))
+    query = query.order_by(suggestions.weight.desc(), starts_phrase.desc(), suggestions.phrase).limit(limit)
+    return db.execute(query).scalars().all()
+
+def get_popular_tags(db: Session, limit: int = 20, prefix: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    The most used tags of approved listings as [{'tag', 'listing_count'}], most used first, optionally
+    only those starting with `prefix`. Read from the maintained tag_listing_counts aggregate.
+    """
+    counts = models.TagListingCount
+    query = select(counts.tag, counts.approved_count).where(counts.approved_count > 0)
+    prefix = models.normalize_tag(prefix or "")
+    if prefix:
+        pattern = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        query = query.where(counts.tag.like(pattern, escape="\\"))
+    rows = db.execute(query.order_by(counts.approved_count.desc(), counts.tag).limit(limit))
+    return [{"tag": tag, "listing_count": count} for tag, count in rows]
+
 def get_listings_by_seller_id(db: Session, seller_id: int) -> List[models.Listing]:
     """
     Get all listings for a specific seller, regardless of status.
@@ -191,6 +708,59 @@ def get_listings_by_seller_id(db: Session, seller_id: int) -> List[models.Listin
         .all()
     )
 
+def _activity_sum(model, column, period_column, since: int):
+    """Correlated sum of a rollup column over the periods after `since`, for the listing of the outer query."""
+    return (
+        select(func.coalesce(func.sum(column), 0))
+        .where(model.listing_id == models.Listing.listing_id, period_column > since)
+        .correlate(models.Listing)
+        .scalar_subquery()
+    )
+
+def get_seller_listing_stats(db: Session, seller_id: int) -> Dict[str, Any]:
+    """
+    View statistics of every listing of a seller and their totals (schemas.SellerListingStats), from
+    one query over listings with the hourly and daily activity rollups and the viewer sketches.
+    Unique viewers across listings come from merging the listings' HyperLogLog sketches.
+    Events still buffered in a worker (see application/trending.py) are not included.
+    """
+    hour = trending.current_hour()
+    day = hour // 24
+    hourly, daily, sketches = models.ListingActivity, models.ListingDailyActivity, models.ListingViewerSketch
+    rows = db.execute(
+        select(
+            models.Listing.listing_id, models.Listing.title, models.Listing.status,
+            func.coalesce(models.Listing.views_count, 0).label("views_count"),
+            _activity_sum(hourly, hourly.views, hourly.hour, hour - 24).label("views_24h"),
+            _activity_sum(daily, daily.views, daily.day, day - 7).label("views_7d"),
+            _activity_sum(daily, daily.views, daily.day, day - 30).label("views_30d"),
+            _activity_sum(daily, daily.conversations, daily.day, day - 30).label("conversations_30d"),
+            sketches.registers,
+        )
+        .outerjoin(sketches, sketches.listing_id == models.Listing.listing_id)
+        .where(models.Listing.seller_id == seller_id)
+        .order_by(models.Listing.listing_id)
+    ).mappings().all()
+
+    sketches_read = []
+    listings = []
+    for row in rows:
+        stats = dict(row)
+        registers = stats.pop("registers")
+        if registers is None:
+            stats["unique_viewers"] = 0
+        else:
+            viewers = HyperLogLog.from_bytes(registers)
+            stats["unique_viewers"] = viewers.count()
+            sketches_read.append(viewers)
+        listings.append(stats)
+    all_viewers = HyperLogLog.union(sketches_read)
+    totals = {
+        key: sum(stats[key] for stats in listings)
+        for key in ("views_count", "views_24h", "views_7d", "views_30d", "conversations_30d")
+    }
+    return {"listing_count": len(listings), **totals, "unique_viewers": all_viewers.count(), "listings": listings}
+
 def get_listings_by_status(db: Session, status: str, skip: int = 0, limit: int = 100) -> List[models.Listing]:
     """
     Get listings filtered by a specific status, with pagination.
@@ -219,10 +789,13 @@ def update_listing_status(db: Session, listing_id: int, new_status: str, admin_n
     db_listing.status = new_status
     if new_status == "approved":
         db_listing.admin_notes = None
+        match_saved_searches(db, db_listing) # Committed together with the approval
     else:
         db_listing.admin_notes = admin_notes
+    trending.follow_listing(db, listing_id)
     db.commit()
     db.refresh(db_listing)
+    listing_events.publish(listing_events.STATUS_CHANGED, listing_id, db_listing)
     return db_listing
 
 def update_listing_status_by_admin(db: Session, listing_id: int, new_status: str, admin_notes: Optional[str] = None) -> Optional[models.Listing]:
@@ -235,10 +808,13 @@ def update_listing_status_by_admin(db: Session, listing_id: int, new_status: str
         db_listing.status = new_status
         if new_status == "approved":
             db_listing.admin_notes = None  # Clear notes on approval
+            match_saved_searches(db, db_listing)
         else:
             db_listing.admin_notes = admin_notes # Set notes if provided for other statuses
+        trending.follow_listing(db, listing_id)
         db.commit()
         db.refresh(db_listing)
+        listing_events.publish(listing_events.STATUS_CHANGED, listing_id, db_listing)
     return db_listing
 
 def get_listing(db: Session, listing_id: int) -> Optional[models.Listing]:
@@ -257,16 +833,65 @@ def get_listing(db: Session, listing_id: int) -> Optional[models.Listing]:
         .first()
     )
 
+def get_listing_validators(db: Session, listing_id: int):
+    """
+    What a conditional GET of a listing needs, in one light query that loads no ORM object: seller_id
+    and status (access control), revision and updated_at/created_at (ETag and Last-Modified), the
+    categories table version (the listing embeds its category) and views_count (overlaid on cached
+    responses). None if the listing doesn't exist.
+    """
+    versions = models.TableVersion
+    categories_version = select(versions.version).where(versions.name == models.CATEGORIES_VERSION).scalar_subquery()
+    return db.execute(
+        select(
+            models.Listing.seller_id,
+            models.Listing.status,
+            models.Listing.revision,
+            models.Listing.views_count,
+            func.coalesce(models.Listing.updated_at, models.Listing.created_at).label("last_modified"),
+            func.coalesce(categories_version, 0).label("categories_version"),
+        ).where(models.Listing.listing_id == listing_id)
+    ).first()
+
+def get_views_counts(db: Session, listing_ids: List[int]) -> Dict[int, int]:
+    """The stored views_count of each of `listing_ids` that exists, in one primary-key lookup."""
+    if not listing_ids:
+        return {}
+    return dict(db.execute(
+        select(models.Listing.listing_id, func.coalesce(models.Listing.views_count, 0)).where(models.Listing.listing_id.in_(listing_ids))
+    ).all())
+
+def get_table_versions(db: Session, names: Tuple[str, ...]) -> Tuple[int, ...]:
+    """The current versions of the named tables (see models.TableVersion), in order; 0 for a table never written."""
+    versions = dict(db.execute(select(models.TableVersion.name, models.TableVersion.version).where(models.TableVersion.name.in_(names))).all())
+    return tuple(versions.get(name, 0) for name in names)
+
 def create_listing(db: Session, listing: ListingCreate, seller_id: int) -> models.Listing:
     """
     Create a new listing.
     """
-    db_listing = models.Listing(**listing.dict(), seller_id=seller_id, status="pending_approval") # Set default status to pending_approval
+    listing_data = listing.dict()
+    slots = listing_data.pop("availability_slots")
+    db_listing = models.Listing(**listing_data, seller_id=seller_id, status="pending_approval") # Set default status to pending_approval
+    _set_availability_slots(db_listing, slots, listing.availability)
     db.add(db_listing)
     db.commit()
     db.refresh(db_listing)
+    listing_events.publish(listing_events.CREATED, db_listing.listing_id, db_listing)
     return db_listing
 
+def _set_availability_slots(db_listing: models.Listing, slots: Optional[List[Dict[str, int]]], text: Optional[str]) -> None:
+    """Replace the listing's availability slots with `slots`, or with those read from the free-text `text` when slots is None."""
+    if slots is None:
+        parsed = parse_availability(text)
+    else:
+        parsed = [(slot["day_of_week"], slot["start_minute"], slot["end_minute"]) for slot in slots]
+    db_listing.availability_slots = [
+        models.ListingAvailability(day_of_week=day, start_minute=start, end_minute=end)
+        for day, start, end in normalize_slots(parsed)
+    ]
+    db_listing.availability_slots_set = True # Even when empty: models.ensure_listing_availability must not fill them in
+
 def update_listing(
     db: Session,
     listing_id: int,
@@ -295,7 +920,7 @@ def update_listing(
     # revert its status to 'pending_approval' for re-moderation.
     substantive_fields_for_remoderation = {
         'title', 'description', 'price', 'category_id', 'item_condition',
-        'is_skill_sharing', 'rate', 'rate_type', 'availability', 'search_keywords'
+        'is_skill_sharing', 'rate', 'rate_type', 'availability', 'availability_slots', 'search_keywords'
     }
     updated_substantive_fields = substantive_fields_for_remoderation.intersection(data_to_process.keys())
 
@@ -348,6 +973,12 @@ def update_listing(
             db_listing.status = data_to_process.pop('status')
 
 
+    # Explicit slots replace the listing's slots; a changed free-text availability is parsed into new ones
+    slots = data_to_process.pop('availability_slots', None)
+    text_changed = 'availability' in data_to_process and data_to_process['availability'] != db_listing.availability
+    if slots is not None or text_changed:
+        _set_availability_slots(db_listing, slots, data_to_process.get('availability', db_listing.availability))
+
     # Update other general attributes from the remaining data_to_process
     for key, value in data_to_process.items():
         # Prevent updating restricted or specially-handled fields again
@@ -370,8 +1001,10 @@ def update_listing(
             logger = logging.getLogger(__name__) # Get logger if not already defined
             logger.warning(f"Attempted to update non-existent attribute '{key}' on Listing model for listing ID {listing_id}.")
 
+    trending.follow_listing(db, listing_id) # Moderation, sales and category moves take it out of rankings
     db.commit()
     db.refresh(db_listing)
+    listing_events.publish(listing_events.UPDATED, listing_id, db_listing)
     return db_listing
 
 def delete_listing(db: Session, listing_id: int, seller_id: int) -> bool:
@@ -404,9 +1037,12 @@ def delete_listing(db: Session, listing_id: int, seller_id: int) -> bool:
         delete_listing_image(db=db, image_id=image_id, seller_id=seller_id)
         # Note: delete_listing_image commits its own transaction.
 
-    # Now delete the listing itself
+    # Now delete the listing itself, its saved-search matches and its trending activity
+    db.query(models.SavedSearchMatch).filter(models.SavedSearchMatch.listing_id == listing_id).delete(synchronize_session=False)
+    trending.forget_listing(db, listing_id)
     db.delete(db_listing)
     db.commit() # Commit the deletion of the listing
+    listing_events.publish(listing_events.DELETED, listing_id)
     return True
 
 # Listing image operations
@@ -439,6 +1075,7 @@ def create_listing_image(
     db.add(db_image)
     db.commit()
     db.refresh(db_image)
+    listing_events.publish(listing_events.IMAGES_CHANGED, listing_id)
     return db_image
 
 # Messaging operations
@@ -590,6 +1227,7 @@ def delete_listing_image(db: Session, image_id: int, seller_id: int) -> bool:
 
     db.delete(db_image)
     db.commit()
+    listing_events.publish(listing_events.IMAGES_CHANGED, listing.listing_id, listing)
 
     # Attempt to delete the actual files from the filesystem
     # Assumes paths in DB are like "/static/images/listings/listing_id/image.jpg"
@@ -785,45 +1423,203 @@ def count_search_results(
     max_price: Optional[float] = None,
     item_condition: Optional[str] = None,
     is_skill_sharing: Optional[bool] = None, # Add skill sharing filter
-    status: Optional[str] = None # Add status filter, None means all statuses
+    status: Optional[str] = None, # Add status filter, None means all statuses
+    count_limit: Optional[int] = None # Stop counting past this many; see search_listings
 ) -> int:
     """
     Count the number of search results for the given parameters.
     Can filter by status. If status is None, no status filter is applied for counting.
+    With count_limit, the count is capped at count_limit + 1.
     """
-    query = db.query(models.Listing.listing_id) # Optimize by selecting only one column for count
-    
-    # Filter by status if provided
-    if status:
-        query = query.filter(models.Listing.status == status)
-    
-    # Apply search filter if provided
-    if search:
-        search_term = f"%{search}%"
-        query = query.filter(
-            or_(
-                models.Listing.title.ilike(search_term),
-                models.Listing.description.ilike(search_term),
-                models.Listing.search_keywords.ilike(search_term)
-            )
-        )
-    
-    # Apply category filter if provided
+    # Shares the filter chain with the search functions; selecting only the id keeps the count cheap
+    query, _ = _listing_search_query(
+        db,
+        search=search,
+        category_id=category_id,
+        min_price=min_price,
+        max_price=max_price,
+        item_condition=item_condition,
+        is_skill_sharing=is_skill_sharing,
+        status=status or None
+    )
+    return _count_matches(db, query, count_limit)
+
+# Price buckets used by the search price facet: (label, lower bound inclusive, upper bound exclusive)
+PRICE_FACET_BUCKETS = [
+    ("0-10", 0, 10),
+    ("10-25", 10, 25),
+    ("25-50", 25, 50),
+    ("50-100", 50, 100),
+    ("100-250", 100, 250),
+    ("250+", 250, None),
+]
+SEARCH_FACETS = ("category", "item_condition", "is_skill_sharing", "price")
+
+def _price_bucket_expression():
+    return case(
+        *[
+            (models.Listing.price < upper, label)
+            for label, _, upper in PRICE_FACET_BUCKETS if upper is not None
+        ],
+        (models.Listing.price.is_(None), "none"),
+        else_=PRICE_FACET_BUCKETS[-1][0]
+    )
+
+def get_search_facets(
+    db: Session,
+    facets: Optional[List[str]] = None,
+    **filters
+) -> Dict[str, Dict[str, int]]:
+    """
+    Count the listings matching the search filters (same filters as get_listings) per facet value:
+    category (by category_id), item_condition, is_skill_sharing and price bucket (see PRICE_FACET_BUCKETS).
+    All requested facets come from one GROUP BY over their combined values; the per-facet counts
+    are then summed up from those groups.
+    """
+    facets = [facet for facet in SEARCH_FACETS if facets is None or facet in facets]
+    if not facets:
+        return {}
+    dimensions = {
+        "category": models.Listing.category_id,
+        "item_condition": models.Listing.item_condition,
+        "is_skill_sharing": models.Listing.is_skill_sharing,
+        "price": _price_bucket_expression(),
+    }
+    group_columns = [dimensions[facet] for facet in facets]
+
+    query, _ = _listing_search_query(db, **filters)
+    rows = query.with_entities(*group_columns, func.count(models.Listing.listing_id)).group_by(*group_columns).all()
+
+    counts: Dict[str, Dict[str, int]] = {facet: {} for facet in facets}
+    for row in rows:
+        group_count = row[-1]
+        for facet, value in zip(facets, row[:-1]):
+            key = str(value).lower() if isinstance(value, bool) else str(value)
+            counts[facet][key] = counts[facet].get(key, 0) + group_count
+    return counts
+
+# Saved search operations
+MAX_SAVED_SEARCHES_PER_USER = 20
+
+def _saved_search_keys(query: Optional[str], category_id: Optional[int], include_descendants: bool) -> List[str]:
+    """The saved_search_keys of a saved search: a listing must have all of them (see _listing_match_keys)."""
+    keys = [f"t:{term}" for term in dict.fromkeys(search_engine.tokenize(query))]
     if category_id:
-        query = query.filter(models.Listing.category_id == category_id)
-    
-    # Apply price range filters if provided
-    if min_price is not None:
-        query = query.filter(models.Listing.price >= min_price)
-    if max_price is not None:
-        query = query.filter(models.Listing.price <= max_price)
-    
-    # Apply condition filter if provided
-    if item_condition:
-        query = query.filter(models.Listing.item_condition == item_condition)
-        
-    # Apply skill sharing filter if provided (True or False)
-    if is_skill_sharing is not None:
-        query = query.filter(models.Listing.is_skill_sharing == is_skill_sharing)
-    
-    return query.count()
+        keys.append(f"{'s' if include_descendants else 'c'}:{category_id}")
+    return keys or ["*"]
+
+def _listing_match_keys(db: Session, listing: models.Listing) -> List[str]:
+    """Every saved-search key a listing satisfies: its words, its category, each category above it, and '*'."""
+    terms = {
+        term for field in (listing.title, listing.search_keywords, listing.description)
+        for term in search_engine.tokenize(field)
+    }
+    ancestor_ids = db.execute(
+        select(models.CategoryClosure.ancestor_id).where(models.CategoryClosure.descendant_id == listing.category_id)
+    ).scalars()
+    return ["*", f"c:{listing.category_id}", *(f"s:{ancestor_id}" for ancestor_id in ancestor_ids), *(f"t:{term}" for term in sorted(terms))]
+
+def create_saved_search(db: Session, user_id: int, saved_search: SavedSearchCreate) -> models.SavedSearch:
+    """Save a search for `user_id`. Raises ValueError when the user already has MAX_SAVED_SEARCHES_PER_USER."""
+    saved_count = db.query(func.count(models.SavedSearch.saved_search_id)).filter(models.SavedSearch.user_id == user_id).scalar()
+    if saved_count >= MAX_SAVED_SEARCHES_PER_USER:
+        raise ValueError(f"You can save at most {MAX_SAVED_SEARCHES_PER_USER} searches.")
+    data = saved_search.model_dump()
+    data["category_id"] = data["category_id"] or None # 0 means all categories, as in /api/search
+    keys = _saved_search_keys(data["query"], data["category_id"], data["include_descendants"])
+    db_saved_search = models.SavedSearch(
+        **data, user_id=user_id, key_count=len(keys), keys=[models.SavedSearchKey(key=key) for key in keys]
+    )
+    db.add(db_saved_search)
+    db.commit()
+    db.refresh(db_saved_search)
+    return db_saved_search
+
+def match_saved_searches(db: Session, listing: models.Listing) -> int:
+    """
+    Record `listing` as a match of every saved search it satisfies, without committing; called when
+    it is approved. One grouped lookup over saved_search_keys finds the searches whose keys are all
+    among the listing's (query words and category), with the remaining filters compared in the same
+    query; saved searches never re-run against the listings table. Returns the number of new matches.
+    """
+    searches, keys = models.SavedSearch, models.SavedSearchKey
+    price = listing.price
+    already_matched = select(models.SavedSearchMatch.saved_search_id).where(models.SavedSearchMatch.listing_id == listing.listing_id)
+    matched_ids = db.execute(
+        select(searches.saved_search_id)
+        .join(keys, keys.saved_search_id == searches.saved_search_id)
+        .where(
+            keys.key.in_(_listing_match_keys(db, listing)),
+            searches.user_id != listing.seller_id,
+            or_(searches.item_condition.is_(None), searches.item_condition == listing.item_condition),
+            or_(searches.is_skill_sharing.is_(None), searches.is_skill_sharing == bool(listing.is_skill_sharing)),
+            or_(searches.min_price.is_(None), searches.min_price <= price) if price is not None else searches.min_price.is_(None),
+            or_(searches.max_price.is_(None), searches.max_price >= price) if price is not None else searches.max_price.is_(None),
+            searches.saved_search_id.notin_(already_matched),
+        )
+        .group_by(searches.saved_search_id, searches.key_count)
+        .having(func.count() == searches.key_count)
+    ).scalars().all()
+    if matched_ids:
+        db.execute(
+            models.SavedSearchMatch.__table__.insert(),
+            [{"saved_search_id": saved_search_id, "listing_id": listing.listing_id} for saved_search_id in matched_ids]
+        )
+    return len(matched_ids)
+
+def _new_matches_query(saved_search_ids):
+    """Matches past each saved search's last check whose listing is still approved."""
+    matches = models.SavedSearchMatch
+    return (
+        select(matches.saved_search_id, matches.match_id, matches.listing_id)
+        .join(models.SavedSearch, models.SavedSearch.saved_search_id == matches.saved_search_id)
+        .join(models.Listing, models.Listing.listing_id == matches.listing_id)
+        .where(
+            matches.saved_search_id.in_(saved_search_ids),
+            matches.match_id > models.SavedSearch.last_seen_match_id,
+            models.Listing.status == "approved",
+        )
+    )
+
+def get_saved_searches(db: Session, user_id: int) -> List[Tuple[models.SavedSearch, int]]:
+    """The user's saved searches, oldest first, each with its number of new matches since the last check."""
+    saved_searches = db.query(models.SavedSearch).filter(models.SavedSearch.user_id == user_id).order_by(models.SavedSearch.saved_search_id).all()
+    if not saved_searches:
+        return []
+    new_matches = _new_matches_query([saved_search.saved_search_id for saved_search in saved_searches]).subquery()
+    new_counts = dict(db.execute(
+        select(new_matches.c.saved_search_id, func.count()).group_by(new_matches.c.saved_search_id)
+    ).all())
+    return [(saved_search, new_counts.get(saved_search.saved_search_id, 0)) for saved_search in saved_searches]
+
+def check_saved_search(db: Session, saved_search_id: int, user_id: int, limit: int = 100) -> Optional[Tuple[List[Dict[str, Any]], int]]:
+    """
+    The oldest `limit` new matches of a saved search as compact hits (newest first) and the total number
+    of new matches, marking the returned ones seen; the rest come with the next check. Returns None if
+    the saved search doesn't exist or belongs to another user.
+    """
+    saved_search = db.query(models.SavedSearch).filter(
+        models.SavedSearch.saved_search_id == saved_search_id, models.SavedSearch.user_id == user_id
+    ).first()
+    if saved_search is None:
+        return None
+    new_match_count = db.execute(select(func.count()).select_from(_new_matches_query([saved_search_id]).subquery())).scalar()
+    rows = db.execute(
+        _new_matches_query([saved_search_id]).order_by(models.SavedSearchMatch.match_id).limit(limit)
+    ).all()
+    if rows:
+        # The newest match returned, not the newest stored: the ones past it (or inserted since) stay new
+        saved_search.last_seen_match_id = rows[-1].match_id
+        db.commit()
+    return get_search_hits(db, [row.listing_id for row in reversed(rows)]), new_match_count
+
+def delete_saved_search(db: Session, saved_search_id: int, user_id: int) -> bool:
+    saved_search = db.query(models.SavedSearch).filter(
+        models.SavedSearch.saved_search_id == saved_search_id, models.SavedSearch.user_id == user_id
+    ).first()
+    if saved_search is None:
+        return False
+    db.query(models.SavedSearchMatch).filter(models.SavedSearchMatch.saved_search_id == saved_search_id).delete(synchronize_session=False)
+    db.delete(saved_search)
+    db.commit()
+    return True
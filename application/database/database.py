@@ -2,7 +2,8 @@ import os
 import logging # Import the logging module
 from pathlib import Path
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -99,6 +100,133 @@ logger.info(f"SQLAlchemy engine created for: {engine.url.drivername}")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# --- Full-Text Search Index ---
+# Listing search (crud.get_listings / crud.count_search_results) matches the
+# query against title, description and search_keywords. Instead of scanning
+# every row with ILIKE, each backend keeps a full-text index over those columns:
+#   - SQLite: an FTS5 virtual table with the trigram tokenizer, so MATCH keeps the
+#     substring semantics of ILIKE '%q%'. Triggers keep it in sync with `listings`.
+#   - MySQL: a FULLTEXT index with the ngram parser, maintained by InnoDB itself.
+# If the index cannot be created (e.g. SQLite built without FTS5), search falls
+# back to the ILIKE scan.
+FULLTEXT_SQLITE_TABLE = "listings_fts"
+FULLTEXT_MYSQL_INDEX = "ft_listings_search"
+FULLTEXT_MIN_QUERY_LENGTH = 3 # Trigram/ngram indexes cannot answer shorter queries
+
+_SQLITE_FULLTEXT_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FULLTEXT_SQLITE_TABLE} USING fts5(
+        title, description, search_keywords,
+        content='listings', content_rowid='listing_id', tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FULLTEXT_SQLITE_TABLE}_ai AFTER INSERT ON listings BEGIN
+        INSERT INTO {FULLTEXT_SQLITE_TABLE}(rowid, title, description, search_keywords)
+        VALUES (new.listing_id, new.title, new.description, new.search_keywords);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FULLTEXT_SQLITE_TABLE}_ad AFTER DELETE ON listings BEGIN
+        INSERT INTO {FULLTEXT_SQLITE_TABLE}({FULLTEXT_SQLITE_TABLE}, rowid, title, description, search_keywords)
+        VALUES ('delete', old.listing_id, old.title, old.description, old.search_keywords);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FULLTEXT_SQLITE_TABLE}_au AFTER UPDATE OF title, description, search_keywords ON listings BEGIN
+        INSERT INTO {FULLTEXT_SQLITE_TABLE}({FULLTEXT_SQLITE_TABLE}, rowid, title, description, search_keywords)
+        VALUES ('delete', old.listing_id, old.title, old.description, old.search_keywords);
+        INSERT INTO {FULLTEXT_SQLITE_TABLE}(rowid, title, description, search_keywords)
+        VALUES (new.listing_id, new.title, new.description, new.search_keywords);
+    END
+    """,
+]
+
+# Availability is cached per engine so the search path doesn't re-check the catalog on every request.
+_fulltext_status = {}
+
+def _fulltext_exists(connection) -> bool:
+    if connection.dialect.name == "sqlite":
+        return connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FULLTEXT_SQLITE_TABLE}
+        ).first() is not None
+    if connection.dialect.name == "mysql":
+        return connection.execute(
+            text(
+                "SELECT 1 FROM information_schema.statistics "
+                "WHERE table_schema = DATABASE() AND table_name = 'listings' AND index_name = :name"
+            ),
+            {"name": FULLTEXT_MYSQL_INDEX}
+        ).first() is not None
+    return False
+
+def _create_fulltext_index(connection) -> bool:
+    existed = _fulltext_exists(connection)
+    if connection.dialect.name == "sqlite":
+        for statement in _SQLITE_FULLTEXT_DDL:
+            connection.execute(text(statement))
+        if not existed:
+            # Index rows that were inserted before the FTS table existed
+            connection.execute(text(f"INSERT INTO {FULLTEXT_SQLITE_TABLE}({FULLTEXT_SQLITE_TABLE}) VALUES ('rebuild')"))
+    elif connection.dialect.name == "mysql" and not existed:
+        connection.execute(text(
+            f"ALTER TABLE listings ADD FULLTEXT INDEX {FULLTEXT_MYSQL_INDEX} "
+            "(title, description, search_keywords) WITH PARSER ngram"
+        ))
+    available = _fulltext_exists(connection)
+    if available and not existed:
+        logger.info(f"Full-text search index created for the {connection.dialect.name} backend.")
+    return available
+
+def create_fulltext_index(bind) -> bool:
+    """
+    Create the full-text index for listing search if it doesn't exist yet.
+    `bind` may be an Engine or a Connection (as passed by the `after_create` DDL event).
+    Returns True if the index is available afterwards.
+    """
+    try:
+        if isinstance(bind, Engine):
+            with bind.begin() as connection:
+                available = _create_fulltext_index(connection)
+        else:
+            with bind.begin_nested():
+                available = _create_fulltext_index(bind)
+    except Exception as e:
+        logger.warning(f"Full-text search index unavailable, listing search will use ILIKE scans: {e}")
+        available = False
+    _fulltext_status[bind.engine] = available
+    return available
+
+def rebuild_fulltext_index(bind) -> None:
+    """Repopulate the SQLite FTS table from `listings` (MySQL maintains its index itself)."""
+    with bind.begin() as connection:
+        if connection.dialect.name == "sqlite" and _fulltext_exists(connection):
+            connection.execute(text(f"INSERT INTO {FULLTEXT_SQLITE_TABLE}({FULLTEXT_SQLITE_TABLE}) VALUES ('rebuild')"))
+
+def drop_fulltext_index(bind) -> None:
+    """
+    Drop the SQLite FTS table (its triggers go away together with `listings`).
+    Runs before `listings` is dropped so a recreated table never sees stale index rows.
+    MySQL drops its FULLTEXT index together with the table.
+    """
+    if bind.dialect.name == "sqlite":
+        bind.execute(text(f"DROP TABLE IF EXISTS {FULLTEXT_SQLITE_TABLE}"))
+    _fulltext_status.pop(bind.engine, None)
+
+def fulltext_available(bind) -> bool:
+    """Whether listing search can use the full-text index on this engine."""
+    engine_key = bind.engine
+    if engine_key not in _fulltext_status:
+        try:
+            with engine_key.connect() as connection:
+                _fulltext_status[engine_key] = _fulltext_exists(connection)
+        except Exception as e:
+            logger.warning(f"Could not check for the full-text search index: {e}")
+            _fulltext_status[engine_key] = False
+    return _fulltext_status[engine_key]
+
+
 def get_db():
     """Dependency to get a database session."""
     db = SessionLocal()
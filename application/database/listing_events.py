@@ -0,0 +1,41 @@
+"""
+Listing change notifications.
+
+crud functions publish here after committing a change to a listing or its images, so
+in-process state derived from listings (caches, in-memory indexes) can follow along
+without every write path knowing about every consumer.
+
+Handlers are called as handler(change, listing_id, listing) where `change` is one of
+CREATED, UPDATED, STATUS_CHANGED, DELETED or IMAGES_CHANGED, and `listing` is the
+committed models.Listing when the publisher has it loaded (always None for DELETED). A failing handler is logged and skipped;
+it never fails the write that triggered it.
+"""
+import logging
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CREATED = "created"
+UPDATED = "updated"
+STATUS_CHANGED = "status_changed"
+DELETED = "deleted"
+IMAGES_CHANGED = "images_changed"
+
+_subscribers: List[Callable] = []
+
+def subscribe(handler: Callable) -> Callable:
+    """Register a handler. Returns it unchanged so this can be used as a decorator."""
+    if handler not in _subscribers:
+        _subscribers.append(handler)
+    return handler
+
+def unsubscribe(handler: Callable) -> None:
+    if handler in _subscribers:
+        _subscribers.remove(handler)
+
+def publish(change: str, listing_id: int, listing: Optional[object] = None) -> None:
+    for handler in list(_subscribers):
+        try:
+            handler(change, listing_id, listing)
+        except Exception as e:
+            logger.error(f"Listing event handler {getattr(handler, '__name__', handler)} failed for {change} of listing {listing_id}: {e}", exc_info=True)
@@ -1,7 +1,13 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, CheckConstraint, UniqueConstraint
-from sqlalchemy.orm import relationship, backref
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, LargeBinary, CheckConstraint, UniqueConstraint, Index, event
+from sqlalchemy import select, literal, inspect, text
+from sqlalchemy.orm import relationship, backref, object_session
+from typing import Dict, Iterable, List, Optional, Set
 from sqlalchemy.sql import func
-from .database import Base
+from .database import Base, create_fulltext_index, drop_fulltext_index
+from application.availability import parse_availability
+from application.search_engine.bm25 import tokenize
+from application.search_engine.fuzzy import term_trigrams
+from application.search_engine.suggest import CATEGORY_SUGGESTION_WEIGHT, normalize_phrase, phrase_keys
 
 # User model for authentication
 class User(Base):
@@ -40,6 +46,114 @@ class Category(Base):
     # Relationship to listings
     listings = relationship("Listing", back_populates="category")
 
+class CategoryClosure(Base):
+    """
+    Every (ancestor, descendant) pair of the category tree, including each category paired with
+    itself at depth 0, so a whole subtree is one primary-key range: WHERE ancestor_id = :id.
+    Maintained by the Category mapper events below, so every way of adding categories keeps it current.
+    """
+    __tablename__ = "category_closure"
+
+    ancestor_id = Column(Integer, ForeignKey("categories.category_id"), primary_key=True)
+    descendant_id = Column(Integer, ForeignKey("categories.category_id"), primary_key=True, index=True) # Index serves ancestor lookups
+    depth = Column(Integer, nullable=False)
+
+def _insert_category_closure(mapper, connection, target):
+    """A new category is its own descendant, and a descendant of every ancestor of its parent."""
+    closure = CategoryClosure.__table__
+    connection.execute(closure.insert().values(ancestor_id=target.category_id, descendant_id=target.category_id, depth=0))
+    if target.parent_id is not None:
+        connection.execute(closure.insert().from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(closure.c.ancestor_id, literal(target.category_id), closure.c.depth + 1)
+            .where(closure.c.descendant_id == target.parent_id)
+        ))
+
+def _update_category_closure(mapper, connection, target):
+    # Moving a category moves its whole subtree; this is rare enough to just recompute the table
+    if inspect(target).attrs.parent_id.history.has_changes():
+        rebuild_category_closure(connection)
+
+def _delete_category_closure(mapper, connection, target):
+    closure = CategoryClosure.__table__
+    connection.execute(closure.delete().where(
+        (closure.c.ancestor_id == target.category_id) | (closure.c.descendant_id == target.category_id)
+    ))
+
+def rebuild_category_closure(connection) -> int:
+    """Recompute the closure table from categories.parent_id. Returns the number of pairs written."""
+    parents = dict(connection.execute(select(Category.category_id, Category.parent_id)).all())
+    rows = []
+    for category_id in parents:
+        ancestor_id, depth, seen = category_id, 0, set()
+        while ancestor_id is not None and ancestor_id not in seen: # Guard against parent_id cycles
+            rows.append({"ancestor_id": ancestor_id, "descendant_id": category_id, "depth": depth})
+            seen.add(ancestor_id)
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+    closure = CategoryClosure.__table__
+    connection.execute(closure.delete())
+    if rows:
+        connection.execute(closure.insert(), rows)
+    return len(rows)
+
+def ensure_category_closure(engine) -> None:
+    """Fill the closure table for databases whose categories predate it (create_all only adds the empty table)."""
+    with engine.begin() as connection:
+        categories = connection.execute(select(func.count()).select_from(Category.__table__)).scalar()
+        self_pairs = connection.execute(
+            select(func.count()).select_from(CategoryClosure.__table__).where(CategoryClosure.depth == 0)
+        ).scalar()
+        if categories != self_pairs:
+            rebuild_category_closure(connection)
+
+event.listen(Category, "after_insert", _insert_category_closure)
+event.listen(Category, "after_update", _update_category_closure)
+event.listen(Category, "before_delete", _delete_category_closure) # Before, so the rows never point at a missing category
+
+class CategoryListingCount(Base):
+    """
+    Number of approved listings directly in each category. Maintained by the Listing mapper events
+    below, inside the transaction that changes the listing, so it never needs a COUNT over listings;
+    subtree counts add these up over the (small) closure table. rebuild_category_listing_counts repairs drift.
+    """
+    __tablename__ = "category_listing_counts"
+
+    category_id = Column(Integer, ForeignKey("categories.category_id"), primary_key=True)
+    approved_count = Column(Integer, nullable=False, default=0)
+
+def _insert_category_listing_count(mapper, connection, target):
+    connection.execute(CategoryListingCount.__table__.insert().values(category_id=target.category_id, approved_count=0))
+
+def _delete_category_listing_count(mapper, connection, target):
+    counts = CategoryListingCount.__table__
+    connection.execute(counts.delete().where(counts.c.category_id == target.category_id))
+
+def rebuild_category_listing_counts(connection) -> int:
+    """Recompute every category's approved listing count from the listings table. Returns the number of approved listings."""
+    approved = dict(connection.execute(
+        select(Listing.category_id, func.count()).where(Listing.status == COUNTED_LISTING_STATUS).group_by(Listing.category_id)
+    ).all())
+    rows = [
+        {"category_id": category_id, "approved_count": approved.get(category_id, 0)}
+        for category_id in connection.execute(select(Category.category_id)).scalars()
+    ]
+    counts = CategoryListingCount.__table__
+    connection.execute(counts.delete())
+    if rows:
+        connection.execute(counts.insert(), rows)
+    return sum(approved.values())
+
+def ensure_category_listing_counts(engine) -> None:
+    """Fill the counts for databases whose categories predate the table (one row per category once filled)."""
+    with engine.begin() as connection:
+        categories = connection.execute(select(func.count()).select_from(Category.__table__)).scalar()
+        rows = connection.execute(select(func.count()).select_from(CategoryListingCount.__table__)).scalar()
+        if categories != rows:
+            rebuild_category_listing_counts(connection)
+
+event.listen(Category, "after_insert", _insert_category_listing_count)
+event.listen(Category, "before_delete", _delete_category_listing_count)
+
 class Listing(Base):
     __tablename__ = "listings"
     
@@ -58,6 +172,7 @@ class Listing(Base):
     rate = Column(Float, nullable=True)
     rate_type = Column(String(50), nullable=True) # e.g., 'hourly', 'fixed'
     availability = Column(Text, nullable=True)
+    availability_slots_set = Column(Boolean, nullable=False, default=False, server_default="0") # Slots written by crud (possibly none, by choice): never backfilled from the text
 
     # Relationship to seller (User)
     seller = relationship("User", foreign_keys=[seller_id], back_populates="listings")
@@ -67,17 +182,561 @@ class Listing(Base):
     views_count = Column(Integer, default=0)
     buyer_id = Column(Integer, ForeignKey("users.user_id"), nullable=True, index=True) # Added to track buyer
     sold_at = Column(DateTime(timezone=True), nullable=True) # Added to track when item was sold
+
+    # Denormalized sort keys, kept current by the mapper events below so sorted searches are index scans
+    effective_price = Column(Float, nullable=True) # COALESCE(price, rate): skill listings are priced by their rate
+    seller_rating = Column(Float, nullable=True) # Average rating of the seller's reviews; NULL until the first one
+    revision = Column(Integer, nullable=False, default=0, server_default="0") # Counts ORM updates and image changes; part of the listing's ETag
     
     # Relationships
     category = relationship("Category", back_populates="listings")
     images = relationship("ListingImage", back_populates="listing", cascade="all, delete-orphan")
     reviews = relationship("Review", back_populates="listing", cascade="all, delete-orphan", lazy="dynamic") # Added relationship to Reviews
+    availability_slots = relationship("ListingAvailability", cascade="all, delete-orphan") # Structured form of `availability`
     
     # Condition and status validation
     __table_args__ = (
         CheckConstraint("item_condition IN ('new', 'like_new', 'good', 'fair', 'poor')", name="check_condition"),  # Changed from 'condition'
         CheckConstraint("status IN ('available', 'pending', 'sold', 'pending_approval', 'approved', 'rejected', 'needs_changes')", name="check_status"), # Added new statuses
+        Index("ix_listings_status_created", "status", "created_at", "listing_id"), # Serves the default newest-first search order and its keyset pages
+        # One per sort=... mode of crud.search_listings, in both directions (see crud.SEARCH_SORT_KEYS)
+        Index("ix_listings_status_effective_price", "status", "effective_price", "listing_id"),
+        Index("ix_listings_status_views", "status", "views_count", "listing_id"),
+        Index("ix_listings_status_seller_rating", "status", "seller_rating", "listing_id"),
+    )
+
+def _seller_rating_query(seller_id):
+    return select(func.avg(Review.rating)).where(Review.reviewee_id == seller_id).scalar_subquery()
+
+def _set_listing_sort_keys(mapper, connection, target):
+    target.effective_price = target.price if target.price is not None else target.rate
+    if target.seller_rating is None and target.seller_id is not None:
+        target.seller_rating = connection.execute(select(_seller_rating_query(target.seller_id))).scalar()
+
+def _update_listing_sort_keys(mapper, connection, target):
+    target.effective_price = target.price if target.price is not None else target.rate
+
+def refresh_seller_rating(connection, seller_id: int) -> None:
+    """
+    Copy the seller's current average review rating onto all their listings. Bumps the listings table
+    version: the rating orders sort=seller_rating searches, whose ETags and cache keys carry it.
+    """
+    listings = Listing.__table__
+    connection.execute(listings.update().where(listings.c.seller_id == seller_id).values(
+        seller_rating=_seller_rating_query(seller_id),
+        updated_at=listings.c.updated_at, # Not an edit of the listing: keep its Last-Modified
+    ))
+    bump_table_version(connection, LISTINGS_VERSION)
+
+def rebuild_listing_sort_keys(connection) -> None:
+    """Recompute effective_price and seller_rating of every listing."""
+    listings = Listing.__table__
+    connection.execute(listings.update().values(
+        effective_price=func.coalesce(listings.c.price, listings.c.rate),
+        seller_rating=_seller_rating_query(listings.c.seller_id),
+        updated_at=listings.c.updated_at,
+    ))
+    bump_table_version(connection, LISTINGS_VERSION)
+
+def ensure_listing_sort_keys(engine) -> None:
+    """
+    Add the sort-key columns and their indexes to a listings table created before them, and fill them.
+    create_all neither adds columns nor indexes to existing tables.
+    """
+    columns = {column["name"] for column in inspect(engine).get_columns(Listing.__tablename__)}
+    missing = [column for column in (Listing.effective_price, Listing.seller_rating) if column.key not in columns]
+    with engine.begin() as connection:
+        for column in missing:
+            connection.execute(text(f"ALTER TABLE {Listing.__tablename__} ADD COLUMN {column.key} FLOAT"))
+        for index in Listing.__table__.indexes:
+            index.create(connection, checkfirst=True)
+        if missing:
+            rebuild_listing_sort_keys(connection)
+
+COUNTED_LISTING_STATUS = "approved" # Listings counted in category_listing_counts
+
+def _committed_value(target, key: str):
+    """The value of `key` as last flushed, i.e. before the changes being flushed now."""
+    history = inspect(target).attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    return history.unchanged[0] if history.unchanged else getattr(target, key)
+
+def _add_to_category_listing_count(connection, category_id: int, delta: int) -> None:
+    counts = CategoryListingCount.__table__
+    result = connection.execute(
+        counts.update().where(counts.c.category_id == category_id).values(approved_count=counts.c.approved_count + delta)
+    )
+    if result.rowcount == 0: # Category older than the counts table and not backfilled yet
+        connection.execute(counts.insert().values(category_id=category_id, approved_count=max(delta, 0)))
+
+def _count_inserted_listing(mapper, connection, target):
+    if target.status == COUNTED_LISTING_STATUS:
+        _add_to_category_listing_count(connection, target.category_id, 1)
+
+def _count_updated_listing(mapper, connection, target):
+    old = (_committed_value(target, "status"), _committed_value(target, "category_id"))
+    new = (target.status, target.category_id)
+    if old == new:
+        return
+    if old[0] == COUNTED_LISTING_STATUS:
+        _add_to_category_listing_count(connection, old[1], -1)
+    if new[0] == COUNTED_LISTING_STATUS:
+        _add_to_category_listing_count(connection, new[1], 1)
+
+def _count_deleted_listing(mapper, connection, target):
+    if _committed_value(target, "status") == COUNTED_LISTING_STATUS:
+        _add_to_category_listing_count(connection, _committed_value(target, "category_id"), -1)
+
+event.listen(Listing, "before_insert", _set_listing_sort_keys)
+event.listen(Listing, "before_update", _update_listing_sort_keys)
+
+# Every ORM write to a listing (crud, admin status updates, seed.py) keeps the counts in step, in the same transaction
+event.listen(Listing, "after_insert", _count_inserted_listing)
+event.listen(Listing, "after_update", _count_updated_listing)
+event.listen(Listing, "after_delete", _count_deleted_listing)
+
+# --- Tags ---
+MAX_TAG_LENGTH = 50
+
+class ListingTag(Base):
+    """
+    The comma-separated search_keywords of a listing, one normalized tag per row (see parse_tags).
+    Maintained by the Listing mapper events below; (tag, listing_id) is the key, so the listings
+    with a tag are one index range and several tags intersect with indexed lookups.
+    """
+    __tablename__ = "listing_tags"
+
+    tag = Column(String(MAX_TAG_LENGTH), primary_key=True)
+    listing_id = Column(Integer, ForeignKey("listings.listing_id"), primary_key=True, index=True) # Index serves per-listing replaces
+
+class TagListingCount(Base):
+    """Number of approved listings carrying each tag, kept in step with listing_tags for the popular-tags endpoint."""
+    __tablename__ = "tag_listing_counts"
+
+    tag = Column(String(MAX_TAG_LENGTH), primary_key=True)
+    approved_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_tag_listing_counts_popularity", "approved_count", "tag"), # Most used first; only ties need sorting
+    )
+
+def normalize_tag(tag: str) -> str:
+    """Lowercase, single-spaced and cut to MAX_TAG_LENGTH, so 'Graphing  Calculator' and 'graphing calculator' are one tag."""
+    return " ".join(tag.split()).lower()[:MAX_TAG_LENGTH].strip()
+
+def parse_tags(search_keywords: Optional[str]) -> List[str]:
+    """The distinct normalized tags of a comma-separated keyword string, in order."""
+    tags = (normalize_tag(keyword) for keyword in (search_keywords or "").split(","))
+    return list(dict.fromkeys(tag for tag in tags if tag))
+
+def _add_to_tag_listing_counts(connection, tags: Iterable[str], delta: int) -> None:
+    counts = TagListingCount.__table__
+    for tag in tags:
+        result = connection.execute(
+            counts.update().where(counts.c.tag == tag).values(approved_count=counts.c.approved_count + delta)
+        )
+        if result.rowcount == 0:
+            connection.execute(counts.insert().values(tag=tag, approved_count=max(delta, 0)))
+
+def _replace_listing_tags(connection, listing_id: int, tags: List[str]) -> None:
+    listing_tags = ListingTag.__table__
+    connection.execute(listing_tags.delete().where(listing_tags.c.listing_id == listing_id))
+    if tags:
+        connection.execute(listing_tags.insert(), [{"tag": tag, "listing_id": listing_id} for tag in tags])
+
+def _tag_inserted_listing(mapper, connection, target):
+    tags = parse_tags(target.search_keywords)
+    _replace_listing_tags(connection, target.listing_id, tags)
+    if target.status == COUNTED_LISTING_STATUS:
+        _add_to_tag_listing_counts(connection, tags, 1)
+
+def _tag_updated_listing(mapper, connection, target):
+    old_keywords, old_status = _committed_value(target, "search_keywords"), _committed_value(target, "status")
+    if (old_keywords, old_status) == (target.search_keywords, target.status):
+        return
+    old_tags, new_tags = parse_tags(old_keywords), parse_tags(target.search_keywords)
+    if old_tags != new_tags:
+        _replace_listing_tags(connection, target.listing_id, new_tags)
+    old_counted = set(old_tags) if old_status == COUNTED_LISTING_STATUS else set()
+    new_counted = set(new_tags) if target.status == COUNTED_LISTING_STATUS else set()
+    _add_to_tag_listing_counts(connection, sorted(old_counted - new_counted), -1)
+    _add_to_tag_listing_counts(connection, sorted(new_counted - old_counted), 1)
+
+def _untag_deleted_listing(mapper, connection, target):
+    _replace_listing_tags(connection, target.listing_id, [])
+    if _committed_value(target, "status") == COUNTED_LISTING_STATUS:
+        _add_to_tag_listing_counts(connection, parse_tags(_committed_value(target, "search_keywords")), -1)
+
+def rebuild_listing_tags(connection) -> int:
+    """Recompute listing_tags and tag_listing_counts from listings.search_keywords. Returns the number of tags written."""
+    rows, approved = [], {}
+    for listing_id, search_keywords, status in connection.execute(
+        select(Listing.listing_id, Listing.search_keywords, Listing.status).where(Listing.search_keywords.isnot(None))
+    ):
+        for tag in parse_tags(search_keywords):
+            rows.append({"tag": tag, "listing_id": listing_id})
+            if status == COUNTED_LISTING_STATUS:
+                approved[tag] = approved.get(tag, 0) + 1
+    connection.execute(ListingTag.__table__.delete())
+    connection.execute(TagListingCount.__table__.delete())
+    if rows:
+        connection.execute(ListingTag.__table__.insert(), rows)
+    if approved:
+        connection.execute(TagListingCount.__table__.insert(), [{"tag": tag, "approved_count": count} for tag, count in approved.items()])
+    return len(rows)
+
+def ensure_listing_tags(engine) -> None:
+    """Fill the tag tables for databases whose listings predate them."""
+    with engine.begin() as connection:
+        tagged = connection.execute(select(ListingTag.listing_id).limit(1)).first()
+        keywords = connection.execute(
+            select(Listing.listing_id).where(Listing.search_keywords.isnot(None), Listing.search_keywords != "").limit(1)
+        ).first()
+        if keywords is not None and tagged is None:
+            rebuild_listing_tags(connection)
+
+event.listen(Listing, "after_insert", _tag_inserted_listing)
+event.listen(Listing, "after_update", _tag_updated_listing)
+event.listen(Listing, "before_delete", _untag_deleted_listing) # Before, so no tag row ever points at a missing listing
+
+# --- Search suggestions ---
+SUGGESTION_PREFIX_LENGTH = 4 # Longer prefixes are answered from the rows of their first SUGGESTION_PREFIX_LENGTH characters
+
+def listing_suggestions(title: Optional[str], search_keywords: Optional[str]) -> List[str]:
+    """The phrases an approved listing adds to typeahead suggestions: its title and each of its search keywords."""
+    return [title, *(keyword.strip() for keyword in (search_keywords or "").split(",") if keyword.strip())]
+
+class SearchSuggestion(Base):
+    """
+    Typeahead completions for /api/search/suggest without the in-memory search engine: the titles and
+    search keywords of approved listings and the names of active categories, one row per phrase and
+    prefix (up to SUGGESTION_PREFIX_LENGTH characters) of one of its words, the same keys as
+    search_engine.suggest. Every row carries the phrase's weight, so the best completions of a prefix
+    are the first rows of one index range. Maintained by the Listing and Category mapper events below.
+    """
+    __tablename__ = "search_suggestions"
+
+    prefix = Column(String(SUGGESTION_PREFIX_LENGTH), primary_key=True)
+    phrase = Column(String(255), primary_key=True, index=True) # normalize_phrase(text); the index serves weight changes
+    text = Column(String(255), nullable=False) # As first suggested, for display
+    weight = Column(Integer, nullable=False) # Approved listings using the phrase, plus CATEGORY_SUGGESTION_WEIGHT per active category
+    starts_phrase = Column(Boolean, nullable=False) # The prefix starts the phrase rather than a later word of it
+
+    __table_args__ = (
+        Index("ix_search_suggestions_rank", "prefix", weight.desc(), starts_phrase.desc(), "phrase"), # The order completions are returned in
+    )
+
+def _suggestion_rows(text: str, phrase: str, weight: int) -> List[dict]:
+    prefixes = {
+        key[:length] for key in phrase_keys(phrase) for length in range(1, min(len(key), SUGGESTION_PREFIX_LENGTH) + 1)
+    }
+    return [
+        {"prefix": prefix, "phrase": phrase, "text": text, "weight": weight, "starts_phrase": phrase.startswith(prefix)}
+        for prefix in sorted(prefixes) if not prefix.endswith(" ") # Queries are normalized; no prefix ends in a space
+    ]
+
+def _add_to_search_suggestions(connection, texts: Iterable[Optional[str]], delta: int) -> None:
+    suggestions = SearchSuggestion.__table__
+    for text in texts:
+        phrase = normalize_phrase(text)
+        if not phrase:
+            continue
+        result = connection.execute(
+            suggestions.update().where(suggestions.c.phrase == phrase).values(weight=suggestions.c.weight + delta)
+        )
+        if result.rowcount == 0 and delta > 0:
+            connection.execute(suggestions.insert(), _suggestion_rows(" ".join(text.split()), phrase, delta))
+        elif delta < 0:
+            connection.execute(suggestions.delete().where(suggestions.c.phrase == phrase, suggestions.c.weight <= 0))
+
+def _suggest_inserted_listing(mapper, connection, target):
+    if target.status == COUNTED_LISTING_STATUS:
+        _add_to_search_suggestions(connection, listing_suggestions(target.title, target.search_keywords), 1)
+
+def _suggest_updated_listing(mapper, connection, target):
+    old_status, old_title, old_keywords = (_committed_value(target, key) for key in ("status", "title", "search_keywords"))
+    if (old_status, old_title, old_keywords) == (target.status, target.title, target.search_keywords):
+        return
+    if old_status == COUNTED_LISTING_STATUS:
+        _add_to_search_suggestions(connection, listing_suggestions(old_title, old_keywords), -1)
+    if target.status == COUNTED_LISTING_STATUS:
+        _add_to_search_suggestions(connection, listing_suggestions(target.title, target.search_keywords), 1)
+
+def _unsuggest_deleted_listing(mapper, connection, target):
+    if _committed_value(target, "status") == COUNTED_LISTING_STATUS:
+        texts = listing_suggestions(_committed_value(target, "title"), _committed_value(target, "search_keywords"))
+        _add_to_search_suggestions(connection, texts, -1)
+
+def _suggest_inserted_category(mapper, connection, target):
+    if target.is_active:
+        _add_to_search_suggestions(connection, [target.name], CATEGORY_SUGGESTION_WEIGHT)
+
+def _suggest_updated_category(mapper, connection, target):
+    old_active, old_name = _committed_value(target, "is_active"), _committed_value(target, "name")
+    if (old_active, old_name) == (target.is_active, target.name):
+        return
+    if old_active:
+        _add_to_search_suggestions(connection, [old_name], -CATEGORY_SUGGESTION_WEIGHT)
+    if target.is_active:
+        _add_to_search_suggestions(connection, [target.name], CATEGORY_SUGGESTION_WEIGHT)
+
+def _unsuggest_deleted_category(mapper, connection, target):
+    if _committed_value(target, "is_active"):
+        _add_to_search_suggestions(connection, [_committed_value(target, "name")], -CATEGORY_SUGGESTION_WEIGHT)
+
+def rebuild_search_suggestions(connection) -> int:
+    """Recompute search_suggestions from approved listings and active categories. Returns the number of phrases."""
+    phrases: Dict[str, List] = {} # normalized phrase -> [display text, weight]
+    def add(text, weight):
+        phrase = normalize_phrase(text)
+        if phrase:
+            phrases.setdefault(phrase, [" ".join(text.split()), 0])[1] += weight
+    listings = connection.execute(
+        select(Listing.title, Listing.search_keywords).where(Listing.status == COUNTED_LISTING_STATUS).order_by(Listing.listing_id)
+    )
+    for title, search_keywords in listings:
+        for text in listing_suggestions(title, search_keywords):
+            add(text, 1)
+    for name in connection.execute(select(Category.name).where(Category.is_active == True).order_by(Category.category_id)).scalars():
+        add(name, CATEGORY_SUGGESTION_WEIGHT)
+    rows = [row for phrase, (text, weight) in phrases.items() for row in _suggestion_rows(text, phrase, weight)]
+    connection.execute(SearchSuggestion.__table__.delete())
+    if rows:
+        connection.execute(SearchSuggestion.__table__.insert(), rows)
+    return len(phrases)
+
+def ensure_search_suggestions(engine) -> None:
+    """Fill search_suggestions for databases whose listings and categories predate it."""
+    with engine.begin() as connection:
+        if connection.execute(select(SearchSuggestion.phrase).limit(1)).first() is None:
+            rebuild_search_suggestions(connection)
+
+event.listen(Listing, "after_insert", _suggest_inserted_listing)
+event.listen(Listing, "after_update", _suggest_updated_listing)
+event.listen(Listing, "after_delete", _unsuggest_deleted_listing)
+event.listen(Category, "after_insert", _suggest_inserted_category)
+event.listen(Category, "after_update", _suggest_updated_category)
+event.listen(Category, "after_delete", _unsuggest_deleted_category)
+
+# --- Listing vocabulary ---
+MAX_TERM_LENGTH = 64 # Longer tokens (links, serial numbers) are left out of the vocabulary
+_VOCABULARY_FIELDS = ("title", "search_keywords", "description")
+
+def vocabulary_terms(*fields: Optional[str]) -> Set[str]:
+    """The distinct terms of a listing's fields, as search_engine.tokenize splits them."""
+    return {term for field in fields for term in tokenize(field) if len(term) <= MAX_TERM_LENGTH}
+
+class ListingTerm(Base):
+    """
+    The vocabulary fuzzy searches correct misspelled terms against when the in-memory search engine is
+    off: every term of the title, search keywords or description of an approved listing, with the number
+    of approved listings using it. Maintained by the Listing mapper events below.
+    """
+    __tablename__ = "listing_terms"
+
+    term = Column(String(MAX_TERM_LENGTH), primary_key=True)
+    approved_count = Column(Integer, nullable=False)
+
+class ListingTermTrigram(Base):
+    """
+    The trigrams of every term in listing_terms (see search_engine.fuzzy.term_trigrams), so the candidate
+    corrections of a term, those sharing enough of its trigrams, are one grouped index lookup.
+    """
+    __tablename__ = "listing_term_trigrams"
+
+    trigram = Column(String(3), primary_key=True)
+    term = Column(String(MAX_TERM_LENGTH), ForeignKey("listing_terms.term"), primary_key=True, index=True) # Index serves term deletes
+
+def _add_to_listing_terms(connection, terms: Iterable[str], delta: int) -> None:
+    terms = sorted(terms)
+    if not terms:
+        return
+    counts, trigrams = ListingTerm.__table__, ListingTermTrigram.__table__
+    connection.execute(counts.update().where(counts.c.term.in_(terms)).values(approved_count=counts.c.approved_count + delta))
+    if delta > 0:
+        known = set(connection.execute(select(counts.c.term).where(counts.c.term.in_(terms))).scalars())
+        new_terms = [term for term in terms if term not in known]
+        if new_terms:
+            connection.execute(counts.insert(), [{"term": term, "approved_count": delta} for term in new_terms])
+            connection.execute(trigrams.insert(), [
+                {"trigram": gram, "term": term} for term in new_terms for gram in sorted(term_trigrams(term))
+            ])
+        return
+    unused = connection.execute(select(counts.c.term).where(counts.c.term.in_(terms), counts.c.approved_count <= 0)).scalars().all()
+    if unused:
+        connection.execute(trigrams.delete().where(trigrams.c.term.in_(unused)))
+        connection.execute(counts.delete().where(counts.c.term.in_(unused)))
+
+def _count_inserted_listing_terms(mapper, connection, target):
+    if target.status == COUNTED_LISTING_STATUS:
+        _add_to_listing_terms(connection, vocabulary_terms(*(getattr(target, key) for key in _VOCABULARY_FIELDS)), 1)
+
+def _count_updated_listing_terms(mapper, connection, target):
+    old_status, old_fields = _committed_value(target, "status"), [_committed_value(target, key) for key in _VOCABULARY_FIELDS]
+    new_fields = [getattr(target, key) for key in _VOCABULARY_FIELDS]
+    if (old_status, old_fields) == (target.status, new_fields):
+        return
+    old_terms = vocabulary_terms(*old_fields) if old_status == COUNTED_LISTING_STATUS else set()
+    new_terms = vocabulary_terms(*new_fields) if target.status == COUNTED_LISTING_STATUS else set()
+    _add_to_listing_terms(connection, old_terms - new_terms, -1)
+    _add_to_listing_terms(connection, new_terms - old_terms, 1)
+
+def _uncount_deleted_listing_terms(mapper, connection, target):
+    if _committed_value(target, "status") == COUNTED_LISTING_STATUS:
+        _add_to_listing_terms(connection, vocabulary_terms(*(_committed_value(target, key) for key in _VOCABULARY_FIELDS)), -1)
+
+def rebuild_listing_terms(connection) -> int:
+    """Recompute listing_terms and listing_term_trigrams from the approved listings. Returns the number of terms."""
+    counts: Dict[str, int] = {}
+    listings = connection.execute(
+        select(Listing.title, Listing.search_keywords, Listing.description).where(Listing.status == COUNTED_LISTING_STATUS)
+    )
+    for fields in listings:
+        for term in vocabulary_terms(*fields):
+            counts[term] = counts.get(term, 0) + 1
+    connection.execute(ListingTermTrigram.__table__.delete())
+    connection.execute(ListingTerm.__table__.delete())
+    if counts:
+        connection.execute(ListingTerm.__table__.insert(), [{"term": term, "approved_count": count} for term, count in counts.items()])
+        connection.execute(ListingTermTrigram.__table__.insert(), [
+            {"trigram": gram, "term": term} for term in counts for gram in sorted(term_trigrams(term))
+        ])
+    return len(counts)
+
+def ensure_listing_terms(engine) -> None:
+    """Fill the vocabulary tables for databases whose approved listings predate them."""
+    with engine.begin() as connection:
+        filled = connection.execute(select(ListingTerm.term).limit(1)).first()
+        approved = connection.execute(select(Listing.listing_id).where(Listing.status == COUNTED_LISTING_STATUS).limit(1)).first()
+        if approved is not None and filled is None:
+            rebuild_listing_terms(connection)
+
+event.listen(Listing, "after_insert", _count_inserted_listing_terms)
+event.listen(Listing, "after_update", _count_updated_listing_terms)
+event.listen(Listing, "after_delete", _uncount_deleted_listing_terms)
+
+def listing_term_fields(*fields: Optional[str]) -> Dict[str, int]:
+    """The distinct terms of a listing's fields (see vocabulary_terms), each with a bitmask of the fields using it: bit i for fields[i]."""
+    masks: Dict[str, int] = {}
+    for bit, field in enumerate(fields):
+        for term in vocabulary_terms(field):
+            masks[term] = masks.get(term, 0) | 1 << bit
+    return masks
+
+class ListingTermPosting(Base):
+    """
+    The terms of every listing, whatever its status, with the fields each appears in (bit i of `fields` for
+    _VOCABULARY_FIELDS[i], the order of search_engine.FIELD_WEIGHTS). (term, listing_id) is the key, so without the
+    in-memory search engine a relevance or fuzzy search matches whole terms, like the engine, with one index range
+    per query term. Maintained by the Listing mapper events below.
+    """
+    __tablename__ = "listing_term_postings"
+
+    term = Column(String(MAX_TERM_LENGTH), primary_key=True)
+    listing_id = Column(Integer, ForeignKey("listings.listing_id"), primary_key=True, index=True) # Index serves per-listing replaces
+    fields = Column(Integer, nullable=False)
+
+def _replace_listing_term_postings(connection, listing_id: int, masks: Dict[str, int]) -> None:
+    postings = ListingTermPosting.__table__
+    connection.execute(postings.delete().where(postings.c.listing_id == listing_id))
+    if masks:
+        connection.execute(postings.insert(), [
+            {"term": term, "listing_id": listing_id, "fields": fields} for term, fields in sorted(masks.items())
+        ])
+
+def _post_inserted_listing_terms(mapper, connection, target):
+    _replace_listing_term_postings(connection, target.listing_id, listing_term_fields(*(getattr(target, key) for key in _VOCABULARY_FIELDS)))
+
+def _post_updated_listing_terms(mapper, connection, target):
+    old_fields = [_committed_value(target, key) for key in _VOCABULARY_FIELDS]
+    new_fields = [getattr(target, key) for key in _VOCABULARY_FIELDS]
+    if old_fields != new_fields:
+        _replace_listing_term_postings(connection, target.listing_id, listing_term_fields(*new_fields))
+
+def _unpost_deleted_listing_terms(mapper, connection, target):
+    _replace_listing_term_postings(connection, target.listing_id, {})
+
+def rebuild_listing_term_postings(connection) -> int:
+    """Recompute listing_term_postings from every listing's fields. Returns the number of postings written."""
+    rows = [
+        {"term": term, "listing_id": listing_id, "fields": fields}
+        for listing_id, *values in connection.execute(select(Listing.listing_id, *(getattr(Listing, key) for key in _VOCABULARY_FIELDS)))
+        for term, fields in listing_term_fields(*values).items()
+    ]
+    connection.execute(ListingTermPosting.__table__.delete())
+    if rows:
+        connection.execute(ListingTermPosting.__table__.insert(), rows)
+    return len(rows)
+
+def ensure_listing_term_postings(engine) -> None:
+    """Fill listing_term_postings for databases whose listings predate it."""
+    with engine.begin() as connection:
+        posted = connection.execute(select(ListingTermPosting.listing_id).limit(1)).first()
+        listed = connection.execute(select(Listing.listing_id).limit(1)).first()
+        if listed is not None and posted is None:
+            rebuild_listing_term_postings(connection)
+
+event.listen(Listing, "after_insert", _post_inserted_listing_terms)
+event.listen(Listing, "after_update", _post_updated_listing_terms)
+event.listen(Listing, "before_delete", _unpost_deleted_listing_terms) # Before, so no posting ever points at a missing listing
+
+class ListingAvailability(Base):
+    """
+    One weekly slot of a listing's availability (see application.availability), set by crud from
+    ListingCreate/ListingUpdate. The (day_of_week, start_minute, end_minute, listing_id) index answers
+    available_at searches: the slots of that day starting by that minute are one index range, and the
+    end and listing id are read from the index entries, so no listing text is parsed at query time.
+    """
+    __tablename__ = "listing_availability"
+
+    slot_id = Column(Integer, primary_key=True)
+    listing_id = Column(Integer, ForeignKey("listings.listing_id", ondelete="CASCADE"), nullable=False, index=True)
+    day_of_week = Column(Integer, nullable=False) # 0 is Monday
+    start_minute = Column(Integer, nullable=False) # Minutes after midnight
+    end_minute = Column(Integer, nullable=False) # Exclusive, at most 1440
+
+    __table_args__ = (
+        CheckConstraint("day_of_week BETWEEN 0 AND 6 AND start_minute >= 0 AND end_minute <= 1440 AND start_minute < end_minute", name="check_availability_slot"),
+        Index("ix_listing_availability_day_start", "day_of_week", "start_minute", "end_minute", "listing_id"),
     )
+
+def ensure_listing_availability(engine) -> int:
+    """
+    Give listings whose slots were never set (databases that predate the table, seed data) the slots
+    parse_availability reads from their free-text availability, once: afterwards they count as set.
+    Listings whose slots crud set are left alone, including those given no slots on purpose.
+    Adds the availability_slots_set column to a listings table created before it. Returns the number of slots written.
+    """
+    columns = {column["name"] for column in inspect(engine).get_columns(Listing.__tablename__)}
+    listings = Listing.__table__
+    with engine.begin() as connection:
+        if Listing.availability_slots_set.key not in columns:
+            connection.execute(text(f"ALTER TABLE {Listing.__tablename__} ADD COLUMN {Listing.availability_slots_set.key} BOOLEAN NOT NULL DEFAULT 0"))
+        unslotted = connection.execute(
+            select(Listing.listing_id, Listing.availability).where(
+                Listing.availability_slots_set == False,
+                Listing.availability.isnot(None),
+                Listing.listing_id.notin_(select(ListingAvailability.listing_id)),
+            )
+        ).all()
+        rows = [
+            {"listing_id": listing_id, "day_of_week": day, "start_minute": start, "end_minute": end}
+            for listing_id, availability in unslotted for day, start, end in parse_availability(availability)
+        ]
+        if rows:
+            connection.execute(ListingAvailability.__table__.insert(), rows)
+        connection.execute(listings.update().where(listings.c.availability_slots_set == False).values(
+            availability_slots_set=True,
+            updated_at=listings.c.updated_at, # Not an edit of the listing
+        ))
+    return len(rows)
+
+# Keep the full-text search index tied to the lifecycle of the listings table
+# (covers create_all in app.py, seed.py and the tests).
+event.listen(Listing.__table__, "after_create", lambda target, connection, **kw: create_fulltext_index(connection))
+event.listen(Listing.__table__, "before_drop", lambda target, connection, **kw: drop_fulltext_index(connection))
+
 class ListingImage(Base):
     __tablename__ = "listing_images"
     
@@ -92,6 +751,74 @@ class ListingImage(Base):
     # Relationships
     listing = relationship("Listing", back_populates="images")
 
+    __table_args__ = (
+        Index("ix_listing_images_listing", "listing_id", "is_primary", "display_order"), # A listing's images and its thumbnail for search hits
+    )
+
+# --- Conditional GET ---
+class TableVersion(Base):
+    """
+    A version counter per table, bumped in the same transaction as every ORM write to the table (see the
+    mapper events below). Unlike the per-process generations of application.cache, every worker reads the
+    same value, so ETags derived from it hold whichever worker served the request.
+    """
+    __tablename__ = "table_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+LISTINGS_VERSION = Listing.__tablename__ # Image changes count as listing changes: listings embed their images
+CATEGORIES_VERSION = Category.__tablename__
+
+def bump_table_version(connection, name: str) -> None:
+    versions = TableVersion.__table__
+    result = connection.execute(versions.update().where(versions.c.name == name).values(version=versions.c.version + 1))
+    if result.rowcount == 0: # Database older than the versions table and not backfilled yet
+        connection.execute(versions.insert().values(name=name, version=1))
+
+def _bump_listings_version(mapper, connection, target):
+    bump_table_version(connection, LISTINGS_VERSION)
+
+def _bump_categories_version(mapper, connection, target):
+    bump_table_version(connection, CATEGORIES_VERSION)
+
+def _bump_listing_revision(mapper, connection, target):
+    # Flushes that only change a relationship collection leave the row (and the response) as it is
+    if object_session(target).is_modified(target, include_collections=False):
+        target.revision = Listing.revision + 1 # Incremented in the UPDATE itself, so concurrent edits never share a revision
+        bump_table_version(connection, LISTINGS_VERSION)
+
+def _bump_image_listing_revision(mapper, connection, target):
+    listings = Listing.__table__
+    connection.execute( # Also sets updated_at (onupdate), which becomes the listing's Last-Modified
+        listings.update().where(listings.c.listing_id == target.listing_id).values(revision=listings.c.revision + 1)
+    )
+    bump_table_version(connection, LISTINGS_VERSION)
+
+def ensure_table_versions(engine) -> None:
+    """Add listings.revision to a listings table created before it, and the version row of every versioned table."""
+    columns = {column["name"] for column in inspect(engine).get_columns(Listing.__tablename__)}
+    versions = TableVersion.__table__
+    with engine.begin() as connection:
+        if Listing.revision.key not in columns:
+            connection.execute(text(f"ALTER TABLE {Listing.__tablename__} ADD COLUMN {Listing.revision.key} INTEGER NOT NULL DEFAULT 0"))
+        existing = set(connection.execute(select(versions.c.name)).scalars())
+        for name in (LISTINGS_VERSION, CATEGORIES_VERSION):
+            if name not in existing:
+                connection.execute(versions.insert().values(name=name, version=0))
+
+# Every ORM write (crud, admin status updates, seed.py) bumps the versions in its own transaction;
+# Core UPDATEs that leave responses as they are (views_count, sort keys) don't
+event.listen(Listing, "before_update", _bump_listing_revision)
+event.listen(Listing, "after_insert", _bump_listings_version)
+event.listen(Listing, "after_delete", _bump_listings_version)
+event.listen(ListingImage, "after_insert", _bump_image_listing_revision)
+event.listen(ListingImage, "after_update", _bump_image_listing_revision)
+event.listen(ListingImage, "after_delete", _bump_image_listing_revision)
+event.listen(Category, "after_insert", _bump_categories_version)
+event.listen(Category, "after_update", _bump_categories_version)
+event.listen(Category, "after_delete", _bump_categories_version)
+
 class Conversation(Base):
    __tablename__ = "conversations"
 
@@ -149,3 +876,105 @@ class Review(Base):
         CheckConstraint("rating >= 1 AND rating <= 5", name="check_rating_range"),
         UniqueConstraint('listing_id', 'reviewer_id', name='uq_listing_reviewer_one_review')
     )
+
+def _refresh_reviewed_seller_rating(mapper, connection, target):
+    refresh_seller_rating(connection, target.reviewee_id)
+    previous = _committed_value(target, "reviewee_id")
+    if previous != target.reviewee_id:
+        refresh_seller_rating(connection, previous)
+
+# Keeps Listing.seller_rating (the sort=seller_rating key) in step with every review write
+event.listen(Review, "after_insert", _refresh_reviewed_seller_rating)
+event.listen(Review, "after_update", _refresh_reviewed_seller_rating)
+event.listen(Review, "after_delete", _refresh_reviewed_seller_rating)
+
+# --- Saved searches ---
+class SavedSearch(Base):
+    """
+    A search a user saved to be told about new matches. Listings are matched when they are approved
+    (crud.match_saved_searches), through saved_search_keys, and recorded in saved_search_matches;
+    matches with a match_id above last_seen_match_id are the new ones since the user last checked.
+    """
+    __tablename__ = "saved_searches"
+
+    saved_search_id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False, index=True)
+    name = Column(String(100), nullable=False)
+    query = Column(String(40), nullable=True) # Every word must appear in the listing, as with sort=relevance
+    category_id = Column(Integer, ForeignKey("categories.category_id"), nullable=True)
+    include_descendants = Column(Boolean, default=False, nullable=False)
+    min_price = Column(Float, nullable=True)
+    max_price = Column(Float, nullable=True)
+    item_condition = Column(String(20), nullable=True)
+    is_skill_sharing = Column(Boolean, nullable=True)
+    key_count = Column(Integer, nullable=False) # Number of keys below; a listing matches when it has all of them
+    last_seen_match_id = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    keys = relationship("SavedSearchKey", cascade="all, delete-orphan")
+
+class SavedSearchKey(Base):
+    """
+    Inverted index of saved searches: one row per query word ('t:<word>') and per category filter
+    ('c:<id>', or 's:<id>' with include_descendants), or a single '*' row for a search with neither.
+    A listing's own keys find every saved search it can match in one grouped index lookup.
+    """
+    __tablename__ = "saved_search_keys"
+
+    key = Column(String(60), primary_key=True)
+    saved_search_id = Column(Integer, ForeignKey("saved_searches.saved_search_id", ondelete="CASCADE"), primary_key=True, index=True)
+
+class SavedSearchMatch(Base):
+    __tablename__ = "saved_search_matches"
+
+    match_id = Column(Integer, primary_key=True) # Increasing, so 'new since last check' is an index range
+    saved_search_id = Column(Integer, ForeignKey("saved_searches.saved_search_id", ondelete="CASCADE"), nullable=False)
+    listing_id = Column(Integer, ForeignKey("listings.listing_id", ondelete="CASCADE"), nullable=False, index=True)
+    matched_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("saved_search_id", "listing_id", name="uq_saved_search_match"),
+        Index("ix_saved_search_matches_search_match", "saved_search_id", "match_id"),
+    )
+
+# --- Trending ---
+class ListingActivity(Base):
+    """
+    Views and conversations started per listing and hour (hours since the Unix epoch), written in
+    batches by application.trending. Rows older than the trending window are pruned, so a listing
+    has at most one row per hour of the window.
+    """
+    __tablename__ = "listing_activity"
+
+    listing_id = Column(Integer, ForeignKey("listings.listing_id", ondelete="CASCADE"), primary_key=True)
+    hour = Column(Integer, primary_key=True, index=True) # Index serves pruning
+    views = Column(Integer, nullable=False, default=0)
+    conversations = Column(Integer, nullable=False, default=0)
+
+class TrendingListing(Base):
+    """
+    The top trending approved listings of each category (and of all categories, category_id 0),
+    with their decayed score as of scored_hour. Maintained incrementally by application.trending.
+    """
+    __tablename__ = "trending_listings"
+
+    category_id = Column(Integer, primary_key=True) # Not a foreign key: 0 stands for all categories
+    listing_id = Column(Integer, ForeignKey("listings.listing_id", ondelete="CASCADE"), primary_key=True, index=True)
+    score = Column(Float, nullable=False)
+    scored_hour = Column(Integer, nullable=False)
+
+class ListingDailyActivity(Base):
+    """Daily rollup of listing_activity (days since the Unix epoch, UTC), kept after the hourly rows are pruned."""
+    __tablename__ = "listing_daily_activity"
+
+    listing_id = Column(Integer, ForeignKey("listings.listing_id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Integer, primary_key=True)
+    views = Column(Integer, nullable=False, default=0)
+    conversations = Column(Integer, nullable=False, default=0)
+
+class ListingViewerSketch(Base):
+    """HyperLogLog sketch of the distinct viewers of a listing (application/hyperloglog.py), compressed."""
+    __tablename__ = "listing_viewer_sketches"
+
+    listing_id = Column(Integer, ForeignKey("listings.listing_id", ondelete="CASCADE"), primary_key=True)
+    registers = Column(LargeBinary, nullable=False)
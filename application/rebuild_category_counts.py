@@ -0,0 +1,32 @@
+"""
+Recompute the per-category approved listing counters (category_listing_counts) from the listings table.
+
+The counters are kept current by every listing write made through the ORM; run this after
+changing listings some other way (raw SQL, restoring a backup) or if /api/categories counts drift:
+
+    python application/rebuild_category_counts.py
+"""
+import os
+import sys
+import logging
+from dotenv import load_dotenv
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: [%(name)s] %(message)s')
+logger = logging.getLogger(__name__)
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root) # Add project root to Python path
+load_dotenv(dotenv_path=os.path.join(project_root, '.env'))
+
+from application.database.database import engine
+from application.database.models import rebuild_category_listing_counts
+
+
+def main() -> None:
+    with engine.begin() as connection: # One transaction: readers see the old counts until it commits
+        approved = rebuild_category_listing_counts(connection)
+    logger.info(f"Category listing counts rebuilt: {approved} approved listings counted.")
+
+
+if __name__ == "__main__":
+    main()
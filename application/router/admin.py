@@ -1,11 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Any, Iterable, Iterator, List, Optional
+import csv
+import io
+import json
 
 from application.database.database import get_db
 from application.database import crud, models
+from application.database.models import parse_tags
 from application import schemas
 from application.security import get_current_admin_user # Import the new admin dependency
+from application.cache import all_cache_stats
+from application.search_engine import listing_engine
 
 router = APIRouter(
     prefix="/admin", # This will be the prefix for admin endpoints
@@ -85,6 +92,74 @@ async def get_all_listings_admin(
 
     return listings
 
+# --- Listing export ---
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+def _export_value(value: Any) -> Any:
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+def _ndjson_chunks(batches: Iterable[List[Any]]) -> Iterator[str]:
+    for batch in batches:
+        yield "".join(
+            json.dumps({key: _export_value(value) for key, value in zip(crud.LISTING_EXPORT_FIELDS, row)}) + "\n"
+            for row in batch
+        )
+
+def _csv_chunks(batches: Iterable[List[Any]]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(crud.LISTING_EXPORT_FIELDS)
+    for batch in batches:
+        writer.writerows([_export_value(value) for value in row] for row in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell(): # Header of an empty export
+        yield buffer.getvalue()
+
+@router.get("/listings/export")
+async def export_listings(
+    db: Session = Depends(get_db),
+    current_admin_user: models.User = Depends(get_current_admin_user), # Requires admin authentication
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="'ndjson' (one JSON object per line) or 'csv'."),
+    q: Optional[str] = Query(None, description="Search query for title, description, or keywords"),
+    category_id: Optional[int] = Query(None, description="Filter by category ID. 0 means all categories."),
+    include_descendants: bool = Query(False, description="Also match listings in every subcategory of category_id."),
+    tags: Optional[str] = Query(None, max_length=200, description="Comma-separated tags; listings must carry all of them."),
+    min_price: Optional[float] = Query(None, ge=0, description="Minimum price filter."),
+    max_price: Optional[float] = Query(None, ge=0, description="Maximum price filter."),
+    item_condition: Optional[str] = Query(None, description="Filter by item condition."),
+    is_skill_sharing: Optional[bool] = Query(None, description="Filter by skill sharing status."),
+    status: Optional[str] = Query(None, description="Filter by listing status; all statuses when omitted."),
+):
+    """
+    Every listing matching the filters (the /admin/listings filters, plus include_descendants and tags)
+    in one streamed response, in listing_id order. Rows are read from a server-side cursor in batches
+    and written out as they arrive, so memory use doesn't grow with the size of the export.
+    """
+    try:
+        statement = crud.listing_export_statement(
+            db,
+            search=q,
+            category_id=category_id if category_id and category_id > 0 else None,
+            include_descendants=include_descendants,
+            tags=parse_tags(tags) or None,
+            min_price=min_price,
+            max_price=max_price,
+            item_condition=item_condition,
+            is_skill_sharing=is_skill_sharing,
+            status=status,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    batches = crud.stream_listing_export(db.get_bind(), statement)
+    chunks = _csv_chunks(batches) if format == "csv" else _ndjson_chunks(batches)
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="listings.{format}"'},
+    )
+
 @router.put("/listings/{listing_id}/approve", response_model=schemas.Listing)
 async def approve_listing(
     listing_id: int,
@@ -234,6 +309,28 @@ async def needs_changes_listing(
 
     return updated_listing
 
+@router.get("/cache-stats")
+async def get_cache_stats(
+    current_admin_user: models.User = Depends(get_current_admin_user) # Requires admin authentication
+):
+    """
+    Hit/miss statistics of this worker's in-process caches (e.g. search results), for sizing them.
+    Each gunicorn worker has its own caches, so numbers are per worker.
+    """
+    return all_cache_stats()
+
+@router.get("/search-engine-stats")
+async def get_search_engine_stats(
+    current_admin_user: models.User = Depends(get_current_admin_user) # Requires admin authentication
+):
+    """
+    Size and approximate memory footprint of this worker's in-memory search index
+    (including bytes_per_10k_listings), or enabled=False when SEARCH_ENGINE=memory is not set.
+    """
+    if not listing_engine.ready:
+        return {"enabled": False}
+    return {"enabled": True, **listing_engine.memory_report()}
+
 # TODO: Add other admin endpoints (view all listings)
 # The GET /admin/listings endpoint added earlier covers viewing all listings with filters.
 # Remaining admin tasks include frontend implementation and integration.
\ No newline at end of file
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File # Removed Form, Annotated for create_listing
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status, UploadFile, File # Removed Form, Annotated for create_listing
 from sqlalchemy.orm import Session
 from typing import List, Optional # Keep List from typing
 import shutil
@@ -8,16 +8,44 @@ from PIL import Image # Added PIL
 import re # For sanitization
 import uuid # For sanitization
 
-from application.database import crud, models
+from application.database import crud, models, listing_events
 from application.database.database import get_db
 from application import schemas
 from application.security import get_current_active_user, get_current_active_user_optional # Import the new optional dependency
+from application.view_counter import view_counter
+from application.conditional import http_date, is_not_modified, not_modified, weak_etag
+from application.cache import TTLCache, SingleFlight
+from application.trending import TRENDING_TOP_K, get_trending, trending_recorder
 
 router = APIRouter(
     prefix="/listings",
     tags=["listings"],
 )
 
+# --- Listing Detail Cache ---
+# A listing shared in a group chat draws hundreds of GETs at once. Approved listings' serialized
+# responses are cached per listing, tagged with the revision and categories version they were built
+# at: every request reads those versions anyway (see read_listing), so a write through any worker
+# makes the entry miss. Concurrent misses for one listing are coalesced into a single load.
+# Listing events drop entries as soon as this worker changes a listing; listings that aren't
+# approved are only visible to their owner and never enter the cache.
+LISTING_CACHE_SIZE = int(os.getenv("LISTING_CACHE_SIZE", "1024")) # 0 disables the cache
+LISTING_CACHE_TTL_SECONDS = float(os.getenv("LISTING_CACHE_TTL_SECONDS", "300"))
+listing_detail_cache = TTLCache("listing_detail", maxsize=LISTING_CACHE_SIZE, ttl=LISTING_CACHE_TTL_SECONDS)
+listing_detail_loads = SingleFlight()
+_VIEWS_PLACEHOLDER = b'"views_count":0'
+
+@listing_events.subscribe
+def invalidate_listing_detail(change: str, listing_id: int, listing=None):
+    """Updates, image uploads/deletions, status changes (admin approvals) and deletions drop the cached response."""
+    listing_detail_cache.delete(listing_id)
+
+def _serialize_listing(db_listing: models.Listing) -> tuple:
+    """The listing's JSON body split around its views_count value, which changes with every view."""
+    body = schemas.Listing.model_validate(db_listing).model_copy(update={"views_count": 0}).model_dump_json().encode()
+    head, tail = body.split(_VIEWS_PLACEHOLDER, 1) # The only views_count: seller, images and category have none
+    return head + b'"views_count":', tail
+
 # Define Project Root and Backend Static Dir relative to this file (application/router/listings.py)
 PROJECT_ROOT_DIR = Path(__file__).resolve().parent.parent.parent
 BACKEND_STATIC_DIR = PROJECT_ROOT_DIR / "static"
@@ -183,31 +211,107 @@ async def read_my_listings(
     print(f"<<<<< DEBUG: READ_MY_LISTINGS ENDPOINT WAS HIT for user {current_user.user_id} >>>>>") # Debug print
     return crud.get_listings_by_seller_id(db=db, seller_id=current_user.user_id)
 
+@router.get("/my-listings/stats", response_model=schemas.SellerListingStats)
+async def read_my_listing_stats(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """
+    View statistics of all the current user's listings: views over the last 24 hours, 7 and 30 days
+    and estimated unique viewers, per listing and in total. Views by the seller are not counted;
+    recent views can take up to TRENDING_FLUSH_INTERVAL_SECONDS to appear.
+    """
+    return crud.get_seller_listing_stats(db, current_user.user_id)
+
+@router.get("/trending", response_model=List[schemas.TrendingListing])
+async def read_trending_listings(
+    category_id: Optional[int] = Query(None, description="Rank listings in this category and its subcategories (default: all categories)."),
+    limit: int = Query(20, ge=1, le=TRENDING_TOP_K, description="Maximum number of listings."),
+    db: Session = Depends(get_db)
+):
+    """
+    Approved listings with the most views and conversations lately, best first. Activity loses half
+    its weight every TRENDING_HALF_LIFE_HOURS; rankings are precomputed per category (see application/trending.py).
+    """
+    ranked = get_trending(db, category_id=category_id, limit=limit)
+    scores = dict(ranked)
+    hits = crud.get_search_hits(db, [listing_id for listing_id, _ in ranked])
+    return [schemas.TrendingListing(**hit, trending_score=round(scores[hit["listing_id"]], 4)) for hit in hits]
+
+def _viewer_key(request: Request, current_user: Optional[models.User]) -> str:
+    """Who is viewing, for unique viewer counts: the user, or for anonymous visitors a fingerprint of the client."""
+    if current_user is not None:
+        return f"u:{current_user.user_id}"
+    host = request.client.host if request.client else ""
+    return f"c:{host}|{request.headers.get('user-agent', '')}"
+
 @router.get("/{listing_id}", response_model=schemas.Listing)
-async def read_listing(
+def read_listing( # Not async: concurrent requests run in the threadpool, where cache misses for one listing coalesce
     listing_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: Optional[models.User] = Depends(get_current_active_user_optional) # Use optional dependency
 ):
-    db_listing = crud.get_listing(db, listing_id=listing_id)
-    if db_listing is None:
+    """
+    A listing with its images, seller and category. Served with an ETag and Last-Modified: a client
+    sending them back (If-None-Match / If-Modified-Since) gets an empty 304 while the listing, its
+    images and the categories are unchanged, decided without loading the listing. A 304 still counts as a view.
+    Approved listings are served from the listing detail cache.
+    """
+    validators = crud.get_listing_validators(db, listing_id=listing_id)
+    if validators is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Listing not found")
 
     # Access Control:
-    is_owner = current_user and db_listing.seller_id == current_user.user_id
+    is_owner = current_user and validators.seller_id == current_user.user_id
 
-    if not is_owner and db_listing.status != "approved":
+    if not is_owner and validators.status != "approved":
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, # Use 404 to not reveal existence to non-owners
             detail="Listing not found or not available for viewing."
         )
 
-    # Increment views count. Consider if this should only be for non-owners or 'approved' listings.
-    # For simplicity, incrementing if view access is granted.
-    db_listing.views_count = (db_listing.views_count or 0) + 1
-    db.commit()
-    db.refresh(db_listing)
-    return db_listing
+    # Count the view if view access is granted. The count is buffered and written in batches
+    # (see application/view_counter.py), so viewing a listing doesn't open a write transaction.
+    bind = db.get_bind()
+    view_counter.record(bind, listing_id)
+    if not is_owner: # Sellers checking their own listing don't make it trend or count in their stats
+        trending_recorder.record_view(bind, listing_id, viewer=_viewer_key(request, current_user))
+
+    etag = weak_etag("listing", listing_id, validators.revision, validators.categories_version)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(validators.last_modified),
+        # Only the owner may see a listing that isn't approved, so shared caches must not keep it
+        "Cache-Control": "no-cache" if validators.status == "approved" else "private, no-cache",
+    }
+    if is_not_modified(request, etag, validators.last_modified):
+        return not_modified(headers)
+
+    views_count = (validators.views_count or 0) + view_counter.pending(bind, listing_id)
+    if validators.status != "approved":
+        db_listing = crud.get_listing(db, listing_id=listing_id)
+        if db_listing is None: # Deleted since the validators were read
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Listing not found")
+        response.headers.update(headers)
+        return schemas.Listing.model_validate(db_listing).model_copy(update={"views_count": views_count})
+
+    version = (bind, validators.revision, validators.categories_version)
+    entry = listing_detail_cache.get(listing_id)
+    if entry is None or entry[0] != version:
+        def load():
+            db_listing = crud.get_listing(db, listing_id=listing_id)
+            if db_listing is None or db_listing.status != "approved": # Deleted or unapproved since the validators were read
+                return None
+            loaded = (version, *_serialize_listing(db_listing))
+            listing_detail_cache.set(listing_id, loaded)
+            return loaded
+        entry = listing_detail_loads.do((listing_id,) + version, load)
+        if entry is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Listing not found")
+    _, head, tail = entry
+    return Response(content=head + str(views_count).encode() + tail, media_type="application/json", headers=headers)
 
 @router.put("/{listing_id}", response_model=schemas.Listing)
 async def update_listing(
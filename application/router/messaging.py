@@ -13,6 +13,7 @@ from application.schemas import (
 )
 
 from application.security import get_current_active_user as get_current_user # Import centralized authentication dependency
+from application.trending import trending_recorder
 
 router = APIRouter(tags=["messaging"]) # No prefix here, main app.py will add /api
 
@@ -95,6 +96,7 @@ def initiate_conversation_with_message(
         )
         # If create_conversation doesn't commit and refresh, we might need to fetch it again or ensure it returns the full object.
         # Assuming crud.create_conversation returns the persisted Conversation object.
+        trending_recorder.record_conversation(db.get_bind(), request_data.listing_id) # Counts towards the listing trending
 
     # Create the initial message
     new_message = crud.create_message(
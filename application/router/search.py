@@ -1,24 +1,100 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import logging # Add logging import
 import datetime
+import hashlib
+import os
 from application.security import get_current_active_user
 
 from application.database.database import get_db
-from application.database import crud
+from application.database import crud, listing_events
+from application.cache import TTLCache, get_generation, bump_generation
+from application.conditional import etag_matches, is_not_modified, not_modified, weak_etag
 # Import ListingCreate along with other schemas
-from application.schemas import SearchResults, Listing as ListingSchema, Category as CategorySchema, ListingCreate, ListingUpdate, Review as ReviewSchema, ReviewCreate # Renamed Listing to ListingSchema to avoid conflict
+from application.schemas import SearchResults, SearchSpec, SearchBatch, SearchBatchResults, SearchSuggestions, TagCount, SavedSearch, SavedSearchCreate, SavedSearchCheck, Listing as ListingSchema, Category as CategorySchema, CategoryWithCounts, CategoryTree, ListingCreate, ListingUpdate, Review as ReviewSchema, ReviewCreate # Renamed Listing to ListingSchema to avoid conflict
 
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from application.database.models import User
+from application.database.models import User, parse_tags, LISTINGS_VERSION, CATEGORIES_VERSION
+from application.availability import parse_available_at
+from application.view_counter import view_counter
 from application.schemas import UserRead, UserCreate, Listing # Renamed Listing to ListingSchema
 from sqlalchemy.orm import Session
 from fastapi import status
 
 router = APIRouter()
 
+# --- Search Result Cache ---
+# Most search traffic repeats a few dozen parameter combinations (browsing, first pages),
+# so results are cached per normalized parameter tuple. Any listing write bumps the
+# 'listings' generation, which is part of the key, so cached pages never outlive a change
+# made through this worker. Result keys also carry the listings and categories table versions
+# read per request (models.TableVersion), which cover writes through other workers; for facet
+# counts the TTL bounds that staleness.
+LISTINGS_GENERATION = "listings"
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "512")) # 0 disables the cache
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "60"))
+search_results_cache = TTLCache("search_results", maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL_SECONDS)
+# Facet counts don't depend on the page, so they are cached per filter set and shared by all pages
+search_facets_cache = TTLCache("search_facets", maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL_SECONDS)
+# Totals above this are reported as "more than SEARCH_COUNT_LIMIT" (total_exact=false) unless exact_total=true;
+# counting every match of a broad search costs more than fetching its first page
+SEARCH_COUNT_LIMIT = int(os.getenv("SEARCH_COUNT_LIMIT", "10000"))
+
+# --- Category Tree Cache ---
+# The tree changes only with category writes, so each worker builds it once and serves the serialized
+# body from memory. The key is the 'categories' table version, which every category write bumps in the
+# database (whichever worker or script made it), so entries never go stale and need no TTL.
+category_tree_cache = TTLCache("category_tree", maxsize=2, ttl=None)
+
+@listing_events.subscribe
+def invalidate_listing_caches(change: str, listing_id: int, listing=None):
+    """Any listing create/update/delete/status/image change invalidates cached search results."""
+    bump_generation(LISTINGS_GENERATION)
+
+def _filters_cache_key(filters: dict) -> tuple:
+    """Normalize search filters so equivalent requests share one cache entry."""
+    return (
+        get_generation(LISTINGS_GENERATION),
+        filters.get("search"), # Already normalized by _run_search, which also searches for exactly this text
+        filters.get("category_id"),
+        bool(filters.get("include_descendants")),
+        tuple(sorted(filters.get("tags") or ())), # Already normalized by _run_search
+        filters.get("available_at"), # (day_of_week, minute), parsed by _run_search
+        filters.get("min_price"),
+        filters.get("max_price"),
+        filters.get("item_condition") or None,
+        filters.get("is_skill_sharing"),
+        filters.get("status"),
+        filters.get("sort"),
+        bool(filters.get("fuzzy")),
+    )
+
+def _search_cache_key(filters: dict, page: int, page_size: int, cursor: Optional[str], facets: tuple = (), view: str = crud.SEARCH_VIEW_FULL, exact_total: bool = False) -> tuple:
+    # In cursor mode the page number is irrelevant
+    return _filters_cache_key(filters) + (None if cursor else page, page_size, cursor or None, facets, view, exact_total)
+
+def _parse_facets(facets: Optional[str]) -> tuple:
+    """'category, price' -> ('category', 'price'); 'all' selects every facet. Raises ValueError for unknown names."""
+    if not facets:
+        return ()
+    requested = {name.strip().lower() for name in facets.split(",") if name.strip()}
+    if "all" in requested:
+        return crud.SEARCH_FACETS
+    unknown = requested.difference(crud.SEARCH_FACETS)
+    if unknown:
+        raise ValueError(f"Unknown facets: {', '.join(sorted(unknown))}. Choose from: {', '.join(crud.SEARCH_FACETS)}, all")
+    return tuple(facet for facet in crud.SEARCH_FACETS if facet in requested)
+
+def _get_facet_counts(db: Session, filters: dict, facets: tuple) -> dict:
+    key = _filters_cache_key(filters) + (facets,)
+    counts = search_facets_cache.get(key)
+    if counts is None:
+        counts = crud.get_search_facets(db, facets=list(facets), **filters)
+        search_facets_cache.set(key, counts)
+    return counts
+
 # JWT settings and get_current_user are now centralized in application.security
 # Endpoints in this router requiring authentication should import and use
 # get_current_active_user from application.security
@@ -81,8 +157,13 @@ router = APIRouter()
 
 @router.get("/search", response_model=SearchResults)
 async def search_listings(
+    request: Request,
+    response: Response,
     q: Optional[str] = Query(None, description="Search query for title, description, or keywords", min_length=0, max_length=40, regex="^[a-zA-Z0-9 ]*$"),
     category_id: Optional[int] = Query(None, description="Filter by category ID. 0 means all categories."),
+    include_descendants: bool = Query(False, description="Also match listings in every subcategory of category_id."),
+    tags: Optional[str] = Query(None, max_length=200, description="Comma-separated tags (from search keywords); listings must carry all of them."),
+    available_at: Optional[str] = Query(None, max_length=40, description="Only listings available then: a day and time ('tue 18:30') or an ISO datetime."),
     min_price: Optional[float] = Query(None, ge=0, description="Minimum price filter."),
     max_price: Optional[float] = Query(None, ge=0, description="Maximum price filter."),
     item_condition: Optional[str] = Query(None, description="Filter by item condition (e.g., 'new', 'used')."),
@@ -90,75 +171,302 @@ async def search_listings(
     status: Optional[str] = Query('approved', description="Filter by listing status (e.g., 'available', 'sold', 'approved'). Defaults to 'approved'."),
     page: int = Query(1, ge=1, description="Page number for pagination."),
     page_size: int = Query(20, ge=1, le=100, description="Number of results per page."),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous response's next_cursor. Takes precedence over page."),
+    sort: Optional[str] = Query(None, description="Result order. Default: title matches first, then newest. 'relevance': every word must match, ranked by BM25 (title > keywords > description) with the search engine on, by field weights alone without it. 'price_asc', 'price_desc' (price, or rate for skills), 'newest', 'views', 'seller_rating': matches in that order."),
+    fuzzy: bool = Query(False, description="Typo-tolerant search: words the listings don't use also match their closest spellings. Ranked like sort=relevance."),
+    view: str = Query(crud.SEARCH_VIEW_FULL, description="Result shape: 'full' listings, or 'compact' hits (id, title, price/rate, condition, thumbnail, seller username) for result lists."),
+    facets: Optional[str] = Query(None, description="Comma-separated facets to count for the current filters: category, item_condition, is_skill_sharing, price, or 'all'."),
+    exact_total: bool = Query(False, description="Count every match even past SEARCH_COUNT_LIMIT (10,000 by default); slower for broad searches."),
     db: Session = Depends(get_db)
 ):
     """
     Search for listings with optional filters including skill sharing status and listing status.
     
     - q: Search query.
-    - category_id: Filter by category.
+    - category_id: Filter by category; with include_descendants=true, by the category and all its subcategories.
+    - tags: exact tag matches (see /api/tags/popular), intersected through the listing_tags index.
+    - available_at: skill listings with a weekly availability slot covering that time, found through
+      the listing_availability interval index.
     - status: Filter by listing status (e.g., 'available', 'sold').
     - All filters are applied with AND condition.
+    - Paging: every response carries `next_cursor`; passing it back as `cursor` fetches the next page
+      at constant cost however deep it is. `page` (OFFSET-based) is kept for backward compatibility.
+    - sort: 'relevance' ranks multi-word queries by BM25 (a field-weighted SQL score without the search engine) instead of treating them as one literal phrase.
+      'price_asc'/'price_desc' (price, or rate for skill listings), 'newest', 'views' and 'seller_rating'
+      order all matches by that key; each is served by its own index.
+    - fuzzy: misspelled words ("calculater") also match close spellings ("calculator"); `did_you_mean`
+      carries the corrected query, also for non-fuzzy searches that found nothing.
+    - view: 'compact' returns SearchHit items read in one joined query instead of full listings.
+    - facets: per-value counts (e.g. per category) for the current filters, computed in one grouped query.
+    - total: exact up to SEARCH_COUNT_LIMIT matches; beyond that counting stops, `total` is the limit and
+      `total_exact` is false. exact_total=true always counts everything.
+    - ETag: send it back in If-None-Match to get an empty 304 while no listing, image or category has
+      changed. Not for sort=views, whose order follows the view counter rather than listing edits.
+      Full listings carry their current views_count, also when served from the result cache; like a
+      single listing's ETag, this one doesn't change with views.
     """
     logging.info(
-        f"Searching listings with q='{q}', category_id={category_id}, status='{status}', "
+        f"Searching listings with q='{q}', category_id={category_id}, include_descendants={include_descendants}, tags='{tags}', available_at='{available_at}', status='{status}', "
         f"min_price={min_price}, max_price={max_price}, item_condition='{item_condition}', "
-        f"is_skill_sharing={is_skill_sharing}, page={page}, page_size={page_size}"
+        f"is_skill_sharing={is_skill_sharing}, sort={sort}, fuzzy={fuzzy}, view={view}, page={page}, page_size={page_size}, cursor={cursor}"
+    )
+    spec = SearchSpec(
+        q=q, category_id=category_id, include_descendants=include_descendants, tags=tags, available_at=available_at, min_price=min_price,
+        max_price=max_price, item_condition=item_condition, is_skill_sharing=is_skill_sharing, status=status,
+        page=page, page_size=page_size, cursor=cursor, sort=sort, fuzzy=fuzzy, view=view, facets=facets,
+        exact_total=exact_total,
     )
     try:
-        # Calculate skip for pagination
-        skip = (page - 1) * page_size
-        
-        # Get results and total count
-        results = crud.get_listings(
-            db, 
-            skip=skip, 
-            limit=page_size,
-            search=q,
-            category_id=category_id if category_id and category_id > 0 else None,
-            min_price=min_price,
-            max_price=max_price,
-            item_condition=item_condition,
-            is_skill_sharing=is_skill_sharing,
-            status=status # Pass status parameter
-        )
-        
-        total_count = crud.count_search_results( 
-            db,
-            search=q,
-            category_id=category_id if category_id and category_id > 0 else None,
-            min_price=min_price,
-            max_price=max_price,
-            item_condition=item_condition,
-            is_skill_sharing=is_skill_sharing,
-            status=status # Pass status parameter
-        )
-        
-        logging.info(f"Found {total_count} results for search criteria.")
-        return SearchResults(total=total_count, results=results)
+        versions = crud.get_table_versions(db, (LISTINGS_VERSION, CATEGORIES_VERSION))
+        if sort != "views":
+            headers = {"ETag": weak_etag("search", *versions), "Cache-Control": "no-cache"}
+            if is_not_modified(request, headers["ETag"]):
+                return not_modified(headers)
+            response.headers.update(headers)
+        return _run_search(db, spec, versions)
+    except ValueError as e:
+        # Unknown facet, malformed or mismatched cursor, unknown sort or view, unreadable available_at
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logging.error(f"Error in search_listings: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error during search")
 
-@router.get("/categories", response_model=List[CategorySchema])
+def _full_listings(search_results: SearchResults) -> List[Listing]:
+    return [result for result in search_results.results if isinstance(result, Listing)]
+
+def _with_current_views(db: Session, search_results: SearchResults, stored_views: Optional[dict] = None) -> SearchResults:
+    """
+    A copy of `search_results` whose full listings carry their current views_count: `stored_views` (read fresh for
+    cached results, whose counts date from when they were cached; flushing views bumps no table version) plus the
+    views still buffered (see application/view_counter.py), as the listing detail overlays it. Compact hits have none.
+    """
+    listings = _full_listings(search_results)
+    if not listings:
+        return search_results
+    bind = db.get_bind()
+    stored_views = stored_views or {}
+    return search_results.model_copy(update={"results": [
+        listing.model_copy(update={
+            "views_count": stored_views.get(listing.listing_id, listing.views_count) + view_counter.pending(bind, listing.listing_id)
+        })
+        for listing in listings
+    ]})
+
+def _run_search(db: Session, spec: SearchSpec, versions: tuple = ()) -> SearchResults:
+    """
+    Execute one search (GET /api/search or one entry of POST /api/search/batch), through the result cache.
+    `versions` (the listings and categories table versions) join the cache key, so results computed before
+    a write are not served after it, even when the write came through another worker, and the results
+    served under an ETag derived from them were computed at those versions.
+    Raises ValueError for invalid parameters.
+    """
+    search = " ".join(spec.q.split()) if spec.q else None # Surrounding and repeated spaces never mean anything
+    filters = dict(
+        search=search or None,
+        category_id=spec.category_id if spec.category_id and spec.category_id > 0 else None,
+        include_descendants=spec.include_descendants,
+        tags=parse_tags(spec.tags) or None,
+        available_at=parse_available_at(spec.available_at) if spec.available_at else None,
+        min_price=spec.min_price,
+        max_price=spec.max_price,
+        item_condition=spec.item_condition,
+        is_skill_sharing=spec.is_skill_sharing,
+        status=spec.status, # Pass status parameter
+        sort=spec.sort,
+        fuzzy=spec.fuzzy
+    )
+    requested_facets = _parse_facets(spec.facets)
+    cache_key = _search_cache_key(filters, spec.page, spec.page_size, spec.cursor, requested_facets, spec.view, spec.exact_total) + versions
+    cached = search_results_cache.get(cache_key)
+    if cached is not None:
+        logging.info(f"Serving {cached.total} results for search criteria from cache.")
+        return _with_current_views(db, cached, crud.get_views_counts(db, [listing.listing_id for listing in _full_listings(cached)]))
+
+    # Get results and total count (one round trip where the backend supports it)
+    results, total_count, next_cursor = crud.search_listings(
+        db,
+        limit=spec.page_size,
+        skip=(spec.page - 1) * spec.page_size,
+        cursor=spec.cursor,
+        view=spec.view,
+        count_limit=None if spec.exact_total else SEARCH_COUNT_LIMIT,
+        **filters
+    )
+
+    logging.info(f"Found {total_count} results for search criteria.")
+    total_exact = spec.exact_total or total_count <= SEARCH_COUNT_LIMIT
+    search_results = SearchResults(
+        total=total_count if total_exact else SEARCH_COUNT_LIMIT,
+        total_exact=total_exact,
+        results=results,
+        next_cursor=next_cursor,
+        facets=_get_facet_counts(db, filters, requested_facets) if requested_facets else None,
+        did_you_mean=crud.get_search_correction(db, filters["search"]) if filters["search"] and (spec.fuzzy or not total_count) else None
+    )
+    search_results_cache.set(cache_key, search_results)
+    return _with_current_views(db, search_results)
+
+@router.post("/search/batch", response_model=SearchBatchResults)
+async def search_listings_batch(batch: SearchBatch, db: Session = Depends(get_db)):
+    """
+    Run several searches in one request, e.g. every carousel of the homepage: each entry takes the
+    parameters of GET /api/search and gets the same SearchResults back, in order. All of them share
+    one database session and the search result cache, so repeated or already cached searches cost nothing.
+    An invalid entry fails the whole batch with 400 and names its position.
+    """
+    logging.info(f"Running a batch of {len(batch.searches)} searches.")
+    versions = crud.get_table_versions(db, (LISTINGS_VERSION, CATEGORIES_VERSION))
+    results = []
+    for position, spec in enumerate(batch.searches):
+        try:
+            results.append(_run_search(db, spec, versions))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"searches[{position}]: {e}")
+        except Exception as e:
+            logging.error(f"Error in search_listings_batch (searches[{position}]): {e}", exc_info=True)
+            raise HTTPException(status_code=500, detail="Internal server error during search")
+    return SearchBatchResults(results=results)
+
+@router.get("/search/suggest", response_model=SearchSuggestions)
+async def suggest_search_terms(
+    prefix: str = Query(..., min_length=1, max_length=40, description="What the user has typed so far."),
+    limit: int = Query(10, ge=1, le=20, description="Maximum number of suggestions."),
+    db: Session = Depends(get_db)
+):
+    """
+    Typeahead suggestions for the search bar: completions of `prefix` from listing titles,
+    search keywords and category names, most used first. Cheap enough to call on every keystroke.
+    """
+    try:
+        return SearchSuggestions(prefix=prefix, suggestions=crud.get_search_suggestions(db, prefix, limit))
+    except Exception as e:
+        logging.error(f"Error in suggest_search_terms: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error during search suggestions")
+
+@router.get("/tags/popular", response_model=List[TagCount])
+async def get_popular_tags(
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of tags."),
+    prefix: Optional[str] = Query(None, max_length=50, description="Only tags starting with this."),
+    db: Session = Depends(get_db)
+):
+    """
+    The tags used by the most approved listings, for tag clouds and filter chips. Counts come from an
+    aggregate table maintained on every listing write, so this never scans listings.
+    """
+    try:
+        return crud.get_popular_tags(db, limit=limit, prefix=prefix)
+    except Exception as e:
+        logging.error(f"Error in get_popular_tags: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error getting popular tags")
+
+# --- Saved Searches ---
+# Matches are recorded when a listing is approved (crud.match_saved_searches), so listing and
+# checking saved searches only reads the recorded matches.
+@router.post("/saved-searches", response_model=SavedSearch, status_code=status.HTTP_201_CREATED)
+async def create_saved_search(
+    saved_search: SavedSearchCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Save a search; listings approved from now on that match it are counted as new matches."""
+    try:
+        return crud.create_saved_search(db, current_user.user_id, saved_search)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/saved-searches", response_model=List[SavedSearch])
+async def get_saved_searches(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """The current user's saved searches with their number of new matches since the last check."""
+    return [
+        SavedSearch.model_validate(saved_search).model_copy(update={"new_match_count": new_match_count})
+        for saved_search, new_match_count in crud.get_saved_searches(db, current_user.user_id)
+    ]
+
+@router.post("/saved-searches/{saved_search_id}/check", response_model=SavedSearchCheck)
+async def check_saved_search(
+    saved_search_id: int,
+    limit: int = Query(100, ge=1, le=100, description="Maximum number of new matches to return."),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """The oldest `limit` new matches of a saved search, newest first; they count as seen and the next check returns the rest."""
+    checked = crud.check_saved_search(db, saved_search_id, current_user.user_id, limit=limit)
+    if checked is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Saved search not found")
+    hits, new_match_count = checked
+    return SavedSearchCheck(saved_search_id=saved_search_id, new_match_count=new_match_count, results=hits)
+
+@router.delete("/saved-searches/{saved_search_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_saved_search(
+    saved_search_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    if not crud.delete_saved_search(db, saved_search_id, current_user.user_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Saved search not found")
+
+@router.get("/categories", response_model=List[CategoryWithCounts])
 async def get_categories(
+    request: Request,
+    response: Response,
     parent_id: Optional[int] = None, 
     is_skill: Optional[bool] = None, # Add query parameter for skill/item type
     db: Session = Depends(get_db)
 ):
     """
-    Get all active categories, optionally filtered by parent_id and is_skill_category.
+    Get all active categories, optionally filtered by parent_id and is_skill_category, each with
+    its number of approved listings (listing_count) and that of its whole subtree (subtree_listing_count).
+    Served with an ETag, which changes with any category or listing write (listings move the counts):
+    send it back in If-None-Match to get an empty 304.
     """
     logging.info(f"Getting categories with parent_id={parent_id}, is_skill={is_skill}")
     try:
+        headers = {"ETag": weak_etag("categories", *crud.get_table_versions(db, (CATEGORIES_VERSION, LISTINGS_VERSION))), "Cache-Control": "no-cache"}
+        if is_not_modified(request, headers["ETag"]):
+            return not_modified(headers)
+        response.headers.update(headers)
         # Pass the is_skill filter to the CRUD function
         categories = crud.get_categories(db, parent_id=parent_id, is_skill=is_skill, active_only=True) 
         logging.info(f"Found {len(categories)} categories matching criteria.")
-        return categories
+        counts = crud.get_category_listing_counts(db, [category.category_id for category in categories])
+        return [
+            CategoryWithCounts(**CategorySchema.model_validate(category).model_dump(), **counts.get(category.category_id, {}))
+            for category in categories
+        ]
     except Exception as e:
         logging.error(f"Error in get_categories: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error getting categories")
 
+def _get_category_tree(db: Session) -> tuple:
+    """(JSON body, ETag) of the category tree, built on the first request after each category change."""
+    key = crud.get_table_versions(db, (CATEGORIES_VERSION,))
+    entry = category_tree_cache.get(key)
+    if entry is None:
+        body = CategoryTree(**crud.get_category_tree(db)).model_dump_json().encode()
+        entry = (body, f'"{hashlib.sha1(body).hexdigest()}"')
+        category_tree_cache.set(key, entry)
+    return entry
+
+@router.get("/categories/tree", response_model=CategoryTree)
+async def get_category_tree(request: Request, db: Session = Depends(get_db)):
+    """
+    The whole tree of active categories, nested through `children` and split into item ('items')
+    and skill ('skills') categories. Served with an ETag: send it back in If-None-Match to get
+    an empty 304 while the tree is unchanged.
+    """
+    try:
+        body, etag = _get_category_tree(db)
+    except Exception as e:
+        logging.error(f"Error in get_category_tree: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error getting the category tree")
+    headers = {"ETag": etag, "Cache-Control": "no-cache"} # Clients may keep it but must revalidate
+    if etag_matches(request, etag):
+        return not_modified(headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.get("/categories/{category_id}", response_model=CategorySchema)
 async def get_category(category_id: int, db: Session = Depends(get_db)):
     """
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, computed_field, validator, EmailStr
-from typing import Optional, List
+from typing import Optional, List, Dict, Union
 from datetime import datetime
 from enum import Enum
 
@@ -81,6 +81,21 @@ class Category(CategoryBase):
     class Config:
         from_attributes = True
 
+class CategoryWithCounts(Category):
+    listing_count: int = 0 # Approved listings directly in this category
+    subtree_listing_count: int = 0 # Approved listings in this category and all its subcategories
+
+class CategoryTreeNode(CategoryBase):
+    category_id: int
+    display_order: int
+    is_skill_category: bool
+    children: List["CategoryTreeNode"] = []
+
+class CategoryTree(BaseModel):
+    """All active categories, nested, split by category type (see GET /api/categories/tree)."""
+    items: List[CategoryTreeNode] = []
+    skills: List[CategoryTreeNode] = []
+
 # --- Listing Image Schemas ---
 class ListingImageBase(BaseModel):
     image_path: str
@@ -100,6 +115,21 @@ class ListingImage(ListingImageBase):
         from_attributes = True
 
 # --- Listing Schemas ---
+class AvailabilitySlot(BaseModel):
+    """A weekly time range; a range crossing midnight is sent as two slots."""
+    day_of_week: int = Field(..., ge=0, le=6) # 0 is Monday
+    start_minute: int = Field(..., ge=0, lt=24 * 60) # Minutes after midnight, e.g. 1080 for 18:00
+    end_minute: int = Field(..., gt=0, le=24 * 60) # Exclusive; 1440 for midnight
+
+    @validator('end_minute')
+    def end_after_start(cls, v, values):
+        if 'start_minute' in values and v <= values['start_minute']:
+            raise ValueError('end_minute must be after start_minute')
+        return v
+
+    class Config:
+        from_attributes = True
+
 class ListingBase(BaseModel):
     title: str
     description: str
@@ -113,7 +143,7 @@ class ListingBase(BaseModel):
     availability: Optional[str] = None
 
 class ListingCreate(ListingBase):
-    pass
+    availability_slots: Optional[List[AvailabilitySlot]] = None # Structured availability; read from `availability` when omitted
 
 class ListingUpdate(BaseModel):
     title: Optional[str] = None
@@ -126,6 +156,7 @@ class ListingUpdate(BaseModel):
     rate: Optional[float] = Field(None, gt=0 if Field else 0)
     rate_type: Optional[RateType] = None
     availability: Optional[str] = None
+    availability_slots: Optional[List[AvailabilitySlot]] = None # Replaces the listing's slots; see ListingCreate
     status: Optional[str] = None
     buyer_id: Optional[int] = None
     sold_at: Optional[datetime] = None
@@ -160,13 +191,114 @@ class ListingMinimal(BaseModel):
         from_attributes = True
 
 # --- Search Results Schema ---
+class SearchHit(BaseModel):
+    """Compact search result (view=compact): what a result card shows, read in one joined query."""
+    listing_id: int
+    title: str
+    price: Optional[float] = None
+    rate: Optional[float] = None
+    rate_type: Optional[str] = None
+    item_condition: Optional[str] = None
+    is_skill_sharing: bool
+    thumbnail_path: Optional[str] = None # Primary image's thumbnail (else the first image's)
+    seller_username: str
+
+    class Config:
+        from_attributes = True
+
 class SearchResults(BaseModel):
     total: int
-    results: List[Listing] = []
+    total_exact: bool = True # False: counting stopped early and there are more than `total` matches (show "10,000+")
+    results: Union[List[Listing], List[SearchHit]] = [] # SearchHit items for view=compact
+    next_cursor: Optional[str] = None # Pass as `cursor` to fetch the following page; None on the last page
+    facets: Optional[Dict[str, Dict[str, int]]] = None # Requested facet -> {value: count}, see crud.get_search_facets
+    did_you_mean: Optional[str] = None # Spelling-corrected query, for fuzzy searches and searches without results
+
+    class Config:
+        from_attributes = True
+
+class SearchSpec(BaseModel):
+    """One search of POST /api/search/batch; fields and defaults match the GET /api/search query parameters."""
+    q: Optional[str] = Field(None, max_length=40, pattern="^[a-zA-Z0-9 ]*$")
+    category_id: Optional[int] = None # 0 means all categories
+    include_descendants: bool = False
+    tags: Optional[str] = Field(None, max_length=200) # Comma-separated; listings must carry all of them
+    available_at: Optional[str] = Field(None, max_length=40) # 'tue 18:30' or an ISO datetime, see availability.parse_available_at
+    min_price: Optional[float] = Field(None, ge=0)
+    max_price: Optional[float] = Field(None, ge=0)
+    item_condition: Optional[str] = None
+    is_skill_sharing: Optional[bool] = None
+    status: Optional[str] = 'approved'
+    page: int = Field(1, ge=1)
+    page_size: int = Field(20, ge=1, le=100)
+    cursor: Optional[str] = None
+    sort: Optional[str] = None
+    fuzzy: bool = False
+    view: str = "full"
+    facets: Optional[str] = None
+    exact_total: bool = False
+
+class SearchBatch(BaseModel):
+    searches: List[SearchSpec] = Field(..., min_length=1, max_length=20) # e.g. one per homepage carousel
+
+class SearchBatchResults(BaseModel):
+    results: List[SearchResults] = [] # One per search, in request order
+
+class TagCount(BaseModel):
+    tag: str
+    listing_count: int # Approved listings carrying the tag
+
+class SavedSearchCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100)
+    query: Optional[str] = Field(None, max_length=40, pattern="^[a-zA-Z0-9 ]*$") # Every word must appear in a match
+    category_id: Optional[int] = None # 0 means all categories
+    include_descendants: bool = False
+    min_price: Optional[float] = Field(None, ge=0)
+    max_price: Optional[float] = Field(None, ge=0)
+    item_condition: Optional[ItemCondition] = None
+    is_skill_sharing: Optional[bool] = None
+
+class SavedSearch(SavedSearchCreate):
+    saved_search_id: int
+    created_at: datetime
+    new_match_count: int = 0 # Approved matches since the last check
 
     class Config:
         from_attributes = True
 
+class TrendingListing(SearchHit):
+    trending_score: float # Recent views and conversations, decayed by age (see application/trending.py)
+
+class ListingViewStats(BaseModel):
+    listing_id: int
+    title: str
+    status: str
+    views_count: int = 0 # Lifetime views, including the seller's own
+    views_24h: int = 0 # Views by others, from the hourly rollup
+    views_7d: int = 0 # Views by others over the last 7 days (UTC, including today), from the daily rollup
+    views_30d: int = 0
+    conversations_30d: int = 0
+    unique_viewers: int = 0 # Estimated distinct viewers (HyperLogLog, about 3% error)
+
+class SellerListingStats(BaseModel):
+    listing_count: int
+    views_count: int = 0
+    views_24h: int = 0
+    views_7d: int = 0
+    views_30d: int = 0
+    conversations_30d: int = 0
+    unique_viewers: int = 0 # Distinct viewers across all listings, so a person viewing several counts once
+    listings: List[ListingViewStats] = []
+
+class SavedSearchCheck(BaseModel):
+    saved_search_id: int
+    new_match_count: int # All new matches; `results` holds the newest of them
+    results: List[SearchHit] = []
+
+class SearchSuggestions(BaseModel):
+    prefix: str
+    suggestions: List[str] = [] # Completions from listing titles, search keywords and category names
+
 # --- Admin Schemas ---
 class AdminListingUpdateNotes(BaseModel):
     """Schema for admin updates that include notes."""
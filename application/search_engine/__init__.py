@@ -0,0 +1,88 @@
+# application/search_engine/__init__.py
+"""
+Optional in-memory search engine for single-database (SQLite) deployments.
+
+Enable it with SEARCH_ENGINE=memory: each worker then builds the index at boot (see app.py)
+and crud.search_listings answers keyword searches of 3+ characters over approved listings
+(and sort=relevance searches, ranked with BM25) from memory, loading only the listings
+on the requested page. /api/search/suggest completions come from its prefix index, and
+fuzzy=true searches correct misspelled terms against its vocabulary.
+
+The index follows listing writes made through crud via listing_events. Writes handled by another
+worker (scripts/deploy.sh runs four) or made by scripts are picked up by get_search_engine, which
+catches the index up with the listings and categories table versions before every use (see
+ListingSearchEngine.catch_up), which is also how it follows category writes of any kind.
+"""
+import logging
+import os
+from typing import Optional
+
+from sqlalchemy.orm import Session, object_session
+
+from application.database import listing_events
+from .listing_engine import DatabaseVocabulary, ListingSearchEngine, SORT_RELEVANCE
+from .trigram import TrigramIndex
+from .bm25 import BM25Index, FIELD_WEIGHTS, tokenize
+from .suggest import PrefixIndex, normalize_phrase
+from . import fuzzy
+from .fuzzy import Expansion, Vocabulary
+
+logger = logging.getLogger(__name__)
+
+SEARCH_ENGINE_ENABLED = os.getenv("SEARCH_ENGINE", "").lower() == "memory"
+
+listing_engine = ListingSearchEngine()
+
+def build_search_engine(bind) -> ListingSearchEngine:
+    """Build (or rebuild) the listing index from `bind` and start serving searches on it."""
+    listing_engine.build(bind)
+    return listing_engine
+
+def get_search_engine(db: Session) -> Optional[ListingSearchEngine]:
+    """The engine, caught up with listing writes made elsewhere, if it was built from the database `db` talks to, else None."""
+    if listing_engine.ready and db.get_bind() is listing_engine.bind:
+        listing_engine.catch_up(db)
+        return listing_engine
+    return None
+
+def expand_query(db: Session, search: Optional[str]) -> Expansion:
+    """
+    Terms of `search` with spelling corrections from the listings' vocabulary (see fuzzy.expand_query):
+    the engine's, or without it the listing_terms tables kept by the Listing mapper events.
+    """
+    engine = get_search_engine(db)
+    if engine is not None:
+        return engine.expand_query(search)
+    return fuzzy.expand_query(DatabaseVocabulary(db), search)
+
+@listing_events.subscribe
+def follow_listing_changes(change: str, listing_id: int, listing=None):
+    if change == listing_events.IMAGES_CHANGED or not listing_engine.ready:
+        return
+    if change == listing_events.DELETED:
+        listing_engine.remove_listing(listing_id)
+        return
+    session = object_session(listing) if listing is not None else None
+    if session is None:
+        logger.warning(f"Search engine could not refresh listing {listing_id} after {change}: no session.")
+        return
+    if session.get_bind() is listing_engine.bind:
+        listing_engine.refresh_listing(session, listing_id)
+
+__all__ = [
+    "SEARCH_ENGINE_ENABLED",
+    "SORT_RELEVANCE",
+    "ListingSearchEngine",
+    "TrigramIndex",
+    "BM25Index",
+    "PrefixIndex",
+    "Vocabulary",
+    "Expansion",
+    "FIELD_WEIGHTS",
+    "tokenize",
+    "normalize_phrase",
+    "listing_engine",
+    "build_search_engine",
+    "get_search_engine",
+    "expand_query",
+]
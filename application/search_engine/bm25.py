@@ -0,0 +1,136 @@
+# application/search_engine/bm25.py
+"""
+Field-weighted BM25 (BM25F) over tokenized listings.
+
+Term statistics are kept up to date as documents are added and removed, so scoring a
+query only touches the posting lists of its terms:
+- postings: term -> {doc_id: (term frequency per field)}; document frequency is the size of the dict
+- per-document distinct terms, so removing a document only touches its own posting lists
+- per-document field lengths, and per field the running length total and number of documents
+  that have the field (for average field lengths; search_keywords is often empty, and counting
+  empty fields in its average would penalize every keyword match)
+
+Per-field term frequencies are length-normalized and weighted before the usual BM25
+saturation, so a term in the title counts more than the same term in the description.
+"""
+import math
+import re
+import sys
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+# Field order used by add(): title, search_keywords, description
+FIELD_WEIGHTS = (3.0, 2.0, 1.0)
+K1 = 1.2
+B = 0.75
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN_PATTERN.findall((text or "").lower())
+
+
+class BM25Index:
+    """Not thread-safe on its own; ListingSearchEngine serializes access."""
+
+    def __init__(self, weights: Sequence[float] = FIELD_WEIGHTS, k1: float = K1, b: float = B):
+        self.weights = tuple(weights)
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, Tuple[int, ...]]] = {}
+        self._lengths: Dict[int, Tuple[int, ...]] = {}
+        self._terms: Dict[int, Tuple[str, ...]] = {} # doc_id -> its distinct terms, the posting lists it is in
+        self._total_lengths = [0] * len(self.weights)
+        self._field_doc_counts = [0] * len(self.weights)
+        self._shared_tfs: Dict[Tuple[int, ...], Tuple[int, ...]] = {} # Most postings are (1, 0, 0)-like; store each tuple once
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def add(self, doc_id: int, fields: Iterable[Optional[str]]) -> Set[str]:
+        """Index a document (replacing any previous version with the same id). Returns its distinct terms."""
+        if doc_id in self._lengths:
+            self.remove(doc_id)
+        field_tokens = [tokenize(field) for field in fields]
+        counts = [Counter(tokens) for tokens in field_tokens]
+        terms = set().union(*counts)
+        for term in terms:
+            tfs = tuple(count[term] for count in counts)
+            self._postings.setdefault(term, {})[doc_id] = self._shared_tfs.setdefault(tfs, tfs)
+        self._terms[doc_id] = tuple(terms)
+        lengths = tuple(len(tokens) for tokens in field_tokens)
+        self._lengths[doc_id] = lengths
+        for i, length in enumerate(lengths):
+            self._total_lengths[i] += length
+            self._field_doc_counts[i] += bool(length)
+        return terms
+
+    def remove(self, doc_id: int) -> List[str]:
+        """Drop a document from the index. Returns the terms it had."""
+        lengths = self._lengths.pop(doc_id, None)
+        if lengths is None:
+            return []
+        for i, length in enumerate(lengths):
+            self._total_lengths[i] -= length
+            self._field_doc_counts[i] -= bool(length)
+        terms = list(self._terms.pop(doc_id))
+        for term in terms:
+            docs = self._postings[term]
+            del docs[doc_id]
+            if not docs:
+                del self._postings[term]
+        return terms
+
+    def search(self, terms: Iterable[str]) -> Dict[int, float]:
+        """BM25 score of every document containing all of `terms` (already tokenized)."""
+        return self.search_any((term,) for term in terms)
+
+    def search_any(self, groups: Iterable[Sequence[str]]) -> Dict[int, float]:
+        """
+        BM25 score of every document containing at least one term of each group (e.g. a query term
+        and its spelling variants). A group contributes the score of its best-scoring term.
+        """
+        group_postings = []
+        for group in dict.fromkeys(tuple(group) for group in groups):
+            postings = [self._postings[term] for term in dict.fromkeys(group) if self._postings.get(term)]
+            if not postings:
+                return {}
+            group_postings.append(postings)
+        if not group_postings:
+            return {}
+        matching = [set().union(*postings) if len(postings) > 1 else set(postings[0]) for postings in group_postings]
+        matching.sort(key=len)
+        candidates = matching[0]
+        for docs in matching[1:]:
+            candidates.intersection_update(docs)
+            if not candidates:
+                return {}
+
+        doc_count = len(self._lengths)
+        averages = [total / (count or 1) for total, count in zip(self._total_lengths, self._field_doc_counts)]
+        scores = dict.fromkeys(candidates, 0.0)
+        for postings in group_postings:
+            best = dict.fromkeys(candidates, 0.0)
+            for docs in postings:
+                idf = math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+                for doc_id in candidates:
+                    tfs = docs.get(doc_id)
+                    if tfs is None:
+                        continue
+                    lengths = self._lengths[doc_id]
+                    weighted_tf = 0.0
+                    for weight, tf, length, average in zip(self.weights, tfs, lengths, averages):
+                        if tf:
+                            weighted_tf += weight * tf / (1 - self.b + self.b * length / average)
+                    best[doc_id] = max(best[doc_id], idf * weighted_tf * (self.k1 + 1) / (self.k1 + weighted_tf))
+            for doc_id, score in best.items():
+                scores[doc_id] += score
+        return scores
+
+    def memory_usage(self) -> Dict[str, int]:
+        postings_bytes = sys.getsizeof(self._postings) + sum(
+            sys.getsizeof(term) + sys.getsizeof(docs) for term, docs in self._postings.items()
+        ) + sum(sys.getsizeof(tfs) for tfs in self._shared_tfs)
+        lengths_bytes = sys.getsizeof(self._lengths) + sum(sys.getsizeof(lengths) for lengths in self._lengths.values())
+        terms_bytes = sys.getsizeof(self._terms) + sum(sys.getsizeof(terms) for terms in self._terms.values()) # The strings are the postings' keys
+        return {"terms": len(self._postings), "bm25_bytes": postings_bytes + lengths_bytes + terms_bytes}
@@ -0,0 +1,145 @@
+# application/search_engine/fuzzy.py
+"""
+Spelling correction over the vocabulary of the indexed listings.
+
+Vocabulary counts how many listings use each term (as split by bm25.tokenize) and indexes every
+term by the trigrams of "$term$". A term within k edits of a query term keeps at least
+(distinct trigrams of the query term - 3k) of them, since one edit touches at most three
+(the q-gram lemma), so the candidates are the terms sharing that many trigrams and of a
+close enough length. Only those are verified with a bounded Levenshtein distance; a lookup
+never walks the whole vocabulary, let alone the listings.
+"""
+import sys
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from .bm25 import tokenize
+
+TERM_BOUNDARY = "$" # Never produced by tokenize, so boundary trigrams can't collide with inner ones
+MAX_CORRECTIONS = 3 # Spelling variants a misspelled term is expanded to
+
+def max_edits(term: str) -> int:
+    """Edits tolerated for a term: none below 4 characters, one up to 7, two from 8 on."""
+    if len(term) < 4:
+        return 0
+    return 1 if len(term) < 8 else 2
+
+def term_trigrams(term: str) -> Set[str]:
+    """The trigrams of "$term$"; within k edits of each other, two terms share all but 3k of them."""
+    padded = f"{TERM_BOUNDARY}{term}{TERM_BOUNDARY}"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance between a and b, or limit + 1 as soon as it is known to exceed limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous[-1], limit + 1)
+
+
+def shared_trigrams_needed(term: str) -> int:
+    """Trigrams a term within max_edits(term) of `term` shares with it at least."""
+    return max(1, len(term_trigrams(term)) - 3 * max_edits(term))
+
+def closest_terms(term: str, candidates: Iterable[Tuple[str, int]], limit: int = MAX_CORRECTIONS) -> List[str]:
+    """
+    Up to `limit` of the (candidate, listings using it) pairs within max_edits(term) of `term`,
+    verified by edit distance: closest first, then the most used.
+    """
+    edits = max_edits(term)
+    found = []
+    for candidate, count in candidates:
+        distance = edit_distance(term, candidate, edits)
+        if distance <= edits:
+            found.append((distance, -count, candidate))
+    found.sort()
+    return [candidate for _, _, candidate in found[:limit]]
+
+
+class Expansion(NamedTuple):
+    groups: List[Tuple[str, ...]] # Per query term: the term itself, then its corrections (closest first)
+    did_you_mean: Optional[str] # The query with each misspelled term replaced by its best correction; None if none was
+
+
+class Vocabulary:
+    """Not thread-safe on its own; ListingSearchEngine serializes access."""
+
+    def __init__(self):
+        self._counts: Dict[str, int] = {} # term -> number of listings using it
+        self._postings: Dict[str, Set[str]] = {} # trigram of "$term$" -> terms
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self._counts
+
+    def add(self, terms: Iterable[str]) -> None:
+        """Count one more listing using each of `terms` (a listing's distinct terms)."""
+        for term in terms:
+            count = self._counts.get(term, 0)
+            self._counts[term] = count + 1
+            if not count:
+                for gram in term_trigrams(term):
+                    self._postings.setdefault(gram, set()).add(term)
+
+    def remove(self, terms: Iterable[str]) -> None:
+        for term in terms:
+            count = self._counts.get(term)
+            if count is None:
+                continue
+            if count > 1:
+                self._counts[term] = count - 1
+                continue
+            del self._counts[term]
+            for gram in term_trigrams(term):
+                posting = self._postings.get(gram)
+                if posting is not None:
+                    posting.discard(term)
+                    if not posting:
+                        del self._postings[gram]
+
+    def corrections(self, term: str, limit: int = MAX_CORRECTIONS) -> List[str]:
+        """
+        Up to `limit` vocabulary terms within max_edits(term) of `term`: closest first,
+        then the most used. Empty for known terms and for terms too short to correct.
+        """
+        edits = max_edits(term)
+        if not edits or term in self._counts:
+            return []
+        grams = term_trigrams(term)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        needed = shared_trigrams_needed(term)
+        candidates = (
+            (candidate, self._counts[candidate]) for candidate, count in shared.items()
+            if count >= needed and abs(len(candidate) - len(term)) <= edits
+        )
+        return closest_terms(term, candidates, limit)
+
+    def memory_usage(self) -> Dict[str, int]:
+        counts_bytes = sys.getsizeof(self._counts) + sum(sys.getsizeof(term) for term in self._counts)
+        postings_bytes = sys.getsizeof(self._postings) + sum(
+            sys.getsizeof(gram) + sys.getsizeof(terms) for gram, terms in self._postings.items()
+        )
+        return {"vocabulary_terms": len(self._counts), "vocabulary_bytes": counts_bytes + postings_bytes}
+
+
+def expand_query(vocabulary: Vocabulary, search: Optional[str]) -> Expansion:
+    """Split `search` into terms and attach the corrections of every term the vocabulary doesn't know."""
+    groups = []
+    corrected = False
+    for term in tokenize(search):
+        corrections = vocabulary.corrections(term)
+        corrected = corrected or bool(corrections)
+        groups.append((term, *corrections))
+    did_you_mean = " ".join(group[1] if len(group) > 1 else group[0] for group in groups) if corrected else None
+    return Expansion(groups, did_you_mean)
@@ -0,0 +1,51 @@
+# application/search_engine/intervals.py
+"""
+Interval index over weekly availability slots, for available_at searches.
+
+Each day keeps its slots as (start_minute, end_minute, listing_id) tuples sorted by start. Which
+listings are available at a minute is a stabbing query: the slots starting by that minute are a
+prefix found by bisection, and since no slot of the day is longer than the longest one seen, only the
+part of the prefix starting within that length of the minute can still be open and is checked.
+"""
+import sys
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, List, Set, Tuple
+
+Slot = Tuple[int, int, int] # (day_of_week, start_minute, end_minute), see application.availability
+
+
+class IntervalIndex:
+    def __init__(self):
+        self._days: List[List[Tuple[int, int, int]]] = [[] for _ in range(7)]
+        self._longest: List[int] = [0] * 7 # Longest slot ever added per day; kept on removal, so only a bound
+        self._slots: Dict[int, Tuple[Slot, ...]] = {}
+
+    def add(self, listing_id: int, slots: Iterable[Slot]) -> None:
+        """Index the slots of a listing, replacing its previous ones."""
+        self.remove(listing_id)
+        slots = tuple(slots)
+        if not slots:
+            return
+        self._slots[listing_id] = slots
+        for day, start, end in slots:
+            insort(self._days[day], (start, end, listing_id))
+            self._longest[day] = max(self._longest[day], end - start)
+
+    def remove(self, listing_id: int) -> None:
+        for day, start, end in self._slots.pop(listing_id, ()):
+            entries = self._days[day]
+            del entries[bisect_left(entries, (start, end, listing_id))]
+
+    def stab(self, day: int, minute: int) -> Set[int]:
+        """Listings with a slot on `day` covering `minute`."""
+        entries = self._days[day]
+        first = bisect_left(entries, (minute - self._longest[day] + 1,))
+        last = bisect_right(entries, (minute, sys.maxsize))
+        return {listing_id for start, end, listing_id in entries[first:last] if end > minute}
+
+    def memory_usage(self) -> Dict[str, int]:
+        slots = sum(len(entries) for entries in self._days)
+        slots_bytes = sys.getsizeof(self._slots) + sum(
+            sys.getsizeof(entries) + sum(sys.getsizeof(entry) for entry in entries) for entries in self._days
+        )
+        return {"availability_slots": slots, "availability_bytes": slots_bytes}
@@ -0,0 +1,406 @@
+# application/search_engine/listing_engine.py
+"""
+In-memory search over approved listings.
+
+ListingSearchEngine keeps, for every approved listing:
+- a TrigramIndex over title, description and search_keywords (substring matching),
+- a BM25Index over the same fields (tokenized, relevance-ranked matching for sort=relevance),
+- a PrefixIndex of titles, search keywords and active category names (typeahead suggestions),
+- a Vocabulary of the BM25 terms (spelling corrections for fuzzy=true searches),
+plus the few columns search filters and sorts on, an IntervalIndex of availability slots for
+available_at searches, and each category's subtree (from the closure table) for include_descendants searches. A keyword search is answered entirely from memory and
+returns listing ids in the same order (and with the same sort-key values) as crud.search_listings,
+so only the requested page has to be loaded from the database.
+
+Writes made through this worker reach the index through listing_events. Writes made through other
+workers (or scripts) are caught up by catch_up(), which get_search_engine runs before every use: the
+listings and categories table versions (models.TableVersion) are one read, and only when the listings
+version moved are the revisions of the approved listings compared with the indexed ones to re-read the
+listings that changed. When the categories version moved (a category added, moved, renamed, deactivated
+or deleted), the category names and subtrees are reloaded as a whole from the small categories and
+category_closure tables.
+"""
+import logging
+import sys
+import threading
+import time
+from typing import Any, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import String, func, select, type_coerce
+from sqlalchemy.orm import Session
+
+from application.database import models
+from .trigram import TrigramIndex, normalize
+from .bm25 import BM25Index, tokenize
+from .suggest import CATEGORY_SUGGESTION_WEIGHT, PrefixIndex
+from .fuzzy import MAX_CORRECTIONS, Expansion, Vocabulary, closest_terms, expand_query, max_edits, shared_trigrams_needed, term_trigrams
+from .intervals import IntervalIndex
+
+logger = logging.getLogger(__name__)
+
+INDEXED_STATUS = "approved"
+SORT_RELEVANCE = "relevance"
+CATCH_UP_BATCH = 500 # Listings re-read per IN query when catching up
+
+
+class _ListingDoc(NamedTuple):
+    revision: int # listings.revision when indexed; catch_up() re-reads the listing once it differs
+    title_length: int # Matches starting before this offset of the indexed text are title matches
+    category_id: int
+    price: Optional[float]
+    item_condition: str
+    is_skill_sharing: bool
+    created_key: str # created_at as stored, the same value crud's keyset cursors compare
+    suggestions: Tuple[str, ...] # Phrases this listing added to the PrefixIndex
+    tags: FrozenSet[str] # Normalized search_keywords, as in the listing_tags table
+
+
+def _document_query():
+    return select(
+        models.Listing.listing_id,
+        models.Listing.title,
+        models.Listing.description,
+        models.Listing.search_keywords,
+        models.Listing.category_id,
+        models.Listing.price,
+        models.Listing.item_condition,
+        models.Listing.is_skill_sharing,
+        models.Listing.status,
+        models.Listing.revision,
+        type_coerce(models.Listing.created_at, String).label("created_key"),
+    )
+
+def _table_versions(session: Session) -> Tuple[int, int]:
+    """The (listings, categories) table versions."""
+    versions = dict(session.execute(
+        select(models.TableVersion.name, models.TableVersion.version)
+        .where(models.TableVersion.name.in_((models.LISTINGS_VERSION, models.CATEGORIES_VERSION)))
+    ).all())
+    return versions.get(models.LISTINGS_VERSION, 0), versions.get(models.CATEGORIES_VERSION, 0)
+
+def _load_categories(session: Session) -> Tuple[List[str], Dict[int, Set[int]]]:
+    """Active category names and each category's subtree, from the closure table."""
+    names = session.execute(select(models.Category.name).where(models.Category.is_active == True)).scalars().all()
+    descendants: Dict[int, Set[int]] = {}
+    for ancestor_id, descendant_id in session.execute(select(models.CategoryClosure.ancestor_id, models.CategoryClosure.descendant_id)):
+        descendants.setdefault(ancestor_id, set()).add(descendant_id)
+    return names, descendants
+
+def _slots_query():
+    slots = models.ListingAvailability
+    return select(slots.listing_id, slots.day_of_week, slots.start_minute, slots.end_minute)
+
+
+class _Indexes:
+    """Everything derived from the listings, swapped as a whole when the engine is rebuilt."""
+
+    def __init__(self):
+        self.trigrams = TrigramIndex()
+        self.bm25 = BM25Index()
+        self.suggest = PrefixIndex()
+        self.vocabulary = Vocabulary()
+        self.availability = IntervalIndex()
+        self.category_names: Tuple[str, ...] = () # Active category names in the PrefixIndex
+        self.category_descendants: Dict[int, Set[int]] = {} # category_id -> itself and every subcategory below it
+        self.docs: Dict[int, _ListingDoc] = {}
+
+    def add(self, row, slots: Iterable[Tuple[int, int, int]] = ()) -> None:
+        """Index a listing row from _document_query() and its availability slots, replacing its previous version."""
+        self.remove(row.listing_id)
+        self.availability.add(row.listing_id, slots)
+        self.trigrams.add(row.listing_id, (row.title, row.description, row.search_keywords))
+        self.vocabulary.add(
+            self.bm25.add(row.listing_id, (row.title, row.search_keywords, row.description)) # Order of bm25.FIELD_WEIGHTS
+        )
+        suggestions = tuple(models.listing_suggestions(row.title, row.search_keywords))
+        for phrase in suggestions:
+            self.suggest.add(phrase)
+        self.docs[row.listing_id] = _ListingDoc(
+            row.revision, len(normalize(row.title)), row.category_id, row.price, row.item_condition,
+            bool(row.is_skill_sharing), row.created_key, suggestions, frozenset(models.parse_tags(row.search_keywords))
+        )
+
+    def set_categories(self, names: Iterable[str], descendants: Dict[int, Set[int]]) -> None:
+        """Replace the category suggestions and subtrees with those of _load_categories()."""
+        for name in self.category_names:
+            self.suggest.remove(name, CATEGORY_SUGGESTION_WEIGHT)
+        self.category_names = tuple(names)
+        for name in self.category_names:
+            self.suggest.add(name, CATEGORY_SUGGESTION_WEIGHT)
+        self.category_descendants = descendants
+
+    def remove(self, listing_id: int) -> None:
+        doc = self.docs.pop(listing_id, None)
+        if doc is None:
+            return
+        self.trigrams.remove(listing_id)
+        self.availability.remove(listing_id)
+        self.vocabulary.remove(self.bm25.remove(listing_id))
+        for phrase in doc.suggestions:
+            self.suggest.remove(phrase)
+
+
+class DatabaseVocabulary:
+    """
+    The Vocabulary interface over the listing_terms tables (see models.ListingTerm), for fuzzy searches
+    without the engine: a known term is one primary-key lookup, the candidate corrections of an unknown one
+    a grouped lookup of its trigrams, so no request reads or tokenizes the listings.
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def corrections(self, term: str, limit: int = MAX_CORRECTIONS) -> List[str]:
+        """Like Vocabulary.corrections: terms within max_edits(term), closest first, then the most used."""
+        edits = max_edits(term)
+        if not edits:
+            return []
+        terms, trigrams = models.ListingTerm, models.ListingTermTrigram
+        if self.session.execute(select(terms.term).where(terms.term == term)).first() is not None:
+            return []
+        candidates = self.session.execute(
+            select(terms.term, terms.approved_count)
+            .join(trigrams, trigrams.term == terms.term)
+            .where(
+                trigrams.trigram.in_(sorted(term_trigrams(term))),
+                func.length(terms.term).between(len(term) - edits, len(term) + edits),
+            )
+            .group_by(terms.term, terms.approved_count)
+            .having(func.count() >= shared_trigrams_needed(term))
+        ).all()
+        return closest_terms(term, candidates, limit)
+
+
+class ListingSearchEngine:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.bind = None # Engine the index was built from; None until build()
+        self._indexes = _Indexes()
+        self._catch_up_lock = threading.Lock() # One request re-reads changed listings; the others wait for it
+        self.listings_version: Optional[int] = None # Version of the listings table the index has caught up with
+        self.categories_version: Optional[int] = None # Likewise for the categories (and category_closure) table
+        self.build_seconds: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.bind is not None
+
+    def build(self, bind) -> int:
+        """(Re)build the index from every approved listing. Returns the number of listings indexed."""
+        started = time.perf_counter()
+        indexes = _Indexes()
+        with Session(bind=bind) as session:
+            versions = _table_versions(session) # Read first: writes racing the build make the next catch_up() look again
+            slots: Dict[int, List[Tuple[int, int, int]]] = {}
+            for listing_id, day, start, end in session.execute(_slots_query()):
+                slots.setdefault(listing_id, []).append((day, start, end))
+            for row in session.execute(_document_query().where(models.Listing.status == INDEXED_STATUS)):
+                indexes.add(row, slots.get(row.listing_id, ()))
+            indexes.set_categories(*_load_categories(session))
+        with self._lock:
+            self._indexes, self.bind = indexes, bind
+            self.listings_version, self.categories_version = versions
+            self.build_seconds = time.perf_counter() - started
+        logger.info(f"Search engine indexed {len(indexes.docs)} approved listings in {self.build_seconds * 1000:.0f} ms.")
+        return len(indexes.docs)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._indexes, self.bind = _Indexes(), None
+            self.listings_version = self.categories_version = None
+            self.build_seconds = None
+
+    # --- Incremental updates ---
+    def refresh_listing(self, session: Session, listing_id: int) -> None:
+        """Re-read one listing after a write: index it if approved, drop it otherwise."""
+        row = session.execute(_document_query().where(models.Listing.listing_id == listing_id)).first()
+        slots = []
+        if row is not None and row.status == INDEXED_STATUS:
+            slots = [tuple(slot[1:]) for slot in session.execute(_slots_query().where(models.ListingAvailability.listing_id == listing_id))]
+        with self._lock:
+            if row is not None and row.status == INDEXED_STATUS:
+                self._indexes.add(row, slots)
+            else:
+                self._indexes.remove(listing_id)
+
+    def remove_listing(self, listing_id: int) -> None:
+        with self._lock:
+            self._indexes.remove(listing_id)
+
+    def catch_up(self, session: Session) -> int:
+        """
+        Apply listing and category writes made outside this worker since the index last caught up, if
+        the table versions say there were any. Returns the number of listings re-read or dropped.
+        """
+        if _table_versions(session) == (self.listings_version, self.categories_version):
+            return 0
+        with self._catch_up_lock:
+            listings_version, categories_version = _table_versions(session) # Possibly caught up by the request we waited for
+            if categories_version != self.categories_version:
+                categories = _load_categories(session)
+                with self._lock:
+                    self._indexes.set_categories(*categories)
+                    self.categories_version = categories_version
+            if listings_version == self.listings_version:
+                return 0
+            revisions = dict(session.connection().execute( # Core rows: no ORM row processing for the whole table
+                select(models.Listing.listing_id, models.Listing.revision).where(models.Listing.status == INDEXED_STATUS)
+            ).all())
+            with self._lock:
+                docs = self._indexes.docs
+                stale = [listing_id for listing_id, revision in revisions.items() if listing_id not in docs or docs[listing_id].revision != revision]
+                gone = [listing_id for listing_id in docs if listing_id not in revisions]
+            rows, slots = [], {}
+            for start in range(0, len(stale), CATCH_UP_BATCH):
+                batch = stale[start:start + CATCH_UP_BATCH]
+                rows.extend(session.execute(_document_query().where(
+                    models.Listing.listing_id.in_(batch), models.Listing.status == INDEXED_STATUS
+                )))
+                for listing_id, day, start_minute, end_minute in session.execute(_slots_query().where(models.ListingAvailability.listing_id.in_(batch))):
+                    slots.setdefault(listing_id, []).append((day, start_minute, end_minute))
+            with self._lock:
+                for listing_id in gone:
+                    self._indexes.remove(listing_id)
+                for row in rows:
+                    self._indexes.add(row, slots.get(row.listing_id, ()))
+                self.listings_version = listings_version
+        if stale or gone:
+            logger.debug(f"Search engine caught up with listings version {listings_version}: {len(rows)} re-read, {len(gone)} dropped.")
+        return len(rows) + len(gone)
+
+    # --- Queries ---
+    def supports(
+        self,
+        search: Optional[str] = None,
+        status: Optional[str] = INDEXED_STATUS,
+        sort: Optional[str] = None,
+        fuzzy: bool = False,
+        **filters
+    ) -> bool:
+        """Whether a search with these parameters can be answered from memory."""
+        if not self.ready or status != INDEXED_STATUS:
+            return False
+        if sort == SORT_RELEVANCE or fuzzy:
+            return bool(tokenize(search))
+        return sort is None and TrigramIndex.supports(search)
+
+    def search(
+        self,
+        search: str,
+        category_id: Optional[int] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        item_condition: Optional[str] = None,
+        is_skill_sharing: Optional[bool] = None,
+        status: Optional[str] = INDEXED_STATUS,
+        sort: Optional[str] = None,
+        fuzzy: bool = False,
+        include_descendants: bool = False,
+        tags: Optional[List[str]] = None,
+        available_at: Optional[Tuple[int, int]] = None,
+        limit: int = 20,
+        skip: int = 0,
+        after: Optional[List[Any]] = None,
+    ) -> Tuple[List[int], int, Optional[List[Any]]]:
+        """
+        Filter and order matches the way crud.search_listings does. Sort keys per row:
+        - default: [title_rank, created_key, listing_id], i.e. substring matches in the title first, then newest
+        - sort=relevance: [bm25 score, created_key, listing_id], all descending; every query term must match
+        - fuzzy: ranked like sort=relevance, but a misspelled term also matches its corrections (see expand_query)
+        `after` is the sort-key list of the last row of the previous page (keyset paging);
+        otherwise `skip` rows are skipped.
+        Returns (page of listing ids, total matches, sort keys of the page's last row if more follow).
+        """
+        def wanted(listing_id: int) -> bool:
+            doc = docs[listing_id]
+            return not (
+                (category_ids is not None and doc.category_id not in category_ids)
+                or (min_price is not None and (doc.price is None or doc.price < min_price))
+                or (max_price is not None and (doc.price is None or doc.price > max_price))
+                or (item_condition and doc.item_condition != item_condition)
+                or (is_skill_sharing is not None and doc.is_skill_sharing != is_skill_sharing)
+                or (required_tags and not required_tags <= doc.tags)
+                or (available_ids is not None and listing_id not in available_ids)
+            )
+
+        required_tags = {models.normalize_tag(tag) for tag in tags or ()}
+
+        with self._lock:
+            indexes = self._indexes
+            docs = indexes.docs
+            category_ids = None
+            if category_id:
+                category_ids = indexes.category_descendants.get(category_id, {category_id}) if include_descendants else {category_id}
+            available_ids = indexes.availability.stab(*available_at) if available_at is not None else None
+            if sort == SORT_RELEVANCE or fuzzy:
+                groups = expand_query(indexes.vocabulary, search).groups if fuzzy else [(term,) for term in tokenize(search)]
+                # Rounded so the score survives the JSON cursor unchanged
+                matches = [
+                    (round(score, 6), docs[listing_id].created_key, listing_id)
+                    for listing_id, score in indexes.bm25.search_any(groups).items()
+                    if wanted(listing_id)
+                ]
+            else:
+                query = normalize(search)
+                matches = [
+                    (1 if offset + len(query) <= docs[listing_id].title_length else 2, docs[listing_id].created_key, listing_id)
+                    for listing_id, offset in indexes.trigrams.matches(query)
+                    if wanted(listing_id)
+                ]
+
+        total = len(matches)
+        if after is not None and (len(after) != 3 or not isinstance(after[1], str)):
+            raise ValueError("Search cursor does not match the search parameters")
+        if sort == SORT_RELEVANCE or fuzzy:
+            matches.sort(reverse=True)
+            if after is not None:
+                after = tuple(after)
+                matches = [key for key in matches if key < after]
+        else:
+            matches.sort(key=lambda key: (key[1], key[2]), reverse=True)
+            matches.sort(key=lambda key: key[0]) # Stable: keeps newest-first within each rank
+            if after is not None:
+                rank, created_key, listing_id = after
+                matches = [
+                    key for key in matches
+                    if key[0] > rank or (key[0] == rank and (key[1], key[2]) < (created_key, listing_id))
+                ]
+        if after is not None:
+            skip = 0
+        page = matches[skip:skip + limit + 1]
+        next_key = list(page[limit - 1]) if len(page) > limit else None
+        return [key[2] for key in page[:limit]], total, next_key
+
+    def expand_query(self, search: Optional[str]) -> Expansion:
+        """Query terms with the spelling corrections the indexed vocabulary offers for them."""
+        with self._lock:
+            return expand_query(self._indexes.vocabulary, search)
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[str]:
+        """Typeahead completions for `prefix` from titles, search keywords and category names."""
+        with self._lock:
+            return self._indexes.suggest.complete(prefix, limit)
+
+    def memory_report(self) -> Dict[str, Any]:
+        """Approximate memory held by the engine, also scaled to 10k listings for capacity planning."""
+        with self._lock:
+            indexes = self._indexes
+            usage = {
+                **indexes.trigrams.memory_usage(), **indexes.bm25.memory_usage(),
+                **indexes.suggest.memory_usage(), **indexes.vocabulary.memory_usage(),
+                **indexes.availability.memory_usage(),
+            }
+            docs_bytes = sys.getsizeof(indexes.docs) + sum(
+                sys.getsizeof(doc) + sys.getsizeof(doc.created_key) + sys.getsizeof(doc.suggestions) + sys.getsizeof(doc.tags)
+                for doc in indexes.docs.values()
+            )
+            listings = len(indexes.docs)
+        total_bytes = usage["postings_bytes"] + usage["texts_bytes"] + usage["bm25_bytes"] + usage["suggest_bytes"] + usage["vocabulary_bytes"] + usage["availability_bytes"] + docs_bytes
+        return {
+            "listings": listings,
+            **usage,
+            "docs_bytes": docs_bytes,
+            "total_bytes": total_bytes,
+            "bytes_per_10k_listings": round(total_bytes * 10000 / listings) if listings else 0,
+            "build_ms": round(self.build_seconds * 1000, 1) if self.build_seconds is not None else None,
+        }
@@ -0,0 +1,154 @@
+# application/search_engine/suggest.py
+"""
+Prefix index for typeahead suggestions.
+
+Each phrase (a listing title, a search keyword, a category name) is stored once with a weight,
+the number of times it was added (categories get a fixed boost). It is reachable through one key
+per word it contains, so "text" completes "Calculus Textbook" as well as "Textbook bundle".
+
+Keys live in a sorted list, so the keys starting with a prefix are one bisect range. Short prefixes
+match a large share of the keys, so ranking their whole range on every keystroke would be a scan;
+instead the top MAX_SUGGESTIONS of every prefix matching at least TABLE_MIN_KEYS keys are kept in a
+prefix table, like the top-k of a trie node. A table entry is filled from the entries of the prefix
+one character longer (the best phrases of a prefix are among the best of its extensions), and a
+write drops only the entries of the prefixes of the keys it touched, so typing "c", "ca", "cal"
+reads at most one small range per keystroke once the tables are warm.
+"""
+import heapq
+import sys
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+from .bm25 import tokenize
+
+CATEGORY_SUGGESTION_WEIGHT = 5 # A category name outranks titles used by fewer listings
+MAX_SUGGESTIONS = 20 # Most completions complete() returns (the /api/search/suggest limit)
+TABLE_MIN_KEYS = 64 # Prefixes matching fewer keys are ranked by reading their range
+
+_KEY_END = "\uffff" # Sorts after every character a normalized key can contain
+
+def normalize_phrase(text: Optional[str]) -> str:
+    return " ".join(tokenize(text))
+
+def phrase_keys(phrase: str) -> List[str]:
+    """The keys of a normalized phrase: the phrase from each of its words on."""
+    words = phrase.split(" ")
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+class PrefixIndex:
+    """Not thread-safe on its own; ListingSearchEngine serializes access (complete() fills the prefix table)."""
+
+    def __init__(self):
+        self._keys: List[Tuple[str, str]] = [] # Sorted (key, normalized phrase); key is the phrase from one of its words on
+        self._unsorted: List[Tuple[str, str]] = [] # Keys added since the last read, merged in by one sort (a build adds them all)
+        self._phrases: Dict[str, List] = {} # normalized phrase -> [display text, weight]
+        self._tables: Dict[str, List[Tuple]] = {} # prefix -> ranks of its best phrases, best first (see _rank)
+        self._table_depth = 0 # Longest prefix in the table; writes only need to drop prefixes up to it
+
+    def __len__(self) -> int:
+        return len(self._phrases)
+
+    def _sorted_keys(self) -> List[Tuple[str, str]]:
+        if self._unsorted:
+            self._keys.extend(self._unsorted)
+            self._keys.sort() # A sorted run plus a short tail: a merge, not a full sort
+            self._unsorted.clear()
+        return self._keys
+
+    def _forget_prefixes(self, phrase: str) -> None:
+        """Drop the table entries a change to `phrase` (new, removed or reweighted) can affect."""
+        if not self._tables:
+            return
+        for key in phrase_keys(phrase):
+            for length in range(1, min(len(key), self._table_depth) + 1):
+                self._tables.pop(key[:length], None)
+
+    def add(self, text: Optional[str], weight: int = 1) -> None:
+        phrase = normalize_phrase(text)
+        if not phrase:
+            return
+        self._forget_prefixes(phrase)
+        entry = self._phrases.get(phrase)
+        if entry is not None:
+            entry[1] += weight
+            return
+        self._phrases[phrase] = [" ".join(text.split()), weight]
+        self._unsorted.extend((key, phrase) for key in phrase_keys(phrase))
+
+    def remove(self, text: Optional[str], weight: int = 1) -> None:
+        phrase = normalize_phrase(text)
+        entry = self._phrases.get(phrase)
+        if entry is None:
+            return
+        self._forget_prefixes(phrase)
+        entry[1] -= weight
+        if entry[1] > 0:
+            return
+        del self._phrases[phrase]
+        keys = self._sorted_keys()
+        for key in phrase_keys(phrase):
+            i = bisect_left(keys, (key, phrase))
+            if i < len(keys) and keys[i] == (key, phrase):
+                del keys[i]
+
+    def _rank(self, key: str, phrase: str) -> Tuple:
+        """Heaviest first, phrases that start with the prefix before those matching a later word, then alphabetically."""
+        return (-self._phrases[phrase][1], key != phrase, phrase)
+
+    @staticmethod
+    def _best(ranks) -> List[Tuple]:
+        best: Dict[str, Tuple] = {}
+        for rank in ranks:
+            phrase = rank[2]
+            if phrase not in best or rank < best[phrase]:
+                best[phrase] = rank
+        return heapq.nsmallest(MAX_SUGGESTIONS, best.values())
+
+    def _top(self, prefix: str, lo: int, hi: int) -> List[Tuple]:
+        """The best phrases among the keys [lo, hi), all starting with `prefix`."""
+        keys = self._keys
+        if hi - lo < TABLE_MIN_KEYS:
+            return self._best(self._rank(key, phrase) for key, phrase in keys[lo:hi])
+        table = self._tables.get(prefix)
+        if table is not None:
+            return table
+        ranks, i = [], lo
+        while i < hi:
+            key, phrase = keys[i]
+            if len(key) == len(prefix): # The prefix is a whole key
+                ranks.append(self._rank(key, phrase))
+                i += 1
+                continue
+            extension = key[:len(prefix) + 1]
+            end = bisect_left(keys, (extension + _KEY_END,), i, hi)
+            ranks.extend(self._top(extension, i, end))
+            i = end
+        table = self._tables[prefix] = self._best(ranks)
+        self._table_depth = max(self._table_depth, len(prefix))
+        return table
+
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        """
+        Up to `limit` (at most MAX_SUGGESTIONS) phrases with a word starting with `prefix`: heaviest
+        first, phrases that start with the prefix before those matching a later word, then alphabetically.
+        """
+        prefix = normalize_phrase(prefix)
+        if not prefix:
+            return []
+        keys = self._sorted_keys()
+        lo = bisect_left(keys, (prefix,))
+        hi = bisect_left(keys, (prefix + _KEY_END,), lo)
+        return [self._phrases[rank[2]][0] for rank in self._top(prefix, lo, hi)[:limit]]
+
+    def memory_usage(self) -> Dict[str, int]:
+        keys = self._sorted_keys()
+        keys_bytes = sys.getsizeof(keys) + sum(sys.getsizeof(item) + sys.getsizeof(item[0]) for item in keys)
+        phrases_bytes = sys.getsizeof(self._phrases) + sum(
+            sys.getsizeof(phrase) + sys.getsizeof(entry) + sys.getsizeof(entry[0]) for phrase, entry in self._phrases.items()
+        )
+        tables_bytes = sys.getsizeof(self._tables) + sum(
+            sys.getsizeof(prefix) + sys.getsizeof(ranks) + sum(sys.getsizeof(rank) for rank in ranks)
+            for prefix, ranks in self._tables.items()
+        )
+        return {"suggestions": len(self._phrases), "suggest_bytes": keys_bytes + phrases_bytes + tables_bytes}
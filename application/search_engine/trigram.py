@@ -0,0 +1,133 @@
+# application/search_engine/trigram.py
+"""
+Trigram -> posting list index for substring search.
+
+Every indexed document is split into its lower-cased fields; each field contributes the set of
+its 3-character substrings (trigrams). A posting list is a sorted array('I') of document ids,
+4 bytes per entry, so the index stays compact and entries can be found by binary search.
+
+A substring query of 3+ characters can only match documents that contain every one of its
+trigrams, so the candidates are the intersection of the query's posting lists. Trigram order
+is not checked by the intersection, so candidates are verified against the stored text.
+"""
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+TRIGRAM_LENGTH = 3
+FIELD_SEPARATOR = "\x00" # Joins a document's fields so a match can't span two of them
+
+def normalize(text: Optional[str]) -> str:
+    return (text or "").lower()
+
+def trigrams(text: str) -> set:
+    return {text[i:i + TRIGRAM_LENGTH] for i in range(len(text) - TRIGRAM_LENGTH + 1)}
+
+def _contains(posting: array, doc_id: int) -> bool:
+    i = bisect_left(posting, doc_id)
+    return i < len(posting) and posting[i] == doc_id
+
+
+class TrigramIndex:
+    """Not thread-safe on its own; ListingSearchEngine serializes access."""
+
+    def __init__(self):
+        self._postings: Dict[str, array] = {}
+        self._texts: Dict[int, str] = {} # doc_id -> normalized fields joined by FIELD_SEPARATOR
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def __contains__(self, doc_id: int) -> bool:
+        return doc_id in self._texts
+
+    def _doc_trigrams(self, text: str) -> set:
+        grams = set()
+        for field in text.split(FIELD_SEPARATOR):
+            grams |= trigrams(field)
+        return grams
+
+    def add(self, doc_id: int, fields: Iterable[Optional[str]]) -> None:
+        """Index a document (replacing any previous version with the same id)."""
+        if doc_id in self._texts:
+            self.remove(doc_id)
+        text = FIELD_SEPARATOR.join(normalize(field) for field in fields)
+        self._texts[doc_id] = text
+        for gram in self._doc_trigrams(text):
+            posting = self._postings.get(gram)
+            if posting is None:
+                self._postings[gram] = array("I", (doc_id,))
+            elif doc_id > posting[-1]:
+                # New listings get increasing ids, so this is the common case
+                posting.append(doc_id)
+            else:
+                posting.insert(bisect_left(posting, doc_id), doc_id)
+
+    def remove(self, doc_id: int) -> None:
+        text = self._texts.pop(doc_id, None)
+        if text is None:
+            return
+        for gram in self._doc_trigrams(text):
+            posting = self._postings.get(gram)
+            if posting is None:
+                continue
+            i = bisect_left(posting, doc_id)
+            if i < len(posting) and posting[i] == doc_id:
+                del posting[i]
+            if not posting:
+                del self._postings[gram]
+
+    def search(self, query: str) -> List[int]:
+        """
+        Ids (ascending) of documents with `query` as a substring of one of their fields.
+        Queries shorter than a trigram can't be answered; callers check supports() first.
+        """
+        return sorted(doc_id for doc_id, _ in self.matches(query))
+
+    def matches(self, query: str) -> List[Tuple[int, int]]:
+        """(doc_id, offset of the first occurrence in the joined fields) for every document matching `query`."""
+        query = normalize(query)
+        grams = trigrams(query)
+        if not grams:
+            raise ValueError(f"Queries need at least {TRIGRAM_LENGTH} characters")
+        postings = []
+        for gram in grams:
+            posting = self._postings.get(gram)
+            if posting is None:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if len(candidates) * 16 < len(posting):
+                # Few candidates left: binary-search them instead of walking the whole list
+                candidates = {doc_id for doc_id in candidates if _contains(posting, doc_id)}
+            else:
+                candidates.intersection_update(posting)
+            if not candidates:
+                return []
+        texts = self._texts
+        found = []
+        for doc_id in candidates:
+            offset = texts[doc_id].find(query)
+            if offset >= 0:
+                found.append((doc_id, offset))
+        return found
+
+    @staticmethod
+    def supports(query: Optional[str]) -> bool:
+        return len(normalize(query)) >= TRIGRAM_LENGTH
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Approximate bytes held by the postings and the stored text used for verification."""
+        postings_bytes = sys.getsizeof(self._postings) + sum(
+            sys.getsizeof(gram) + sys.getsizeof(posting) for gram, posting in self._postings.items()
+        )
+        texts_bytes = sys.getsizeof(self._texts) + sum(sys.getsizeof(text) for text in self._texts.values())
+        return {
+            "trigrams": len(self._postings),
+            "postings": sum(len(posting) for posting in self._postings.values()),
+            "postings_bytes": postings_bytes,
+            "texts_bytes": texts_bytes,
+        }
@@ -0,0 +1,378 @@
+# application/trending.py
+"""
+Trending listings, ranked by recent views and conversations rather than lifetime views_count.
+
+read_listing and initiate_conversation_with_message record events with trending_recorder. Like
+application.view_counter, events are counted in memory and written every
+TRENDING_FLUSH_INTERVAL_SECONDS, into per-hour buckets (listing_activity: one row per listing and
+hour, pruned after TRENDING_WINDOW_HOURS). A listing's score halves every TRENDING_HALF_LIFE_HOURS:
+
+    score(now) = sum over hours h of (views_h + CONVERSATION_WEIGHT * conversations_h) * 0.5 ** ((now - h) / half_life)
+
+trending_listings keeps the TRENDING_TOP_K best scores of every category (counting listings of its
+subcategories) and of ALL_CATEGORIES, plus TRENDING_SPARE runners-up, each as of the hour it was
+computed. Decay scales every score by the same factor, so rankings only change when a listing gets
+new events: a flush re-scores the listings it wrote and merges them into the stored rankings of
+their categories, and /api/listings/trending reads one category's rows. A listing leaving a ranking
+(unapproved, moved, deleted) is dropped from it by crud in the writing transaction; the runners-up
+move up, and only a category left with fewer than TRENDING_TOP_K rows is refilled, from the buckets
+of its own listings.
+
+The same flush keeps the seller analytics of /api/listings/my-listings/stats: a daily rollup of the
+buckets (listing_daily_activity, never pruned) and, per listing, a HyperLogLog sketch of its distinct
+viewers (listing_viewer_sketches), so unique viewers are counted without storing a row per view.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select, true
+from sqlalchemy.orm import Session
+
+from application.database import models
+from application.hyperloglog import HyperLogLog
+
+logger = logging.getLogger(__name__)
+
+TRENDING_FLUSH_INTERVAL_SECONDS = float(os.getenv("TRENDING_FLUSH_INTERVAL_SECONDS", "30"))
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "24"))
+TRENDING_WINDOW_HOURS = int(os.getenv("TRENDING_WINDOW_HOURS", "168")) # Older activity is pruned; it weighs < 1/128 at the default half-life
+TRENDING_TOP_K = 50 # The most listings /api/listings/trending returns
+TRENDING_SPARE = 50 # Runners-up kept per category beyond the top-K, so listings leaving it rarely need a refill
+CONVERSATION_WEIGHT = 10.0 # A conversation started about a listing counts as this many views
+ALL_CATEGORIES = 0 # trending_listings.category_id of the ranking over every category
+TRENDING_STATUS = "approved"
+
+Events = Dict[Tuple[int, int], List[int]] # (listing_id, hour) -> [views, conversations]
+Sketches = Dict[int, HyperLogLog] # listing_id -> viewers not yet merged into its stored sketch
+
+
+def current_hour() -> int:
+    """Hours since the Unix epoch, the unit of listing_activity.hour."""
+    return int(time.time() // 3600)
+
+def decayed(score: float, from_hour: int, to_hour: int) -> float:
+    """A score as of from_hour, decayed to to_hour."""
+    return score * 0.5 ** ((to_hour - from_hour) / TRENDING_HALF_LIFE_HOURS)
+
+
+# --- Activity buckets and scores ---
+def _add_counts(connection, table, period_column: str, counts: Events) -> None:
+    for (listing_id, period), (views, conversations) in counts.items():
+        period_matches = table.c[period_column] == period
+        result = connection.execute(
+            table.update()
+            .where(table.c.listing_id == listing_id, period_matches)
+            .values(views=table.c.views + views, conversations=table.c.conversations + conversations)
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(listing_id=listing_id, views=views, conversations=conversations, **{period_column: period}))
+
+def _add_activity(connection, events: Events) -> None:
+    """Add events to their hourly buckets and to the daily rollup."""
+    daily: Events = {}
+    for (listing_id, hour), (views, conversations) in events.items():
+        counts = daily.setdefault((listing_id, hour // 24), [0, 0])
+        counts[0] += views
+        counts[1] += conversations
+    _add_counts(connection, models.ListingActivity.__table__, "hour", events)
+    _add_counts(connection, models.ListingDailyActivity.__table__, "day", daily)
+
+def _merge_viewer_sketches(connection, sketches: Sketches) -> None:
+    """Merge new viewers into the stored sketches. Rows are read for update, so concurrent flushes can't drop each other's viewers."""
+    table = models.ListingViewerSketch.__table__
+    stored = dict(connection.execute(
+        select(table.c.listing_id, table.c.registers).where(table.c.listing_id.in_(sketches)).with_for_update()
+    ).all())
+    for listing_id, sketch in sketches.items():
+        if listing_id in stored:
+            merged = HyperLogLog.from_bytes(stored[listing_id])
+            merged.merge(sketch)
+            connection.execute(table.update().where(table.c.listing_id == listing_id).values(registers=merged.to_bytes()))
+        else:
+            connection.execute(table.insert().values(listing_id=listing_id, registers=sketch.to_bytes()))
+
+def prune_activity(connection, hour: int) -> int:
+    """Delete the buckets that fell out of the window. Returns the number of rows deleted."""
+    activity = models.ListingActivity.__table__
+    return connection.execute(activity.delete().where(activity.c.hour <= hour - TRENDING_WINDOW_HOURS)).rowcount
+
+def _activity_scores(connection, hour: int, condition) -> Dict[int, float]:
+    """Scores as of `hour` of the approved listings matching `condition` that have activity in the window."""
+    activity = models.ListingActivity
+    rows = connection.execute(
+        select(activity.listing_id, activity.hour, activity.views, activity.conversations)
+        .join(models.Listing, models.Listing.listing_id == activity.listing_id)
+        .where(
+            activity.hour > hour - TRENDING_WINDOW_HOURS, activity.hour <= hour,
+            models.Listing.status == TRENDING_STATUS, condition,
+        )
+    )
+    scores: Dict[int, float] = {}
+    for listing_id, bucket_hour, views, conversations in rows:
+        weight = views + CONVERSATION_WEIGHT * conversations
+        scores[listing_id] = scores.get(listing_id, 0.0) + decayed(weight, bucket_hour, hour)
+    return scores
+
+def _trending_categories(connection, condition) -> Dict[int, List[int]]:
+    """Categories whose ranking each approved listing matching `condition` is in: all, its own and every one above it."""
+    rows = connection.execute(
+        select(models.Listing.listing_id, models.CategoryClosure.ancestor_id)
+        .join(models.CategoryClosure, models.CategoryClosure.descendant_id == models.Listing.category_id)
+        .where(models.Listing.status == TRENDING_STATUS, condition)
+    )
+    categories: Dict[int, List[int]] = {}
+    for listing_id, ancestor_id in rows:
+        categories.setdefault(listing_id, [ALL_CATEGORIES]).append(ancestor_id)
+    return categories
+
+def _ranked(scores: Dict[int, float]) -> List[int]:
+    return sorted(scores, key=lambda listing_id: (-scores[listing_id], listing_id))
+
+def _stored_per_category() -> int:
+    return TRENDING_TOP_K + TRENDING_SPARE
+
+
+# --- Maintaining the top-K ---
+def refresh_trending(connection, listing_ids: Iterable[int], hour: int) -> int:
+    """
+    Re-score `listing_ids` from their buckets and merge them into the stored rankings of their
+    categories. Listings outside a ranking can only enter it through their own new events, so the
+    other rows stay valid. Returns the number of rows written.
+    """
+    listing_ids = set(listing_ids)
+    if not listing_ids:
+        return 0
+    scores = _activity_scores(connection, hour, models.ListingActivity.listing_id.in_(listing_ids))
+    if not scores:
+        return 0
+    offered: Dict[int, Dict[int, float]] = {}
+    for listing_id, category_ids in _trending_categories(connection, models.Listing.listing_id.in_(scores)).items():
+        for category_id in category_ids:
+            offered.setdefault(category_id, {})[listing_id] = scores[listing_id]
+
+    trending = models.TrendingListing.__table__
+    stored: Dict[int, Dict[int, float]] = {category_id: {} for category_id in offered}
+    for category_id, listing_id, score, scored_hour in connection.execute(
+        select(trending.c.category_id, trending.c.listing_id, trending.c.score, trending.c.scored_hour)
+        .where(trending.c.category_id.in_(offered))
+    ):
+        stored[category_id][listing_id] = decayed(score, scored_hour, hour)
+
+    written = 0
+    for category_id, offers in offered.items():
+        current = stored[category_id]
+        top = set(_ranked({**current, **offers})[:_stored_per_category()])
+        dropped = [listing_id for listing_id in current if listing_id not in top]
+        if dropped:
+            connection.execute(trending.delete().where(trending.c.category_id == category_id, trending.c.listing_id.in_(dropped)))
+        for listing_id, score in offers.items():
+            if listing_id not in top:
+                continue
+            if listing_id in current:
+                connection.execute(
+                    trending.update().where(trending.c.category_id == category_id, trending.c.listing_id == listing_id)
+                    .values(score=score, scored_hour=hour)
+                )
+            else:
+                connection.execute(trending.insert().values(category_id=category_id, listing_id=listing_id, score=score, scored_hour=hour))
+            written += 1
+    return written
+
+def rebuild_trending(connection, hour: int, category_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recompute the rankings of `category_ids` (of every category when None) from the buckets in the window,
+    reading only the activity of listings in their subtrees. Returns the rows written.
+    """
+    trending = models.TrendingListing.__table__
+    condition = true()
+    if category_ids is not None:
+        category_ids = set(category_ids)
+        if not category_ids:
+            return 0
+        if ALL_CATEGORIES not in category_ids: # Only listings in the subtrees being rebuilt can rank in them
+            closure = models.CategoryClosure
+            condition = models.Listing.category_id.in_(select(closure.descendant_id).where(closure.ancestor_id.in_(category_ids)))
+    scores = _activity_scores(connection, hour, condition)
+    active = models.Listing.listing_id.in_(
+        select(models.ListingActivity.listing_id).where(models.ListingActivity.hour > hour - TRENDING_WINDOW_HOURS)
+    )
+    ranked: Dict[int, Dict[int, float]] = {}
+    for listing_id, listing_categories in _trending_categories(connection, condition & active).items():
+        for category_id in listing_categories:
+            if listing_id in scores and (category_ids is None or category_id in category_ids):
+                ranked.setdefault(category_id, {})[listing_id] = scores[listing_id]
+
+    if category_ids is None:
+        connection.execute(trending.delete())
+    else:
+        connection.execute(trending.delete().where(trending.c.category_id.in_(category_ids)))
+    rows = [
+        {"category_id": category_id, "listing_id": listing_id, "score": category_scores[listing_id], "scored_hour": hour}
+        for category_id, category_scores in ranked.items()
+        for listing_id in _ranked(category_scores)[:_stored_per_category()]
+    ]
+    if rows:
+        connection.execute(trending.insert(), rows)
+    return len(rows)
+
+def _leave_categories(connection, listing_id: int, category_ids, hour: int) -> None:
+    """
+    Take a listing out of the rankings of `category_ids`. The runners-up below it move up; a category
+    left with fewer than TRENDING_TOP_K rows is refilled on its own from its listings' buckets (there is
+    nothing to refill with when its ranking was never full).
+    """
+    trending = models.TrendingListing.__table__
+    connection.execute(trending.delete().where(trending.c.listing_id == listing_id, trending.c.category_id.in_(category_ids)))
+    remaining = dict(connection.execute(
+        select(trending.c.category_id, func.count()).where(trending.c.category_id.in_(category_ids)).group_by(trending.c.category_id)
+    ).all())
+    for category_id in sorted(category_ids):
+        if remaining.get(category_id, 0) < TRENDING_TOP_K:
+            rebuild_trending(connection, hour, [category_id])
+
+def forget_listing(db: Session, listing_id: int) -> None:
+    """Delete a listing's activity, analytics and rankings, before the listing itself is deleted; doesn't commit."""
+    connection = db.connection()
+    for model in (models.ListingActivity, models.ListingDailyActivity, models.ListingViewerSketch):
+        connection.execute(model.__table__.delete().where(model.__table__.c.listing_id == listing_id))
+    trending = models.TrendingListing.__table__
+    category_ids = connection.execute(select(trending.c.category_id).where(trending.c.listing_id == listing_id)).scalars().all()
+    if category_ids:
+        _leave_categories(connection, listing_id, category_ids, current_hour())
+
+def ensure_trending(engine) -> int:
+    """Prune old buckets and recompute every ranking, repairing whatever a crashed worker left behind. Returns the rows written."""
+    hour = current_hour()
+    with engine.begin() as connection:
+        prune_activity(connection, hour)
+        return rebuild_trending(connection, hour)
+
+def get_trending(db: Session, category_id: Optional[int] = None, limit: int = 20) -> List[Tuple[int, float]]:
+    """(listing_id, current score) of the most trending approved listings in a category's subtree, or in all categories, best first."""
+    hour = current_hour()
+    trending = models.TrendingListing
+    rows = db.execute(
+        select(trending.listing_id, trending.score, trending.scored_hour)
+        .join(models.Listing, models.Listing.listing_id == trending.listing_id)
+        .where(trending.category_id == (category_id or ALL_CATEGORIES), models.Listing.status == TRENDING_STATUS)
+    ).all()
+    scores = {listing_id: decayed(score, scored_hour, hour) for listing_id, score, scored_hour in rows}
+    return [(listing_id, scores[listing_id]) for listing_id in _ranked(scores)[:limit]]
+
+def follow_listing(db: Session, listing_id: int) -> None:
+    """
+    Keep the rankings to approved listings in their current categories after a listing's status or
+    category changed. Called by crud before it commits the change, so the rankings are written in the
+    same transaction; doesn't commit.
+    """
+    db.flush()
+    connection = db.connection()
+    trending = models.TrendingListing.__table__
+    ranked_in = set(connection.execute(select(trending.c.category_id).where(trending.c.listing_id == listing_id)).scalars())
+    belongs_in = set(_trending_categories(connection, models.Listing.listing_id == listing_id).get(listing_id, []))
+    if ranked_in == belongs_in:
+        return
+    hour = current_hour()
+    if ranked_in - belongs_in:
+        _leave_categories(connection, listing_id, ranked_in - belongs_in, hour)
+    if belongs_in - ranked_in: # Newly approved or moved: rank it in its new categories if it has recent activity
+        refresh_trending(connection, [listing_id], hour)
+
+
+# --- Recording events ---
+class TrendingRecorder:
+    """
+    Counts listing events per (listing, hour), and viewers per listing, in memory and writes them in
+    batches, like view_counter.ViewCounter.
+    """
+
+    def __init__(self, flush_interval: float = TRENDING_FLUSH_INTERVAL_SECONDS):
+        self.flush_interval = flush_interval
+        self._pending: Dict[object, Events] = {} # bind -> events not yet written
+        self._pending_viewers: Dict[object, Sketches] = {} # bind -> viewers not yet written
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pruned_hour: Dict[object, int] = {} # bind -> hour its buckets were last pruned
+        self.flushes = 0
+
+    def record_view(self, bind, listing_id: int, viewer: Optional[str] = None) -> None:
+        """Count a view of a listing; `viewer` identifies the viewer (user or client) for the unique viewer count."""
+        if viewer is not None:
+            with self._lock:
+                sketch = self._pending_viewers.setdefault(bind, {}).setdefault(listing_id, HyperLogLog())
+                sketch.add(viewer)
+        self._record(bind, listing_id, views=1, conversations=0)
+
+    def record_conversation(self, bind, listing_id: int) -> None:
+        self._record(bind, listing_id, views=0, conversations=1)
+
+    def _record(self, bind, listing_id: int, views: int, conversations: int) -> None:
+        self._add(bind, {(listing_id, current_hour()): [views, conversations]})
+        if self.flush_interval <= 0:
+            self.flush()
+
+    def _add(self, bind, events: Events, viewers: Optional[Sketches] = None) -> None:
+        with self._lock:
+            pending = self._pending.setdefault(bind, {})
+            for key, (views, conversations) in events.items():
+                counts = pending.setdefault(key, [0, 0])
+                counts[0] += views
+                counts[1] += conversations
+            for listing_id, sketch in (viewers or {}).items():
+                self._pending_viewers.setdefault(bind, {}).setdefault(listing_id, HyperLogLog()).merge(sketch)
+
+    def flush(self) -> int:
+        """Write the pending events and update the rankings they change. Returns the number of buckets written."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                pending_viewers, self._pending_viewers = self._pending_viewers, {}
+            written = 0
+            for bind, events in pending.items():
+                hour = current_hour()
+                viewers = pending_viewers.get(bind, {})
+                try:
+                    with bind.begin() as connection:
+                        _add_activity(connection, events) # Writes first, so the sketches are read under the write lock
+                        if viewers:
+                            _merge_viewer_sketches(connection, viewers)
+                        if self._pruned_hour.get(bind) != hour:
+                            prune_activity(connection, hour)
+                        refresh_trending(connection, {listing_id for listing_id, _ in events}, hour)
+                except Exception as e:
+                    logger.error(f"Writing {len(events)} listing activity buckets failed, keeping them for the next flush: {e}")
+                    self._add(bind, events, viewers)
+                    continue
+                self._pruned_hour[bind] = hour
+                written += len(events)
+            self.flushes += 1
+            return written
+
+    # --- Background flushing ---
+    def start(self) -> None:
+        """Start the thread that flushes every flush_interval seconds (a no-op when writing through)."""
+        if self.flush_interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="trending-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the flushing thread and write what is still pending."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+
+trending_recorder = TrendingRecorder()
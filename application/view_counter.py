@@ -0,0 +1,113 @@
+# application/view_counter.py
+"""
+Write-behind counter for listing views.
+
+GET /api/listings/{id} used to be a write transaction (read views_count, add one, commit). Views
+are now recorded in memory and a background thread writes them every VIEW_FLUSH_INTERVAL_SECONDS
+with one batched statement, `UPDATE listings SET views_count = views_count + :n`, so a detail page
+never waits for the SQLite write lock and concurrent views are never lost to a read-modify-write.
+
+Counts live in the worker process, like the caches in application.cache: a worker that dies
+without shutting down loses at most one interval of views. The FastAPI lifespan starts the flusher
+and flushes on shutdown. With VIEW_FLUSH_INTERVAL_SECONDS=0 every view is written immediately.
+"""
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, func
+
+from application.database import models
+
+logger = logging.getLogger(__name__)
+
+VIEW_FLUSH_INTERVAL_SECONDS = float(os.getenv("VIEW_FLUSH_INTERVAL_SECONDS", "5"))
+
+
+class ViewCounter:
+    def __init__(self, flush_interval: float = VIEW_FLUSH_INTERVAL_SECONDS):
+        self.flush_interval = flush_interval
+        self._pending: Dict[object, Dict[int, int]] = {} # bind -> {listing_id: views not yet written}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock() # One flush at a time, so a failed batch is re-queued before the next
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.flushes = 0
+        self.rows_written = 0
+
+    def record(self, bind, listing_id: int, views: int = 1) -> None:
+        """Count `views` of a listing stored in `bind` (the request session's engine)."""
+        self._add(bind, listing_id, views)
+        if self.flush_interval <= 0:
+            self.flush()
+
+    def pending(self, bind, listing_id: int) -> int:
+        """Views of a listing recorded but not yet written, to add to its stored views_count."""
+        with self._lock:
+            return self._pending.get(bind, {}).get(listing_id, 0)
+
+    def flush(self) -> int:
+        """Write every pending count, one executemany UPDATE per database. Returns the number of listings updated."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            written = 0
+            for bind, counts in pending.items():
+                listings = models.Listing.__table__
+                statement = listings.update().where(listings.c.listing_id == bindparam("b_listing_id")).values(
+                    views_count=func.coalesce(listings.c.views_count, 0) + bindparam("b_views"),
+                    updated_at=listings.c.updated_at, # Views aren't edits: keep the listing's Last-Modified
+                )
+                try:
+                    with bind.begin() as connection:
+                        connection.execute(statement, [
+                            {"b_listing_id": listing_id, "b_views": views} for listing_id, views in counts.items()
+                        ])
+                except Exception as e:
+                    logger.error(f"Writing {sum(counts.values())} listing views failed, keeping them for the next flush: {e}")
+                    for listing_id, views in counts.items():
+                        self._add(bind, listing_id, views)
+                    continue
+                written += len(counts)
+            self.flushes += 1
+            self.rows_written += written
+            return written
+
+    def _add(self, bind, listing_id: int, views: int) -> None:
+        with self._lock:
+            pending = self._pending.setdefault(bind, {})
+            pending[listing_id] = pending.get(listing_id, 0) + views
+
+    # --- Background flushing ---
+    def start(self) -> None:
+        """Start the thread that flushes every flush_interval seconds (a no-op when writing through)."""
+        if self.flush_interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="view-counter-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the flushing thread and write what is still pending."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            pending_listings = sum(len(counts) for counts in self._pending.values())
+            pending_views = sum(sum(counts.values()) for counts in self._pending.values())
+        return {
+            "pending_listings": pending_listings, "pending_views": pending_views,
+            "flushes": self.flushes, "rows_written": self.rows_written,
+        }
+
+
+view_counter = ViewCounter()
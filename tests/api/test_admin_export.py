@@ -0,0 +1,69 @@
+import csv
+import io
+import json
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from application.app import app
+from application.database import crud, models
+from application.security import get_current_admin_user
+
+from conftest import engine
+
+
+@pytest.fixture
+def db(api_db):
+    admin = models.User(username="admin", email="admin@sfsu.edu", hashed_password="x", is_admin=True)
+    api_db.add_all([admin, models.Category(name="Books")])
+    api_db.commit()
+    for i in range(7):
+        api_db.add(models.Listing(
+            seller_id=admin.user_id, category_id=1, title=f"Book {i}", description="Line one,\nline \"two\"",
+            search_keywords="books, paper" if i % 2 else "books", item_condition="good", price=5 + i,
+            status="approved" if i < 5 else "pending_approval",
+        ))
+    api_db.commit()
+    app.dependency_overrides[get_current_admin_user] = lambda: admin
+    yield api_db
+
+
+client = TestClient(app)
+
+
+def test_ndjson_export_streams_every_matching_listing(db):
+    response = client.get("/api/admin/listings/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["listing_id"] for row in rows] == list(range(1, 8))
+    assert list(rows[0]) == crud.LISTING_EXPORT_FIELDS
+    assert rows[0]["seller_username"] == "admin" and rows[0]["created_at"]
+
+    filtered = client.get("/api/admin/listings/export", params={"status": "approved", "tags": "paper"}).text.splitlines()
+    assert [json.loads(line)["title"] for line in filtered] == ["Book 1", "Book 3"]
+
+
+def test_csv_export(db):
+    response = client.get("/api/admin/listings/export", params={"format": "csv", "min_price": 10})
+    assert response.status_code == 200
+    assert response.headers["content-disposition"] == 'attachment; filename="listings.csv"'
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["title"] for row in rows] == ["Book 5", "Book 6"]
+    assert rows[0]["description"] == "Line one,\nline \"two\""
+    empty = client.get("/api/admin/listings/export", params={"format": "csv", "q": "nothing"}).text
+    assert empty.strip() == ",".join(crud.LISTING_EXPORT_FIELDS)
+    assert client.get("/api/admin/listings/export", params={"format": "xml"}).status_code == 422
+
+
+def test_export_reads_one_cursor_in_batches(db):
+    statement = crud.listing_export_statement(db, status=None)
+    statements = []
+    listener = lambda conn, cursor, statement, parameters, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        batches = list(crud.stream_listing_export(engine, statement, batch_size=3))
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    assert len(statements) == 1
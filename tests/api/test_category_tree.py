@@ -0,0 +1,74 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from application.app import app
+from application.database import crud, models
+from application.router import search as search_router
+from application.schemas import CategoryCreate
+
+from conftest import engine
+
+
+@pytest.fixture
+def db(api_db):
+    search_router.category_tree_cache.clear()
+    books = crud.create_category(api_db, CategoryCreate(name="Books", display_order=2))
+    tech = crud.create_category(api_db, CategoryCreate(name="Tech", display_order=1))
+    crud.create_category(api_db, CategoryCreate(name="Textbooks", parent_id=books.category_id, display_order=1))
+    crud.create_category(api_db, CategoryCreate(name="Novels", parent_id=books.category_id))
+    retired = crud.create_category(api_db, CategoryCreate(name="Retired", parent_id=tech.category_id, is_active=False))
+    crud.create_category(api_db, CategoryCreate(name="Below retired", parent_id=retired.category_id))
+    tutoring = crud.create_category(api_db, CategoryCreate(name="Tutoring", is_skill_category=True))
+    crud.create_category(api_db, CategoryCreate(name="Math", parent_id=tutoring.category_id, is_skill_category=True))
+    yield api_db
+
+
+client = TestClient(app)
+
+
+def names(nodes):
+    return [(node["name"], names(node["children"])) for node in nodes]
+
+
+def test_tree_nests_active_categories_by_type(db):
+    response = client.get("/api/categories/tree")
+    assert response.status_code == 200
+    tree = response.json()
+    assert names(tree["items"]) == [("Tech", []), ("Books", [("Novels", []), ("Textbooks", [])])]
+    assert names(tree["skills"]) == [("Tutoring", [("Math", [])])]
+
+
+def test_repeat_requests_are_served_from_memory_and_revalidate(db):
+    first = client.get("/api/categories/tree")
+    etag = first.headers["etag"]
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        again = client.get("/api/categories/tree")
+        revalidated = client.get("/api/categories/tree", headers={"If-None-Match": etag})
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert len(statements) == 2 and all("table_versions" in statement for statement in statements) # One version read each
+    assert again.content == first.content and again.headers["etag"] == etag
+    assert revalidated.status_code == 304 and revalidated.content == b""
+
+
+def test_creating_a_category_invalidates_the_tree(db):
+    etag = client.get("/api/categories/tree").headers["etag"]
+    crud.create_category(db, CategoryCreate(name="Lab kits", is_skill_category=False))
+    response = client.get("/api/categories/tree", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert "Lab kits" in [node["name"] for node in response.json()["items"]]
+
+
+def test_category_writes_from_other_workers_invalidate_the_tree(db):
+    etag = client.get("/api/categories/tree").headers["etag"]
+    novels = db.query(models.Category).filter_by(name="Novels").one()
+    novels.is_active = False # Not through crud, as a script or another worker would
+    db.commit()
+    response = client.get("/api/categories/tree", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert names(response.json()["items"]) == [("Tech", []), ("Books", [("Textbooks", [])])]
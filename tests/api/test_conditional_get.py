@@ -0,0 +1,147 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from application.app import app
+from application.database import crud, models
+from application.router.search import search_results_cache
+from application.schemas import CategoryCreate, ListingCreate
+from application.security import get_current_active_user_optional
+from application.view_counter import view_counter
+
+from conftest import engine
+
+
+@pytest.fixture
+def db(api_db, monkeypatch):
+    models.ensure_table_versions(engine)
+    search_results_cache.clear()
+    monkeypatch.setattr(view_counter, "flush_interval", 3600) # Only explicit flushes
+    api_db.add_all([
+        models.User(username="seller", email="seller@sfsu.edu", hashed_password="x"),
+        models.Category(name="Books"),
+    ])
+    api_db.commit()
+    for title, status in (("Lamp", "approved"), ("Desk", "pending_approval")):
+        api_db.add(models.Listing(seller_id=1, category_id=1, title=title, description=title, item_condition="good", price=5, status=status))
+    api_db.commit()
+    yield api_db
+
+
+client = TestClient(app)
+
+
+def count_statements(request):
+    statements = []
+    listener = lambda conn, cursor, statement, parameters, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        response = request()
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    return response, statements
+
+
+def revalidate(url, response, **params):
+    return client.get(url, params=params, headers={"If-None-Match": response.headers["ETag"]})
+
+
+def test_unchanged_listing_is_not_modified_without_loading_it(db):
+    first = client.get("/api/listings/1")
+    assert first.status_code == 200
+    assert first.headers["ETag"].startswith('W/"') and "Last-Modified" in first.headers
+
+    second, statements = count_statements(lambda: revalidate("/api/listings/1", first))
+    assert second.status_code == 304 and second.content == b""
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert len(statements) == 1 # The validators; the listing, its seller and images are never loaded
+
+    assert view_counter.pending(engine, 1) == 2 # The 304 counted as a view
+    view_counter.flush()
+    assert revalidate("/api/listings/1", first).status_code == 304 # Views don't change the listing
+
+    since = client.get("/api/listings/1", headers={"If-Modified-Since": first.headers["Last-Modified"]})
+    assert since.status_code == 304
+
+
+def test_listing_edits_image_changes_and_category_renames_change_the_etag(db):
+    seller = db.get(models.User, 1)
+    app.dependency_overrides[get_current_active_user_optional] = lambda: seller # The edit sends the listing back to moderation
+    etags = [client.get("/api/listings/1").headers["ETag"]]
+
+    crud.update_listing(db, 1, seller_id=1, update_data={"title": "Desk lamp"})
+    etags.append(client.get("/api/listings/1").headers["ETag"])
+
+    image = crud.create_listing_image(db, 1, "static/images/listings/a.jpg", "static/images/listings/a_thumb.jpg")
+    etags.append(client.get("/api/listings/1").headers["ETag"])
+
+    crud.delete_listing_image(db, image.image_id, seller_id=1)
+    etags.append(client.get("/api/listings/1").headers["ETag"])
+
+    db.get(models.Category, 1).name = "Reading"
+    db.commit()
+    etags.append(client.get("/api/listings/1").headers["ETag"])
+
+    assert len(set(etags)) == len(etags)
+    stale = client.get("/api/listings/1", headers={"If-None-Match": etags[0]})
+    assert stale.status_code == 200 and stale.json()["title"] == "Desk lamp"
+
+
+def test_unapproved_listing_stays_private(db):
+    response = client.get("/api/listings/2", headers={"If-None-Match": "*"})
+    assert response.status_code == 404 # The access check comes before any 304
+
+    seller = db.get(models.User, 1)
+    app.dependency_overrides[get_current_active_user_optional] = lambda: seller
+    response = client.get("/api/listings/2")
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+
+def test_search_is_not_modified_until_a_listing_changes(db):
+    first = client.get("/api/search", params={"q": "Lamp"})
+    assert first.status_code == 200 and first.json()["total"] == 1
+
+    second, statements = count_statements(lambda: revalidate("/api/search", first, q="Lamp"))
+    assert second.status_code == 304
+    assert len(statements) == 1 # The table versions; the search itself doesn't run
+
+    crud.update_listing_status(db, 2, "approved")
+    third = revalidate("/api/search", first, q="Lamp")
+    assert third.status_code == 200 and third.headers["ETag"] != first.headers["ETag"]
+
+    assert "ETag" not in client.get("/api/search", params={"sort": "views"}).headers # Ordered by the view counter
+
+
+def test_reviews_change_the_etag_of_seller_rating_searches(db):
+    db.add(models.User(username="other", email="other@sfsu.edu", hashed_password="x"))
+    db.add(models.Listing(seller_id=2, category_id=1, title="Chair", description="Chair", item_condition="good", price=5, status="approved"))
+    db.commit()
+    first = client.get("/api/search", params={"sort": "seller_rating"})
+    assert revalidate("/api/search", first, sort="seller_rating").status_code == 304
+
+    db.add(models.Review(listing_id=3, reviewer_id=1, reviewee_id=2, rating=5)) # The seller of Chair gets rated
+    db.commit()
+    second = revalidate("/api/search", first, sort="seller_rating")
+    assert second.status_code == 200
+    assert [hit["title"] for hit in second.json()["results"]] == ["Chair", "Lamp"]
+
+
+def test_categories_change_with_categories_and_listing_counts(db):
+    first = client.get("/api/categories")
+    assert first.json()[0]["listing_count"] == 1
+    assert revalidate("/api/categories", first).status_code == 304
+
+    crud.update_listing_status(db, 2, "approved")
+    second = revalidate("/api/categories", first)
+    assert second.status_code == 200 and second.json()[0]["listing_count"] == 2
+
+    crud.create_category(db, CategoryCreate(name="Lamps", parent_id=1))
+    assert revalidate("/api/categories", second).status_code == 200
+
+
+def test_table_versions_are_shared_through_the_database(db):
+    listings, categories = crud.get_table_versions(db, (models.LISTINGS_VERSION, models.CATEGORIES_VERSION))
+    listing = crud.create_listing(db, ListingCreate(title="Chair", description="x", category_id=1, item_condition="good", price=3), seller_id=1)
+    assert crud.get_table_versions(db, (models.LISTINGS_VERSION, models.CATEGORIES_VERSION)) == (listings + 1, categories)
+    assert db.get(models.Listing, listing.listing_id).revision == 0
@@ -0,0 +1,98 @@
+import pytest
+import threading
+import time
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from application.app import app
+from application.database import crud, models
+from application.router.listings import listing_detail_cache, listing_detail_loads
+from application import schemas
+from application.security import get_current_active_user_optional
+from application.view_counter import view_counter
+
+from conftest import engine
+
+
+@pytest.fixture
+def db(api_db, monkeypatch):
+    listing_detail_cache.clear()
+    monkeypatch.setattr(view_counter, "flush_interval", 3600) # Only explicit flushes
+    api_db.add_all([
+        models.User(username="seller", email="seller@sfsu.edu", hashed_password="x"),
+        models.Category(name="Books"),
+    ])
+    api_db.commit()
+    for title, status in (("Lamp", "approved"), ("Desk", "pending_approval")):
+        api_db.add(models.Listing(seller_id=1, category_id=1, title=title, description=title, item_condition="good", price=5, status=status))
+    api_db.commit()
+    yield api_db
+
+
+client = TestClient(app)
+
+
+def as_seller(db):
+    seller = db.get(models.User, 1)
+    app.dependency_overrides[get_current_active_user_optional] = lambda: seller
+
+
+def test_cached_response_matches_a_fresh_one_and_counts_views(db):
+    first = client.get("/api/listings/1").json()
+    statements = []
+    listener = lambda conn, cursor, statement, parameters, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        second = client.get("/api/listings/1").json()
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert len(statements) == 1 # The validators; the listing was served from the cache
+    assert (first["views_count"], second["views_count"]) == (1, 2)
+
+    view_counter.flush() # Moves the pending views into views_count
+    db.expire_all()
+    fresh = schemas.Listing.model_validate(crud.get_listing(db, 1)).model_dump(mode="json")
+    third = client.get("/api/listings/1").json()
+    assert third == {**fresh, "views_count": 3}
+
+
+def test_concurrent_misses_load_the_listing_once(db, monkeypatch):
+    loads = []
+    get_listing = crud.get_listing
+    def slow_get_listing(database, listing_id):
+        loads.append(listing_id)
+        time.sleep(0.2) # Long enough for every request to arrive while the first one loads
+        return get_listing(database, listing_id)
+    monkeypatch.setattr(crud, "get_listing", slow_get_listing)
+    shared = listing_detail_loads.shared
+
+    responses = []
+    threads = [threading.Thread(target=lambda: responses.append(client.get("/api/listings/1"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [response.status_code for response in responses] == [200] * 8
+    assert len({response.json()["title"] for response in responses}) == 1
+    assert loads == [1]
+    assert listing_detail_loads.shared == shared + 7
+
+
+def test_writes_invalidate_the_cached_listing(db):
+    client.get("/api/listings/1")
+    crud.create_listing_image(db, 1, "static/images/listings/a.jpg", "static/images/listings/a_thumb.jpg")
+    assert listing_detail_cache.get(1) is None
+    assert len(client.get("/api/listings/1").json()["images"]) == 1
+
+    crud.update_listing_status(db, 1, "rejected", admin_notes="Blurry photo")
+    assert listing_detail_cache.get(1) is None
+    assert client.get("/api/listings/1").status_code == 404
+
+
+def test_listings_only_the_owner_sees_are_never_cached(db):
+    as_seller(db)
+    assert client.get("/api/listings/2").json()["title"] == "Desk"
+    client.get("/api/listings/1")
+    crud.update_listing(db, 1, seller_id=1, update_data={"title": "Desk lamp"}) # Back to moderation
+    assert client.get("/api/listings/1").json()["title"] == "Desk lamp"
+    assert listing_detail_cache.get(1) is None and listing_detail_cache.get(2) is None
@@ -0,0 +1,116 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from application.app import app
+from application.database import models
+from application.hyperloglog import HyperLogLog
+from application.security import get_current_active_user, get_current_active_user_optional
+from application import trending
+from application.trending import trending_recorder
+
+from conftest import engine
+
+
+HOUR = 480000
+
+
+@pytest.fixture
+def db(api_db, monkeypatch):
+    monkeypatch.setattr(trending_recorder, "flush_interval", 3600) # Only explicit flushes
+    monkeypatch.setattr(trending, "current_hour", lambda: HOUR)
+    api_db.add_all([models.User(username=name, email=f"{name}@sfsu.edu", hashed_password="x") for name in ("seller", "ann", "bob")])
+    api_db.add(models.Category(name="Books"))
+    api_db.commit()
+    for title in ("Lamp", "Desk"):
+        api_db.add(models.Listing(seller_id=1, category_id=1, title=title, description=title, item_condition="good", price=5, status="approved"))
+    api_db.add(models.Listing(seller_id=2, category_id=1, title="Chair", description="Chair", item_condition="good", price=5, status="approved"))
+    api_db.commit()
+    yield api_db
+
+
+client = TestClient(app)
+
+
+def view(db, listing_id, user_id=None, agent="test"):
+    user = db.get(models.User, user_id) if user_id else None
+    app.dependency_overrides[get_current_active_user_optional] = lambda: user
+    assert client.get(f"/api/listings/{listing_id}", headers={"User-Agent": agent}).status_code == 200
+
+
+def seller_stats(db, user_id=1):
+    seller = db.get(models.User, user_id)
+    app.dependency_overrides[get_current_active_user] = lambda: seller
+    response = client.get("/api/listings/my-listings/stats")
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_hyperloglog_estimates_distinct_items():
+    sketch = HyperLogLog()
+    sketch.update(f"u:{i}" for i in range(20000))
+    sketch.update(f"u:{i}" for i in range(5000)) # Seen again
+    assert abs(sketch.count() - 20000) < 20000 * 0.1
+
+    few = HyperLogLog()
+    few.update(["u:1", "u:2", "u:3", "u:2"])
+    assert few.count() == 3
+    assert len(few.to_bytes()) < 64 # 1 KiB of registers, mostly zeros
+    assert HyperLogLog.from_bytes(few.to_bytes()).registers == few.registers
+
+    other = HyperLogLog()
+    other.update(["u:3", "u:4"])
+    assert HyperLogLog.union([few, other]).count() == 4
+    assert HyperLogLog.union([]).count() == 0
+    few.merge(other)
+    assert few.count() == 4
+
+
+def test_stats_count_views_and_unique_viewers_per_listing_and_in_total(db):
+    for user_id in (2, 3, 2, 3):
+        view(db, 1, user_id)
+    view(db, 1, agent="phone")
+    view(db, 2, 2)
+    view(db, 2, agent="phone") # Same anonymous client as above
+    view(db, 2, agent="laptop")
+    view(db, 1, 1) # The seller's own views don't count
+    view(db, 3, 2) # Another seller's listing
+    trending_recorder.flush()
+
+    stats = seller_stats(db)
+    assert stats["listing_count"] == 2
+    assert [(listing["title"], listing["views_24h"], listing["unique_viewers"]) for listing in stats["listings"]] == [
+        ("Lamp", 5, 3), ("Desk", 3, 3),
+    ]
+    assert (stats["views_24h"], stats["views_7d"], stats["views_30d"]) == (8, 8, 8)
+    assert stats["unique_viewers"] == 4 # ann, bob, the phone and the laptop
+
+
+def test_daily_rollups_outlive_the_hourly_buckets(db, monkeypatch):
+    monkeypatch.setattr(trending, "current_hour", lambda: HOUR - 24 * 10)
+    view(db, 1, 2)
+    trending_recorder.flush()
+    monkeypatch.setattr(trending, "current_hour", lambda: HOUR)
+    view(db, 1, 3)
+    trending_recorder.flush() # Prunes the hourly bucket of ten days ago
+    db.expire_all()
+    assert db.query(models.ListingActivity).count() == 1
+
+    lamp = seller_stats(db)["listings"][0]
+    assert (lamp["views_24h"], lamp["views_7d"], lamp["views_30d"], lamp["unique_viewers"]) == (1, 1, 2, 2)
+
+
+def test_stats_are_read_in_one_query(db):
+    view(db, 1, 2)
+    view(db, 2, 3)
+    trending_recorder.flush()
+    seller = db.get(models.User, 1) # Loaded (and held) now, so only the endpoint's queries are counted
+    statements = []
+    listener = lambda conn, cursor, statement, parameters, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        stats = seller_stats(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert stats["unique_viewers"] == 2
+    assert len(statements) == 1
@@ -0,0 +1,75 @@
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from application.app import app
+from application.database import models
+from application.view_counter import ViewCounter, view_counter
+
+from conftest import engine
+
+
+@pytest.fixture
+def db(api_db, monkeypatch):
+    monkeypatch.setattr(view_counter, "flush_interval", 3600) # Only explicit flushes
+    seller = models.User(username="seller", email="seller@sfsu.edu", hashed_password="x")
+    api_db.add_all([seller, models.Category(name="Books")])
+    api_db.commit()
+    api_db.add(models.Listing(seller_id=seller.user_id, category_id=1, title="Lamp", description="A lamp",
+                              item_condition="good", price=5, status="approved", views_count=10))
+    api_db.commit()
+    yield api_db
+
+
+def stored_views(db):
+    db.expire_all()
+    return db.get(models.Listing, 1).views_count
+
+
+def test_views_are_buffered_and_flushed_in_one_update(db):
+    client = TestClient(app)
+    statements = []
+    listener = lambda conn, cursor, statement, parameters, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        assert [client.get("/api/listings/1").json()["views_count"] for _ in range(3)] == [11, 12, 13]
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert not [statement for statement in statements if statement.lstrip().upper().startswith("UPDATE")]
+    assert stored_views(db) == 10
+
+    assert view_counter.flush() == 1
+    assert stored_views(db) == 13
+    assert client.get("/api/listings/1").json()["views_count"] == 14
+
+
+def test_write_through_when_the_interval_is_zero(db, monkeypatch):
+    monkeypatch.setattr(view_counter, "flush_interval", 0)
+    TestClient(app).get("/api/listings/1")
+    assert stored_views(db) == 11
+
+
+def test_shutdown_flushes_pending_views(db, monkeypatch):
+    monkeypatch.setattr(view_counter, "flush_interval", 60)
+    with TestClient(app) as client: # Runs the lifespan: starts the flusher, flushes on exit
+        client.get("/api/listings/1")
+        client.get("/api/listings/1")
+        assert stored_views(db) == 10
+    assert stored_views(db) == 12
+
+
+def test_concurrent_views_are_not_lost(db):
+    counter = ViewCounter(flush_interval=0.01)
+    counter.start()
+    def view():
+        for _ in range(200):
+            counter.record(engine, 1)
+    threads = [threading.Thread(target=view) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.stop()
+    assert stored_views(db) == 10 + 8 * 200
+    assert counter.stats()["pending_views"] == 0
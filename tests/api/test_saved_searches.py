@@ -0,0 +1,145 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from application.app import app
+from application.database import crud, models
+from application.schemas import ListingCreate
+from application.security import get_current_active_user
+
+from conftest import engine
+
+
+@pytest.fixture
+def db(api_db):
+    buyer = models.User(username="buyer", email="buyer@sfsu.edu", hashed_password="x")
+    seller = models.User(username="seller", email="seller@sfsu.edu", hashed_password="x")
+    books = models.Category(name="Books")
+    api_db.add_all([buyer, seller, books])
+    api_db.commit()
+    api_db.add(models.Category(name="Textbooks", parent_id=books.category_id))
+    api_db.commit()
+    app.dependency_overrides[get_current_active_user] = lambda: api_db.get(models.User, buyer.user_id)
+    yield api_db
+
+
+client = TestClient(app)
+
+
+def post_and_approve(db, title, category_id=1, price=10, approve=True):
+    listing = crud.create_listing(db, ListingCreate(
+        title=title, description="Used for one semester", category_id=category_id, item_condition="good", price=price,
+    ), seller_id=2)
+    return crud.update_listing_status(db, listing.listing_id, "approved") if approve else listing
+
+
+def save(**search):
+    response = client.post("/api/saved-searches", json={"name": "search", **search})
+    assert response.status_code == 201
+    return response.json()["saved_search_id"]
+
+
+def new_counts():
+    return {saved["saved_search_id"]: saved["new_match_count"] for saved in client.get("/api/saved-searches").json()}
+
+
+def test_approved_listings_are_counted_for_matching_saved_searches(db):
+    calculus = save(query="Calculus textbook")
+    cheap_books = save(category_id=1, include_descendants=True, max_price=15)
+    only_books = save(category_id=1) # Not its subcategories
+    everything = save()
+    post_and_approve(db, "Calculus textbook, 3rd edition", category_id=2, price=12)
+    post_and_approve(db, "Calculus workbook", category_id=1, price=40)
+    post_and_approve(db, "Pending calculus textbook", approve=False)
+    assert new_counts() == {calculus: 1, cheap_books: 1, only_books: 1, everything: 2}
+
+    check = client.post(f"/api/saved-searches/{calculus}/check").json()
+    assert check["new_match_count"] == 1
+    assert [hit["title"] for hit in check["results"]] == ["Calculus textbook, 3rd edition"]
+    assert new_counts()[calculus] == 0 # Seen
+
+    listing = db.query(models.Listing).filter_by(title="Calculus workbook").one()
+    crud.update_listing(db, listing.listing_id, 2, {"title": "Calculus textbook bundle"})
+    crud.update_listing_status(db, listing.listing_id, "approved")
+    assert new_counts()[calculus] == 1
+    crud.update_listing_status(db, listing.listing_id, "approved") # Matched once only
+    assert new_counts()[calculus] == 1
+
+    crud.delete_listing(db, listing.listing_id, 2)
+    assert new_counts() == {calculus: 0, cheap_books: 1, only_books: 0, everything: 1}
+
+
+def test_matching_is_one_lookup_over_the_saved_search_keys(db):
+    for i in range(crud.MAX_SAVED_SEARCHES_PER_USER):
+        save(query=f"subject{i} notes")
+    listing = post_and_approve(db, "Desk lamp", approve=False)
+    statements = []
+    listener = lambda conn, cursor, statement, parameters, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        assert crud.match_saved_searches(db, listing) == 0
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert len(statements) == 2 # The listing's category ancestors, then the saved searches it matches
+    assert "saved_search_keys" in statements[1] and "GROUP BY" in statements[1]
+
+
+def test_saved_searches_belong_to_their_user(db):
+    saved_search_id = save(query="lamp")
+    assert client.post("/api/saved-searches", json={"name": "bad", "query": "drop table;"}).status_code == 422
+    app.dependency_overrides[get_current_active_user] = lambda: db.get(models.User, 2)
+    assert client.get("/api/saved-searches").json() == []
+    assert client.post(f"/api/saved-searches/{saved_search_id}/check").status_code == 404
+    assert client.delete(f"/api/saved-searches/{saved_search_id}").status_code == 404
+    app.dependency_overrides[get_current_active_user] = lambda: db.get(models.User, 1)
+    assert client.delete(f"/api/saved-searches/{saved_search_id}").status_code == 204
+    assert client.get("/api/saved-searches").json() == []
+
+
+def test_saved_search_limit(db, monkeypatch):
+    monkeypatch.setattr(crud, "MAX_SAVED_SEARCHES_PER_USER", 1)
+    save(query="lamp")
+    response = client.post("/api/saved-searches", json={"name": "second"})
+    assert response.status_code == 400
+
+
+def test_a_match_added_during_a_check_stays_new(db):
+    calculus = save(query="Calculus textbook")
+    post_and_approve(db, "Calculus textbook, 3rd edition")
+    late = post_and_approve(db, "Calculus textbook, 4th edition", approve=False)
+    late.status = "approved" # Approved without matching yet; its match arrives during the check below
+    db.commit()
+    late_id = late.listing_id
+
+    read, added = [], []
+    def add_match(conn, cursor, statement, parameters, *args):
+        if not read:
+            if "saved_search_matches" in statement and "ORDER BY" in statement:
+                read.append(statement)
+        elif not added: # The statement after the matches were read
+            added.append(late_id)
+            matches = models.SavedSearchMatch.__table__
+            conn.execute(matches.insert().values(saved_search_id=calculus, listing_id=late_id))
+    event.listen(engine, "after_cursor_execute", add_match)
+    try:
+        check = client.post(f"/api/saved-searches/{calculus}/check").json()
+    finally:
+        event.remove(engine, "after_cursor_execute", add_match)
+    assert [hit["title"] for hit in check["results"]] == ["Calculus textbook, 3rd edition"]
+    assert new_counts()[calculus] == 1 # The 4th edition, inserted after the matches were read
+
+
+def test_matches_past_the_limit_come_with_the_next_check(db):
+    calculus = save(query="Calculus textbook")
+    for edition in ("1st", "2nd", "3rd"):
+        post_and_approve(db, f"Calculus textbook, {edition} edition")
+
+    check = client.post(f"/api/saved-searches/{calculus}/check?limit=2").json()
+    assert check["new_match_count"] == 3
+    assert [hit["title"] for hit in check["results"]] == ["Calculus textbook, 2nd edition", "Calculus textbook, 1st edition"]
+    assert new_counts()[calculus] == 1
+
+    check = client.post(f"/api/saved-searches/{calculus}/check?limit=2").json()
+    assert check["new_match_count"] == 1
+    assert [hit["title"] for hit in check["results"]] == ["Calculus textbook, 3rd edition"]
+    assert new_counts()[calculus] == 0
@@ -0,0 +1,58 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from application.app import app
+from application.database import models
+from application.router.search import search_results_cache
+
+
+@pytest.fixture
+def db(api_db):
+    search_results_cache.clear()
+    seller = models.User(username="seller", email="seller@sfsu.edu", hashed_password="x")
+    books, tutoring = models.Category(name="Books"), models.Category(name="Tutoring", is_skill_category=True)
+    api_db.add_all([seller, books, tutoring])
+    api_db.commit()
+    for i in range(6):
+        skill = i % 3 == 0
+        api_db.add(models.Listing(seller_id=seller.user_id, category_id=(tutoring if skill else books).category_id,
+                                  title=f"Chemistry {'tutoring' if skill else 'notes'} {i}", description="for sale",
+                                  item_condition="good", price=None if skill else 5 + i, rate=20 if skill else None,
+                                  is_skill_sharing=skill, status="approved"))
+    api_db.commit()
+    yield api_db
+
+
+client = TestClient(app)
+
+HOMEPAGE = [
+    {"sort": "newest", "is_skill_sharing": False, "page_size": 3, "view": "compact"},
+    {"sort": "newest", "is_skill_sharing": True, "page_size": 3, "view": "compact"},
+    {"category_id": 1, "page_size": 3},
+    {"q": "chemistry", "facets": "category"},
+]
+
+
+def test_batch_returns_what_single_searches_return(db):
+    response = client.post("/api/search/batch", json={"searches": HOMEPAGE})
+    assert response.status_code == 200
+    batch = response.json()["results"]
+    search_results_cache.clear()
+    assert batch == [client.get("/api/search", params=spec).json() for spec in HOMEPAGE]
+    assert [hit["listing_id"] for hit in batch[1]["results"]] == [4, 1]
+
+
+def test_batch_reuses_cached_results(db):
+    client.get("/api/search", params=HOMEPAGE[0])
+    hits = search_results_cache.hits
+    response = client.post("/api/search/batch", json={"searches": [HOMEPAGE[0], HOMEPAGE[2], HOMEPAGE[2]]})
+    assert response.status_code == 200
+    assert search_results_cache.hits == hits + 2 # The earlier single search and the repeated entry
+
+
+def test_invalid_entry_fails_the_batch_with_its_position(db):
+    response = client.post("/api/search/batch", json={"searches": [HOMEPAGE[0], {"sort": "cheapest"}]})
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("searches[1]:")
+    assert client.post("/api/search/batch", json={"searches": []}).status_code == 422
+    assert client.post("/api/search/batch", json={"searches": [{"q": "drop table;"}]}).status_code == 422
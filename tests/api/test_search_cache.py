@@ -0,0 +1,102 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from application.app import app
+from application.database import crud, models
+from application.router import search as search_router
+from application.router.search import search_results_cache
+from application.schemas import ListingCreate
+from application.view_counter import view_counter
+
+from conftest import engine
+
+
+@pytest.fixture
+def db(api_db):
+    search_results_cache.clear()
+    api_db.add_all([
+        models.User(username="seller", email="seller@sfsu.edu", hashed_password="x"),
+        models.Category(name="Books"),
+    ])
+    api_db.commit()
+    yield api_db
+
+
+client = TestClient(app)
+
+
+def create_approved_listing(db, title):
+    listing = crud.create_listing(
+        db,
+        ListingCreate(title=title, description="A listing", category_id=1, item_condition="good", price=10),
+        seller_id=1,
+    )
+    return crud.update_listing_status(db, listing.listing_id, "approved")
+
+
+def test_repeated_searches_are_served_from_cache(db):
+    create_approved_listing(db, "Chemistry notes")
+    stats_before = search_results_cache.stats()
+    first = client.get("/api/search", params={"q": "Chemistry"}).json()
+    second = client.get("/api/search", params={"q": " Chemistry  "}).json() # Normalizes to the same query and key
+    assert first == second and first["total"] == 1
+    stats_after = search_results_cache.stats()
+    assert stats_after["hits"] == stats_before["hits"] + 1
+    assert stats_after["misses"] == stats_before["misses"] + 1
+
+
+def test_differently_spelled_queries_do_not_share_an_entry(db):
+    create_approved_listing(db, "Chemistry notes")
+    create_approved_listing(db, "Organic chemistry")
+    queries = ["Chemistry notes", "chemistry notes", "Chemistry  notes ", "Chemistry"]
+    cached = [client.get("/api/search", params={"q": q}).json() for q in queries]
+    # Only the third normalizes to an earlier query; every answer is what the query gets uncached
+    assert search_results_cache.stats()["size"] == 3
+    for q, result in zip(queries, cached):
+        search_results_cache.clear()
+        assert client.get("/api/search", params={"q": q}).json() == result
+    assert cached[0]["total"] == 1 and cached[3]["total"] == 2
+
+
+def test_listing_writes_invalidate_cached_results(db):
+    create_approved_listing(db, "Chemistry notes")
+    assert client.get("/api/search", params={"q": "chemistry"}).json()["total"] == 1
+
+    second = create_approved_listing(db, "Organic chemistry kit")
+    assert client.get("/api/search", params={"q": "chemistry"}).json()["total"] == 2
+
+    crud.update_listing_status(db, second.listing_id, "rejected", admin_notes="Duplicate")
+    assert client.get("/api/search", params={"q": "chemistry"}).json()["total"] == 1
+
+    crud.delete_listing(db, listing_id=second.listing_id, seller_id=1)
+    crud.update_listing(db, listing_id=1, seller_id=1, update_data={"title": "Physics notes"})
+    # The renamed listing no longer matches (and went back to moderation)
+    assert client.get("/api/search", params={"q": "chemistry"}).json()["total"] == 0
+
+
+def test_broad_search_totals_stop_at_the_count_limit(db, monkeypatch):
+    for i in range(3):
+        create_approved_listing(db, f"Chemistry set {i}")
+    monkeypatch.setattr(search_router, "SEARCH_COUNT_LIMIT", 2)
+    capped = client.get("/api/search", params={"q": "chemistry"}).json()
+    assert (capped["total"], capped["total_exact"]) == (2, False)
+    exact = client.get("/api/search", params={"q": "chemistry", "exact_total": True}).json()
+    assert exact["total_exact"] and exact["total"] > 2
+
+    page = client.get("/api/search", params={"q": "chemistry", "page_size": 1}).json()
+    assert (page["total"], page["total_exact"]) == (2, False)
+    following = client.get("/api/search", params={"q": "chemistry", "page_size": 1, "cursor": page["next_cursor"], "exact_total": True}).json()
+    assert (following["total"], following["total_exact"]) == (3, True)
+
+
+def test_cached_results_carry_current_view_counts(db):
+    listing_id = create_approved_listing(db, "Chemistry notes").listing_id
+    hits_before = search_results_cache.stats()["hits"]
+    assert client.get("/api/search", params={"q": "chemistry"}).json()["results"][0]["views_count"] == 0
+    view_counter.record(engine, listing_id)
+    view_counter.record(engine, listing_id)
+    assert client.get("/api/search", params={"q": "chemistry"}).json()["results"][0]["views_count"] == 2 # Still buffered
+    view_counter.flush() # Bumps no table version, so the cached entry stays
+    cached = client.get("/api/search", params={"q": "chemistry"}).json()
+    assert cached["results"][0]["views_count"] == 2
+    assert search_results_cache.stats()["hits"] == hits_before + 2
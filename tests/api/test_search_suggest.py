@@ -0,0 +1,90 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from application.app import app
+from application.database import crud, models
+from application import search_engine
+from application.schemas import CategoryCreate
+
+from conftest import engine, start_search_backend
+
+
+@pytest.fixture
+def db(api_db, search_backend):
+    seller = models.User(username="seller", email="seller@sfsu.edu", hashed_password="x")
+    books = models.Category(name="Books")
+    api_db.add_all([seller, books, models.Category(name="Calculators")])
+    api_db.commit()
+    for title, keywords, status in [
+        ("Calculus Textbook", "math, calculus", "approved"),
+        ("Calculus Textbook", None, "approved"),
+        ("Calculator TI-84", "graphing calculator", "approved"),
+        ("Calculus notes", None, "pending_approval"),
+        ("Desk lamp", None, "approved"),
+    ]:
+        api_db.add(models.Listing(seller_id=seller.user_id, category_id=books.category_id, title=title,
+                                  description="for sale", search_keywords=keywords, item_condition="good",
+                                  price=10, status=status))
+    api_db.commit()
+    start_search_backend(search_backend)
+    yield api_db
+
+
+client = TestClient(app)
+
+
+def suggest(prefix, **params):
+    response = client.get("/api/search/suggest", params={"prefix": prefix, **params})
+    assert response.status_code == 200
+    return response.json()["suggestions"]
+
+
+def test_suggestions_complete_titles_and_categories(db):
+    suggestions = suggest("calc")
+    assert "Calculus Textbook" in suggestions
+    assert "Calculator TI-84" in suggestions
+    assert "Calculators" in suggestions
+    assert "Calculus notes" not in suggestions # Not approved
+    assert suggestions.count("Calculus Textbook") == 1
+    assert suggest("CALC", limit=1) == suggestions[:1]
+    assert suggest("zzz") == []
+
+
+def test_suggestions_cover_keywords_and_later_words(db):
+    assert "Calculus Textbook" in suggest("textb")
+    assert "graphing calculator" in suggest("graph")
+    # Used by two listings, so it ranks above single-use phrases
+    assert suggest("calculus")[0] == "Calculus Textbook"
+
+
+def test_suggestions_follow_writes(db):
+    seller = db.query(models.User).first()
+    listing = models.Listing(seller_id=seller.user_id, category_id=1, title="Calculus tutoring",
+                             description="weekly", item_condition="good", price=20, status="pending_approval")
+    db.add(listing)
+    db.commit()
+    assert "Calculus tutoring" not in suggest("calc")
+    crud.update_listing_status(db, listing.listing_id, "approved")
+    crud.create_category(db, CategoryCreate(name="Calculus help"))
+    assert {"Calculus tutoring", "Calculus help"} <= set(suggest("calc"))
+    crud.delete_listing(db, listing.listing_id, seller.user_id)
+    assert "Calculus tutoring" not in suggest("calc")
+
+
+def test_database_suggestions_rank_like_the_prefix_index(db):
+    prefixes = ["c", "ca", "calc", "calcu", "calculus", "calculus t", "t", "ti 8", "g", "graphing c", "m", "d", "lamp"]
+    search_engine.build_search_engine(engine)
+    expected = {prefix: crud.get_search_suggestions(db, prefix, 20) for prefix in prefixes}
+    search_engine.listing_engine.clear()
+    assert {prefix: crud.get_search_suggestions(db, prefix, 20) for prefix in prefixes} == expected
+
+    db.get(models.Category, 2).name = "Graphing calculators" # Renames and deactivations follow through the mapper events
+    db.get(models.Category, 1).is_active = False
+    db.commit()
+    assert "Graphing calculators" in suggest("graph") and "Calculators" not in suggest("calc")
+    assert "Books" not in suggest("b")
+    maintained = db.execute(select(models.SearchSuggestion.__table__)).all()
+    with engine.begin() as connection:
+        models.rebuild_search_suggestions(connection)
+    assert sorted(db.execute(select(models.SearchSuggestion.__table__)).all()) == sorted(maintained)
@@ -0,0 +1,179 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from application.app import app
+from application.database import crud, models
+from application.security import get_current_active_user
+from application import trending
+from application.trending import trending_recorder
+
+from conftest import engine
+
+
+HOUR = 480000
+
+
+@pytest.fixture
+def db(api_db, monkeypatch):
+    monkeypatch.setattr(trending_recorder, "flush_interval", 3600) # Only explicit flushes
+    monkeypatch.setattr(trending, "current_hour", lambda: HOUR)
+    seller = models.User(username="seller", email="seller@sfsu.edu", hashed_password="x")
+    buyer = models.User(username="buyer", email="buyer@sfsu.edu", hashed_password="x")
+    books = models.Category(name="Books")
+    api_db.add_all([seller, buyer, books])
+    api_db.commit()
+    api_db.add(models.Category(name="Textbooks", parent_id=books.category_id))
+    api_db.add(models.Category(name="Furniture"))
+    api_db.commit()
+    for title, category_id in [("Novel", 1), ("Calculus", 2), ("Desk", 3)]:
+        api_db.add(models.Listing(seller_id=seller.user_id, category_id=category_id, title=title, description=title,
+                                  item_condition="good", price=5, status="approved"))
+    api_db.commit()
+    yield api_db
+
+
+client = TestClient(app)
+
+
+def record(listing_id, views=0, conversations=0):
+    for _ in range(views):
+        trending_recorder.record_view(engine, listing_id)
+    for _ in range(conversations):
+        trending_recorder.record_conversation(engine, listing_id)
+
+
+def trending_ids(**params):
+    response = client.get("/api/listings/trending", params=params)
+    assert response.status_code == 200
+    return [(hit["title"], hit["trending_score"]) for hit in response.json()]
+
+
+def stored_rows(db):
+    rows = db.execute(select(models.TrendingListing.category_id, models.TrendingListing.listing_id)).all()
+    return sorted(rows)
+
+
+def test_views_and_conversations_rank_listings_per_category(db):
+    record(1, views=3)
+    record(2, conversations=1)
+    record(3, views=12)
+    assert trending_ids() == []
+    trending_recorder.flush()
+
+    assert trending_ids() == [("Desk", 12.0), ("Calculus", 10.0), ("Novel", 3.0)]
+    assert trending_ids(category_id=1) == [("Calculus", 10.0), ("Novel", 3.0)] # Textbooks is under Books
+    assert trending_ids(category_id=2) == [("Calculus", 10.0)]
+    assert trending_ids(limit=1) == [("Desk", 12.0)]
+    assert db.execute(select(models.ListingActivity.listing_id, models.ListingActivity.hour, models.ListingActivity.views,
+                             models.ListingActivity.conversations).order_by(models.ListingActivity.listing_id)).all() == [
+        (1, HOUR, 3, 0), (2, HOUR, 0, 1), (3, HOUR, 12, 0),
+    ]
+
+
+def test_scores_decay_with_age(db, monkeypatch):
+    monkeypatch.setattr(trending, "current_hour", lambda: HOUR - 48)
+    record(1, views=8)
+    trending_recorder.flush()
+    monkeypatch.setattr(trending, "current_hour", lambda: HOUR)
+    assert trending_ids() == [("Novel", 2.0)] # Two half-lives later
+    record(3, views=3)
+    trending_recorder.flush()
+    assert trending_ids() == [("Desk", 3.0), ("Novel", 2.0)]
+    record(1, views=2)
+    trending_recorder.flush()
+    assert trending_ids() == [("Novel", 4.0), ("Desk", 3.0)]
+
+
+def test_only_top_k_are_stored_and_new_activity_enters_incrementally(db, monkeypatch):
+    monkeypatch.setattr(trending, "TRENDING_TOP_K", 2)
+    monkeypatch.setattr(trending, "TRENDING_SPARE", 0)
+    record(1, views=5)
+    record(2, views=4)
+    record(3, views=1)
+    trending_recorder.flush()
+    assert [title for title, _ in trending_ids()] == ["Novel", "Calculus"]
+
+    record(3, views=9)
+    trending_recorder.flush()
+    assert [title for title, _ in trending_ids()] == ["Desk", "Novel"]
+    assert [row for row in stored_rows(db) if row[0] == trending.ALL_CATEGORIES] == [(0, 1), (0, 3)]
+
+
+def test_unapproved_and_deleted_listings_leave_the_rankings(db, monkeypatch):
+    monkeypatch.setattr(trending, "TRENDING_TOP_K", 2)
+    monkeypatch.setattr(trending, "TRENDING_SPARE", 0)
+    record(1, views=5)
+    record(2, views=4)
+    record(3, views=1)
+    trending_recorder.flush()
+
+    crud.update_listing_status(db, 1, "rejected", "Off-topic")
+    assert trending_ids() == [("Calculus", 4.0), ("Desk", 1.0)] # Refilled from the activity buckets
+    assert trending_ids(category_id=1) == [("Calculus", 4.0)]
+
+    crud.update_listing_status(db, 1, "approved")
+    assert trending_ids() == [("Novel", 5.0), ("Calculus", 4.0)]
+
+    assert crud.delete_listing(db, 1, seller_id=1)
+    assert trending_ids() == [("Calculus", 4.0), ("Desk", 1.0)]
+    assert db.query(models.ListingActivity).filter(models.ListingActivity.listing_id == 1).count() == 0
+
+
+def test_runners_up_replace_a_leaving_listing_without_a_refill(db, monkeypatch):
+    monkeypatch.setattr(trending, "TRENDING_TOP_K", 1)
+    monkeypatch.setattr(trending, "TRENDING_SPARE", 1)
+    record(1, views=5)
+    record(2, views=4)
+    record(3, views=1)
+    trending_recorder.flush()
+    assert [row for row in stored_rows(db) if row[0] == trending.ALL_CATEGORIES] == [(0, 1), (0, 2)]
+
+    rebuilds = []
+    rebuild_trending = trending.rebuild_trending
+    monkeypatch.setattr(trending, "rebuild_trending", lambda connection, hour, category_ids=None: rebuilds.append(category_ids) or rebuild_trending(connection, hour, category_ids))
+    crud.update_listing_status(db, 1, "rejected", "Off-topic")
+    assert trending_ids() == [("Calculus", 4.0)] # The runner-up moved up
+    assert trending_ids(category_id=1) == [("Calculus", 4.0)]
+    assert rebuilds == [] # Every ranking it left still has its top-K
+    crud.update_listing_status(db, 2, "rejected", "Off-topic")
+    assert trending_ids() == [("Desk", 1.0)]
+    assert rebuilds == [[trending.ALL_CATEGORIES], [1], [2]] # Emptied: each ranking is refilled on its own
+
+
+def test_ranking_changes_roll_back_with_the_listing_write(db):
+    record(1, views=5)
+    trending_recorder.flush()
+    db.get(models.Listing, 1).status = "rejected"
+    trending.follow_listing(db, 1)
+    assert stored_rows(db) == []
+    db.rollback()
+    assert stored_rows(db) == [(0, 1), (1, 1)]
+
+
+def test_detail_views_and_new_conversations_are_recorded(db):
+    buyer = db.get(models.User, 2)
+    app.dependency_overrides[get_current_active_user] = lambda: buyer
+    assert client.get("/api/listings/3").status_code == 200
+    for _ in range(2): # The second message goes to the existing conversation
+        response = client.post("/api/messages/initiate_conversation", json={"recipient_id": 1, "listing_id": 2, "initial_message": "Hi"})
+        assert response.status_code == 201
+    trending_recorder.flush()
+    assert trending_ids() == [("Calculus", 10.0), ("Desk", 1.0)]
+
+
+def test_ensure_trending_rebuilds_rankings_and_prunes_old_buckets(db, monkeypatch):
+    monkeypatch.setattr(trending, "current_hour", lambda: HOUR - trending.TRENDING_WINDOW_HOURS)
+    record(2, views=100)
+    trending_recorder.flush()
+    monkeypatch.setattr(trending, "current_hour", lambda: HOUR)
+    record(1, views=2)
+    record(3, views=1)
+    trending_recorder.flush()
+    rows = stored_rows(db)
+
+    db.query(models.TrendingListing).delete()
+    db.commit()
+    assert trending.ensure_trending(engine) == len(rows) - 3 # Calculus ranked in all, Books and Textbooks, but its views are out of the window
+    assert stored_rows(db) == [row for row in rows if row[1] != 2]
+    assert db.query(models.ListingActivity).filter(models.ListingActivity.listing_id == 2).count() == 0
@@ -0,0 +1,62 @@
+"""
+Benchmark: full responses vs 304 Not Modified revalidations of a client holding an ETag.
+
+For a listing, a search page and the category list, reports SQL statements and latency of a plain
+GET and of a GET with If-None-Match. Searches run with a cold result cache (cleared before every
+request), like the first request after a listing change.
+
+    python tests/benchmarks/bench_conditional_get.py [listing_count]
+"""
+import logging
+import sys
+
+from common import make_engine, seed_listings, count_statements, timed, serve_app_from
+
+from fastapi.testclient import TestClient
+from application.app import app
+from application.database.database import get_db
+from application.database import models
+from application.router import search as search_router
+from application.view_counter import view_counter
+
+REQUESTS = [
+    ("listing", "/api/listings/1", {}),
+    ("search", "/api/search", {"q": "lamp", "page_size": 20}),
+    ("categories", "/api/categories", {}),
+]
+logging.disable(logging.INFO)
+
+
+def main(listing_count: int):
+    engine, SessionLocal = make_engine()
+    seed_listings(SessionLocal, listing_count)
+    models.ensure_table_versions(engine)
+    with SessionLocal() as db:
+        db.get(models.Listing, 1).status = "approved"
+        db.commit()
+
+    serve_app_from(SessionLocal)
+    view_counter.flush_interval = 3600 # Keep view writes out of the timings
+    client = TestClient(app)
+
+    print(f"Conditional GET over {listing_count} listings (SQLite in-memory)\n")
+    print(f"{'endpoint':<12} {'200 queries':>12} {'200 ms':>8} {'304 queries':>12} {'304 ms':>8}")
+    for name, url, params in REQUESTS:
+        etag = client.get(url, params=params).headers["ETag"]
+        def full():
+            search_router.search_results_cache.clear()
+            assert client.get(url, params=params).status_code == 200
+        def revalidate():
+            search_router.search_results_cache.clear()
+            assert client.get(url, params=params, headers={"If-None-Match": etag}).status_code == 304
+        with count_statements(engine) as full_statements:
+            full()
+        with count_statements(engine) as revalidate_statements:
+            revalidate()
+        print(f"{name:<12} {len(full_statements):>12} {timed(full, 50):>8.2f} {len(revalidate_statements):>12} {timed(revalidate, 50):>8.2f}")
+    view_counter.flush()
+    app.dependency_overrides.pop(get_db, None)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
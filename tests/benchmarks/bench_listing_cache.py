@@ -0,0 +1,79 @@
+"""
+Benchmark: a burst of concurrent GET /api/listings/{id} for one listing (a link shared in a group chat).
+
+Each round sends REQUESTS requests from THREADS threads and reports how many times the listing was
+loaded (joinedload of seller and images plus serialization) and the mean latency, with
+- no cache and no coalescing: every request loads the listing, as before the listing detail cache;
+- single-flight only (cache disabled): concurrent misses share one load;
+- the listing detail cache: the first miss loads, everything after is served from memory.
+
+    python tests/benchmarks/bench_listing_cache.py [listing_count]
+"""
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import make_engine, seed_listings, serve_app_from
+
+from fastapi.testclient import TestClient
+from application.app import app
+from application.database.database import get_db
+from application.database import crud, models
+from application.router import listings as listings_router
+from application.cache import SingleFlight
+from application.view_counter import view_counter
+
+THREADS = 16
+REQUESTS = 400
+logging.disable(logging.INFO)
+
+
+class NoCoalescing(SingleFlight):
+    def do(self, key, load):
+        return load()
+
+
+def main(listing_count: int):
+    engine, SessionLocal = make_engine()
+    seed_listings(SessionLocal, listing_count)
+    with SessionLocal() as db:
+        db.get(models.Listing, 1).status = "approved"
+        db.commit()
+
+    serve_app_from(SessionLocal)
+    view_counter.flush_interval = 3600 # Keep view writes out of the timings
+    client = TestClient(app)
+
+    loads = []
+    get_listing = crud.get_listing
+    def counted_get_listing(db, listing_id):
+        loads.append(listing_id)
+        return get_listing(db, listing_id)
+    crud.get_listing = counted_get_listing
+
+    cache = listings_router.listing_detail_cache
+    print(f"{REQUESTS} concurrent GETs of one listing from {THREADS} threads ({listing_count} listings, SQLite in-memory)\n")
+    print(f"{'mode':<28} {'loads':>6} {'ms/request':>11}")
+    for name, maxsize, flights in [
+        ("no cache, no coalescing", 0, NoCoalescing()),
+        ("single-flight only", 0, SingleFlight()),
+        ("listing detail cache", 1024, SingleFlight()),
+    ]:
+        cache.clear()
+        cache.maxsize = maxsize
+        listings_router.listing_detail_loads = flights
+        loads.clear()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(THREADS) as pool:
+            statuses = list(pool.map(lambda _: client.get("/api/listings/1").status_code, range(REQUESTS)))
+        elapsed = (time.perf_counter() - started) * 1000 / REQUESTS
+        assert statuses == [200] * REQUESTS
+        print(f"{name:<28} {len(loads):>6} {elapsed:>11.2f}")
+    crud.get_listing = get_listing
+    view_counter.flush()
+    app.dependency_overrides.pop(get_db, None)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,76 @@
+"""
+Benchmark: exporting every listing by paging /api/admin/listings (limit=200) vs one streamed
+/api/admin/listings/export request.
+
+Reports requests, wall time and peak Python memory (tracemalloc) of each way, for a few catalog
+sizes; the export's peak should stay flat as the catalog grows. TestClient collects a streamed body
+before returning it, so the export is read from the chunk generator the endpoint hands to its
+StreamingResponse (the same statement, cursor and encoder) and each chunk is dropped once counted.
+
+    python tests/benchmarks/bench_listing_export.py [listing_count ...]
+"""
+import contextlib
+import io
+import logging
+import sys
+import time
+import tracemalloc
+
+from common import make_engine, seed_listings, serve_app_from
+
+from fastapi.testclient import TestClient
+from application.app import app
+from application.database import crud, models
+from application.router.admin import _ndjson_chunks
+from application.security import get_current_admin_user
+
+PAGE_LIMIT = 200 # The largest page /api/admin/listings allows
+logging.disable(logging.INFO)
+
+
+def measure(fetch):
+    """(result, ms, peak MiB) of one call to fetch."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = fetch()
+    elapsed = (time.perf_counter() - started) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+def main(listing_counts):
+    client = TestClient(app)
+    admin = models.User(user_id=0, username="admin", email="admin@sfsu.edu", hashed_password="x", is_admin=True)
+    app.dependency_overrides[get_current_admin_user] = lambda: admin
+
+    print(f"{'listings':>9} {'method':<16} {'requests':>9} {'rows':>7} {'ms':>9} {'peak MiB':>9}")
+    for listing_count in listing_counts:
+        engine, SessionLocal = make_engine()
+        seed_listings(SessionLocal, listing_count)
+        serve_app_from(SessionLocal)
+
+        def paged():
+            rows, requests = 0, 0
+            while True:
+                with contextlib.redirect_stdout(io.StringIO()): # crud.get_listings prints every call
+                    page = client.get("/api/admin/listings", params={"skip": rows, "limit": PAGE_LIMIT}).json()
+                requests += 1
+                rows += len(page)
+                if len(page) < PAGE_LIMIT:
+                    return requests, rows
+        def exported():
+            with SessionLocal() as db:
+                statement = crud.listing_export_statement(db, status=None)
+            chunks = _ndjson_chunks(crud.stream_listing_export(engine, statement))
+            return 1, sum(chunk.count("\n") for chunk in chunks)
+
+        for name, fetch in [("paged", paged), ("export ndjson", exported)]:
+            (requests, rows), ms, peak = measure(fetch)
+            print(f"{listing_count:>9} {name:<16} {requests:>9} {rows:>7} {ms:>9.0f} {peak:>9.1f}")
+        engine.dispose()
+    app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [2000, 10000])
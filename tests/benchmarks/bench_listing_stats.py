@@ -0,0 +1,96 @@
+"""
+Benchmark: seller analytics storage and accuracy, and /api/listings/my-listings/stats latency.
+
+Records a month of simulated views (a pool of viewers, some much more active than others) of one
+seller's listings through the trending recorder, then reports
+- the size of the rollups and viewer sketches vs a table with one (listing, viewer, time) row per view;
+- the error of the unique viewer estimates against the exact counts;
+- the latency of the stats endpoint.
+
+    python tests/benchmarks/bench_listing_stats.py [listing_count] [views]
+"""
+import logging
+import random
+import sys
+import time
+
+from common import make_engine, serve_app_from
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func
+from application.app import app
+from application.database import models
+from application.security import get_current_active_user
+from application import trending
+from application.trending import TrendingRecorder
+
+DAYS = 30
+VIEWERS = 20000
+REQUESTS = 100
+VIEW_ROW_BYTES = 4 + 4 + 8 + 40 # listing_id, user_id, timestamp and index overhead of a per-view row
+logging.disable(logging.INFO)
+
+
+def main(listing_count: int, views: int):
+    engine, SessionLocal = make_engine()
+    with SessionLocal() as db:
+        seller = models.User(username="seller", email="seller@sfsu.edu", hashed_password="x")
+        db.add_all([seller, models.Category(name="Books")])
+        db.commit()
+        db.add_all([
+            models.Listing(seller_id=seller.user_id, category_id=1, title=f"Listing {i}", description="x",
+                           item_condition="good", price=5, status="approved")
+            for i in range(listing_count)
+        ])
+        db.commit()
+        listing_ids = [row[0] for row in db.query(models.Listing.listing_id)]
+
+    rng = random.Random(648)
+    recorder = TrendingRecorder(flush_interval=3600)
+    clock = {"hour": 480000 - DAYS * 24}
+    trending.current_hour = lambda: clock["hour"]
+    exact = {listing_id: set() for listing_id in listing_ids}
+    started = time.perf_counter()
+    for hour in range(DAYS * 24):
+        clock["hour"] += 1
+        for _ in range(views // (DAYS * 24)):
+            listing_id = rng.choice(listing_ids)
+            viewer = f"u:{int(rng.paretovariate(1.2)) % VIEWERS}" if rng.random() < 0.5 else f"u:{rng.randrange(VIEWERS)}"
+            exact[listing_id].add(viewer)
+            recorder.record_view(engine, listing_id, viewer=viewer)
+        recorder.flush()
+    record_seconds = time.perf_counter() - started
+
+    with SessionLocal() as db:
+        recorded_views = db.query(func.sum(models.ListingDailyActivity.views)).scalar()
+        sketch_bytes = db.query(func.sum(func.length(models.ListingViewerSketch.registers))).scalar()
+        hourly_rows = db.query(models.ListingActivity).count()
+        daily_rows = db.query(models.ListingDailyActivity).count()
+    rollup_bytes = (hourly_rows + daily_rows) * (4 + 4 + 4 + 4)
+    print(f"{listing_count} listings, {recorded_views} views over {DAYS} days ({record_seconds:.1f} s to record and flush)")
+    print(f"  one row per view:           {recorded_views * VIEW_ROW_BYTES / 2**20:8.2f} MiB")
+    print(f"  rollups ({hourly_rows} hourly, {daily_rows} daily rows): {rollup_bytes / 2**20:8.2f} MiB")
+    print(f"  viewer sketches:            {sketch_bytes / 2**20:8.2f} MiB ({sketch_bytes / listing_count:.0f} bytes per listing)")
+
+    current_user = models.User(user_id=1, username="seller", email="seller@sfsu.edu", hashed_password="x")
+    app.dependency_overrides[get_current_active_user] = lambda: current_user
+    serve_app_from(SessionLocal)
+    client = TestClient(app)
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        stats = client.get("/api/listings/my-listings/stats").json()
+    elapsed = (time.perf_counter() - started) * 1000 / REQUESTS
+
+    errors = sorted(
+        abs(listing["unique_viewers"] - len(exact[listing["listing_id"]])) / max(1, len(exact[listing["listing_id"]]))
+        for listing in stats["listings"]
+    )
+    all_viewers = len(set().union(*exact.values()))
+    print(f"  unique viewers per listing: median error {errors[len(errors) // 2]:.1%}, worst {errors[-1]:.1%}")
+    print(f"  unique viewers overall:     {stats['unique_viewers']} estimated, {all_viewers} exact")
+    print(f"  /api/listings/my-listings/stats: {elapsed:.1f} ms/request")
+    app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100, int(sys.argv[2]) if len(sys.argv) > 2 else 200000)
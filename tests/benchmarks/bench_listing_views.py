@@ -0,0 +1,104 @@
+"""
+Load test: listing detail pages with a commit per view (the previous read_listing) vs the
+write-behind view counter (application/view_counter.py).
+
+Uses an SQLite file, so every commit pays for the write lock and a sync as in production. Reports
+- throughput of GET /api/listings/{id} against a copy of the previous endpoint, mounted for the run;
+- views lost when 8 threads view the same listing concurrently, with the previous read-modify-write
+  and with the counter.
+
+    python tests/benchmarks/bench_listing_views.py [requests]
+"""
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from common import seed_listings, serve_app_from
+
+from fastapi import Depends, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from application.app import app
+from application.database.database import Base, get_db
+from application.database import crud, models
+from application.view_counter import ViewCounter
+from application import schemas
+
+THREADS = 8
+logging.disable(logging.INFO)
+
+
+@app.get("/bench/legacy-listings/{listing_id}", response_model=schemas.Listing, include_in_schema=False)
+async def legacy_read_listing(listing_id: int, db: Session = Depends(get_db)):
+    """read_listing before the view counter: a read-modify-write and a commit per view."""
+    db_listing = crud.get_listing(db, listing_id=listing_id)
+    if db_listing is None:
+        raise HTTPException(status_code=404, detail="Listing not found")
+    db_listing.views_count = (db_listing.views_count or 0) + 1
+    db.commit()
+    db.refresh(db_listing)
+    return db_listing
+
+
+def main(requests: int):
+    directory = tempfile.mkdtemp()
+    engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    seed_listings(SessionLocal, 1000)
+    listing_id = SessionLocal().query(models.Listing.listing_id).filter(models.Listing.status == "approved").first()[0]
+
+    serve_app_from(SessionLocal)
+
+    print(f"Detail page throughput, {requests} sequential requests (SQLite file)")
+    with TestClient(app) as client: # Runs the lifespan, so the counter flushes in the background
+        for name, path in [("commit per view", f"/bench/legacy-listings/{listing_id}"), ("write-behind", f"/api/listings/{listing_id}")]:
+            started = time.perf_counter()
+            for _ in range(requests):
+                assert client.get(path).status_code == 200
+            elapsed = time.perf_counter() - started
+            print(f"  {name:<18} {requests / elapsed:>8.0f} req/s {elapsed * 1000 / requests:>8.2f} ms/req")
+
+    def stored_views():
+        with SessionLocal() as db:
+            return db.get(models.Listing, listing_id).views_count
+
+    def read_modify_write():
+        with SessionLocal() as db:
+            listing = db.get(models.Listing, listing_id)
+            listing.views_count = (listing.views_count or 0) + 1
+            db.commit()
+    counter = ViewCounter(flush_interval=0.05)
+    def counted():
+        counter.record(engine, listing_id)
+
+    print(f"\n{THREADS} threads x {requests // THREADS} views of one listing")
+    for name, view in [("commit per view", read_modify_write), ("write-behind", counted)]:
+        before = stored_views()
+        counter.start()
+        def worker():
+            for _ in range(requests // THREADS):
+                try:
+                    view()
+                except Exception: # "database is locked"
+                    pass
+        threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.stop()
+        elapsed = time.perf_counter() - started
+        expected = THREADS * (requests // THREADS)
+        recorded = stored_views() - before
+        print(f"  {name:<18} {expected / elapsed:>8.0f} views/s {recorded:>6} of {expected} recorded")
+    app.dependency_overrides.pop(get_db, None)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 800)
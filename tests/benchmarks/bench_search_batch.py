@@ -0,0 +1,57 @@
+"""
+Benchmark: homepage carousels as N single /api/search calls vs one POST /api/search/batch.
+
+The homepage shows newest items, newest skills and one carousel per featured category. Reports SQL
+statements and latency for both ways of fetching them, with a cold result cache (cleared before
+every round) and a warm one.
+
+    python tests/benchmarks/bench_search_batch.py [listing_count]
+"""
+import logging
+import sys
+
+from common import make_engine, seed_listings, count_statements, timed, serve_app_from
+
+from fastapi.testclient import TestClient
+from application.app import app
+from application.database.database import get_db
+from application.router import search as search_router
+
+CAROUSELS = [
+    {"sort": "newest", "is_skill_sharing": False, "page_size": 12, "view": "compact"},
+    {"sort": "newest", "is_skill_sharing": True, "page_size": 12, "view": "compact"},
+    *[{"category_id": category_id, "include_descendants": True, "sort": "newest", "page_size": 12, "view": "compact"}
+      for category_id in (1, 2, 3)],
+]
+logging.disable(logging.INFO) # The endpoints log every search, which would bury the table
+
+
+def main(listing_count: int):
+    engine, SessionLocal = make_engine()
+    seed_listings(SessionLocal, listing_count)
+
+    serve_app_from(SessionLocal)
+    client = TestClient(app)
+
+    def singles():
+        for spec in CAROUSELS:
+            assert client.get("/api/search", params=spec).status_code == 200
+    def batch():
+        assert client.post("/api/search/batch", json={"searches": CAROUSELS}).status_code == 200
+    def cold(fetch):
+        def run():
+            search_router.search_results_cache.clear()
+            fetch()
+        return run
+
+    print(f"Homepage of {len(CAROUSELS)} carousels over {listing_count} listings (SQLite in-memory)\n")
+    print(f"{'fetch':<22} {'requests':>9} {'cold queries':>13} {'cold ms':>9} {'warm ms':>9}")
+    for name, fetch, requests in [("single searches", singles, len(CAROUSELS)), ("batch", batch, 1)]:
+        with count_statements(engine) as statements:
+            cold(fetch)()
+        print(f"{name:<22} {requests:>9} {len(statements):>13} {timed(cold(fetch), 20):>9.2f} {timed(fetch, 20):>9.2f}")
+    app.dependency_overrides.pop(get_db, None)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
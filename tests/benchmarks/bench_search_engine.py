@@ -0,0 +1,51 @@
+"""
+Benchmark: in-memory search engine vs database search.
+
+Builds the trigram and BM25 indexes over the seeded listings, prints its memory footprint (total and
+per 10k listings) and compares keyword search latency, with and without hydrating the page.
+
+    python tests/benchmarks/bench_search_engine.py [listing_count]
+"""
+import sys
+
+from common import make_engine, seed_listings, timed
+
+from application.database import crud
+from application import search_engine
+
+QUERIES = [
+    ("common word", {"search": "calculator"}),
+    ("rare substring", {"search": "number 4242"}),
+    ("word + filters", {"search": "desk", "max_price": 200, "item_condition": "good"}),
+    ("relevance", {"search": "calculus textbook", "sort": "relevance"}),
+]
+
+
+def main(listing_count: int):
+    engine, SessionLocal = make_engine()
+    seed_listings(SessionLocal, listing_count)
+    db = SessionLocal()
+
+    search_engine.listing_engine.clear()
+    database_ms = {name: timed(lambda: crud.search_listings(db, limit=20, **filters), 50) for name, filters in QUERIES}
+
+    search_engine.build_search_engine(engine)
+    report = search_engine.listing_engine.memory_report()
+    print(f"In-memory search engine over {listing_count} listings (SQLite in-memory)\n")
+    for key, value in report.items():
+        print(f"  {key:<24} {value:>12}")
+    print(f"  {'MiB per 10k listings':<24} {report['bytes_per_10k_listings'] / 2**20:>12.2f}\n")
+
+    print(f"{'query':<16} {'matches':>8} {'index-only ms':>14} {'engine+page ms':>15} {'database ms':>12}")
+    for name, filters in QUERIES:
+        _, total, _ = search_engine.listing_engine.search(limit=20, **filters)
+        index_ms = timed(lambda: search_engine.listing_engine.search(limit=20, **filters), 200)
+        engine_ms = timed(lambda: crud.search_listings(db, limit=20, **filters), 50)
+        print(f"{name:<16} {total:>8} {index_ms:>14.3f} {engine_ms:>15.2f} {database_ms[name]:>12.2f}")
+
+    search_engine.listing_engine.clear()
+    db.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
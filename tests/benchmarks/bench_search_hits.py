@@ -0,0 +1,57 @@
+"""
+Benchmark: cost of serializing a page of search hits.
+
+For a few searches, compares /api/search with the default view (full Listing objects with
+seller, images and category) and view=compact (one joined row per hit): SQL statements per
+request, response size and latency. The result cache is cleared before every request.
+
+    python tests/benchmarks/bench_search_hits.py [listing_count]
+"""
+import logging
+import sys
+
+from common import make_engine, seed_listings, count_statements, timed, serve_app_from
+
+from fastapi.testclient import TestClient
+from application.app import app
+from application.database.database import get_db
+from application.router import search as search_router
+
+SCENARIOS = [
+    ("browse (no filters)", {}),
+    ("keyword", {"q": "calculator"}),
+    ("keyword, 100 per page", {"q": "desk", "page_size": 100}),
+]
+VIEWS = ("full", "compact")
+logging.disable(logging.INFO) # The endpoint logs every request, which would bury the table
+
+
+def main(listing_count: int):
+    engine, SessionLocal = make_engine()
+    seed_listings(SessionLocal, listing_count)
+
+    serve_app_from(SessionLocal)
+    client = TestClient(app)
+
+    def fetch(params):
+        search_router.search_results_cache.clear()
+        response = client.get("/api/search", params=params)
+        assert response.status_code == 200, response.text
+        return response
+
+    print(f"Search hit benchmark over {listing_count} listings (SQLite in-memory)\n")
+    print(f"{'scenario':<24} {'view':<8} {'queries':>8} {'bytes':>9} {'bytes/hit':>10} {'ms':>8}")
+    for name, params in SCENARIOS:
+        for view in VIEWS:
+            view_params = {**params, "view": view} if view != "full" else params
+            with count_statements(engine) as statements:
+                response = fetch(view_params)
+            hits = len(response.json()["results"]) or 1
+            size = len(response.content)
+            print(f"{name:<24} {view:<8} {len(statements):>8} {size:>9} {size // hits:>10} "
+                  f"{timed(lambda: fetch(view_params), 20):>8.2f}")
+    app.dependency_overrides.pop(get_db, None)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,67 @@
+"""
+Benchmark: SQL statements and latency per search.
+
+Compares the previous two-step search (crud.get_listings for the page, then
+crud.count_search_results for the total) with the unified crud.search_listings
+executor, and reports statements per /api/search HTTP request. 'capped ms' is the executor with
+count_limit (counting stops after that many matches, as /api/search does past SEARCH_COUNT_LIMIT).
+
+    python tests/benchmarks/bench_search_queries.py [listing_count]
+"""
+import sys
+
+from common import make_engine, seed_listings, count_statements, timed, serve_app_from
+
+from fastapi.testclient import TestClient
+from application.app import app
+from application.database.database import get_db
+from application.database import crud
+
+COUNT_LIMIT = 100 # Small enough that the benchmark's broad searches hit it
+
+SCENARIOS = [
+    ("browse (no filters)", {}, {}),
+    ("keyword", {"search": "calculator"}, {"q": "calculator"}),
+    ("keyword + filters", {"search": "desk", "max_price": 200, "item_condition": "good"},
+     {"q": "desk", "max_price": 200, "item_condition": "good"}),
+]
+
+
+def main(listing_count: int):
+    engine, SessionLocal = make_engine()
+    seed_listings(SessionLocal, listing_count)
+
+    serve_app_from(SessionLocal)
+    client = TestClient(app)
+
+    print(f"Search benchmark over {listing_count} listings (SQLite in-memory)\n")
+    print(f"{'scenario':<22} {'two-step queries':>16} {'two-step ms':>12} {'executor queries':>17} {'executor ms':>12} {'capped ms':>10} {'HTTP queries':>13}")
+    db = SessionLocal()
+    for name, filters, params in SCENARIOS:
+        def two_step():
+            crud.get_listings(db, skip=0, limit=20, status="approved", **filters)
+            crud.count_search_results(db, status="approved", **filters)
+        def executor():
+            crud.search_listings(db, limit=20, status="approved", **filters)
+        def capped():
+            crud.search_listings(db, limit=20, status="approved", count_limit=COUNT_LIMIT, **filters)
+
+        with count_statements(engine) as statements:
+            two_step()
+        two_step_queries = len(statements)
+        with count_statements(engine) as statements:
+            executor()
+        executor_queries = len(statements)
+        # Whole request, including the lazy loads triggered while serializing each hit
+        with count_statements(engine) as statements:
+            client.get("/api/search", params=params)
+        http_queries = len(statements)
+
+        print(f"{name:<22} {two_step_queries:>16} {timed(two_step, 20):>12.2f} "
+              f"{executor_queries:>17} {timed(executor, 20):>12.2f} {timed(capped, 20):>10.2f} {http_queries:>13}")
+    db.close()
+    app.dependency_overrides.pop(get_db, None)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
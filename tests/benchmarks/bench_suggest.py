@@ -0,0 +1,70 @@
+"""
+Benchmark: /api/search/suggest latency.
+
+Replays typing of a few search terms one keystroke at a time and reports p50/p99 latency of
+crud.get_search_suggestions and of the whole HTTP request, with the in-memory prefix index
+and with the SQL fallback. Target: p99 under 5 ms with the index (compare the HTTP columns
+with the /api/health row, which is the test client's own overhead).
+
+    python tests/benchmarks/bench_suggest.py [listing_count]
+"""
+import logging
+import sys
+import time
+
+from common import make_engine, seed_listings, WORDS, serve_app_from
+
+from fastapi.testclient import TestClient
+from application.app import app
+from application.database.database import get_db
+from application.database import crud
+from application import search_engine
+
+ROUNDS = 20
+logging.getLogger("httpx").setLevel(logging.WARNING) # One INFO line per request would dominate the timings
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+
+def measure(fn, prefixes):
+    samples = []
+    for _ in range(ROUNDS):
+        for prefix in prefixes:
+            started = time.perf_counter()
+            fn(prefix)
+            samples.append((time.perf_counter() - started) * 1000)
+    return percentiles(samples)
+
+
+def main(listing_count: int):
+    engine, SessionLocal = make_engine()
+    seed_listings(SessionLocal, listing_count)
+
+    serve_app_from(SessionLocal)
+    client = TestClient(app)
+    prefixes = [word[:length] for word in WORDS for length in range(1, len(word) + 1)]
+
+    print(f"Suggest benchmark over {listing_count} listings, {len(prefixes)} keystrokes x {ROUNDS} rounds\n")
+    print(f"{'mode':<10} {'crud p50 ms':>12} {'crud p99 ms':>12} {'HTTP p50 ms':>12} {'HTTP p99 ms':>12}")
+    # TestClient itself costs a few ms per request; /api/health shows that floor
+    health_p50, health_p99 = measure(lambda prefix: client.get("/api/health"), prefixes)
+    print(f"{'/api/health':<10} {'':>12} {'':>12} {health_p50:>12.3f} {health_p99:>12.3f}")
+    db = SessionLocal()
+    for mode in ("database", "memory"):
+        if mode == "memory":
+            search_engine.build_search_engine(engine)
+        else:
+            search_engine.listing_engine.clear()
+        crud_p50, crud_p99 = measure(lambda prefix: crud.get_search_suggestions(db, prefix, 10), prefixes)
+        http_p50, http_p99 = measure(lambda prefix: client.get("/api/search/suggest", params={"prefix": prefix}), prefixes)
+        print(f"{mode:<10} {crud_p50:>12.3f} {crud_p99:>12.3f} {http_p50:>12.3f} {http_p99:>12.3f}")
+    search_engine.listing_engine.clear()
+    db.close()
+    app.dependency_overrides.pop(get_db, None)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
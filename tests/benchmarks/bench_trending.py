@@ -0,0 +1,90 @@
+"""
+Benchmark: /api/listings/trending reading the precomputed top-K vs ranking from the activity buckets
+on every request, the cost of the incremental refresh done by each flush, and of unapproving
+trending listings (each leaves the rankings in the moderation transaction).
+
+Simulates a week of traffic (views and a few conversations per hour, skewed towards a small set of
+popular listings) flushed once per simulated hour.
+
+    python tests/benchmarks/bench_trending.py [listing_count] [events_per_hour]
+"""
+import logging
+import random
+import sys
+import time
+
+from common import make_engine, seed_listings, serve_app_from
+
+from fastapi.testclient import TestClient
+from sqlalchemy import true
+from application.app import app
+from application.database import crud, models
+from application import trending
+from application.trending import TrendingRecorder
+
+HOURS = 168
+REQUESTS = 200
+logging.disable(logging.INFO)
+
+
+def main(listing_count: int, events_per_hour: int):
+    engine, SessionLocal = make_engine()
+    seed_listings(SessionLocal, listing_count)
+    with SessionLocal() as db:
+        listing_ids = [row[0] for row in db.query(models.Listing.listing_id).filter(models.Listing.status == "approved")]
+        category_id = db.query(models.Category.category_id).filter(models.Category.parent_id.is_(None)).first()[0]
+
+    rng = random.Random(648)
+    popular = rng.sample(listing_ids, max(1, len(listing_ids) // 50))
+    recorder = TrendingRecorder(flush_interval=3600)
+    clock = {"hour": 480000 - HOURS}
+    trending.current_hour = lambda: clock["hour"]
+    flush_ms = []
+    for _ in range(HOURS):
+        clock["hour"] += 1
+        for _ in range(events_per_hour):
+            listing_id = rng.choice(popular) if rng.random() < 0.5 else rng.choice(listing_ids)
+            if rng.random() < 0.05:
+                recorder.record_conversation(engine, listing_id)
+            else:
+                recorder.record_view(engine, listing_id)
+        started = time.perf_counter()
+        recorder.flush()
+        flush_ms.append((time.perf_counter() - started) * 1000)
+
+    with SessionLocal() as db:
+        buckets = db.query(models.ListingActivity).count()
+        ranked_rows = db.query(models.TrendingListing).count()
+    print(f"{listing_count} listings, {HOURS} hours x {events_per_hour} events: {buckets} activity buckets, {ranked_rows} trending rows")
+    print(f"  flush (buckets + incremental top-K refresh): {sum(flush_ms) / len(flush_ms):8.1f} ms per hour of events")
+
+    serve_app_from(SessionLocal)
+    client = TestClient(app)
+
+    def from_buckets():
+        with engine.connect() as connection:
+            scores = trending._activity_scores(connection, clock["hour"], true())
+        return trending._ranked(scores)[:20]
+
+    print(f"{'method':<34} {'ms/request':>10}")
+    for name, fetch in [
+        ("precomputed top-K (all)", lambda: client.get("/api/listings/trending")),
+        ("precomputed top-K (category)", lambda: client.get("/api/listings/trending", params={"category_id": category_id})),
+        ("ranked from buckets per request", from_buckets),
+    ]:
+        started = time.perf_counter()
+        for _ in range(REQUESTS):
+            fetch()
+        print(f"{name:<34} {(time.perf_counter() - started) * 1000 / REQUESTS:>10.2f}")
+
+    with SessionLocal() as db:
+        ranked = [listing_id for listing_id, _ in trending.get_trending(db, limit=trending.TRENDING_TOP_K)]
+        started = time.perf_counter()
+        for listing_id in ranked:
+            crud.update_listing_status(db, listing_id, "rejected", "Benchmark")
+    print(f"{'unapprove a trending listing':<34} {(time.perf_counter() - started) * 1000 / len(ranked):>10.2f}")
+    app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000, int(sys.argv[2]) if len(sys.argv) > 2 else 500)
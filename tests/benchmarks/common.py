@@ -0,0 +1,117 @@
+"""
+Shared setup for the benchmark scripts in this folder.
+
+The benchmarks are plain scripts (not collected by pytest). Run them from the project root, e.g.:
+    python tests/benchmarks/bench_search_queries.py
+"""
+import os
+import sys
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Add application to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key") # security.py refuses to import without one
+
+from application.database.database import Base
+from application.database import models
+
+WORDS = [
+    "calculus", "textbook", "calculator", "laptop", "charger", "desk", "lamp", "chair", "bike", "helmet",
+    "guitar", "tutoring", "python", "chemistry", "notes", "backpack", "monitor", "keyboard", "mouse", "camera",
+]
+CONDITIONS = ["new", "like_new", "good", "fair", "poor"]
+
+
+def make_engine():
+    """In-memory SQLite engine shared across threads, like the test suite uses."""
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def serve_app_from(SessionLocal) -> None:
+    """Point the app's get_db dependency at `SessionLocal`: one session per request, closed afterwards."""
+    from application.app import app # Only the benchmarks that send requests pay for importing the app
+    from application.database.database import get_db
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+    app.dependency_overrides[get_db] = override_get_db
+
+
+def seed_listings(SessionLocal, count: int, seed: int = 648):
+    """Insert `count` synthetic listings (mostly approved) with sellers, categories and one image each."""
+    rng = random.Random(seed)
+    db = SessionLocal()
+    sellers = [models.User(username=f"seller{i}", email=f"seller{i}@sfsu.edu", hashed_password="x") for i in range(20)]
+    parents = [models.Category(name=name) for name in ("Electronics", "Books", "Furniture")]
+    db.add_all(sellers + parents)
+    db.flush()
+    children = [models.Category(name=f"{parent.name} {i}", parent_id=parent.category_id) for parent in parents for i in range(3)]
+    skills = [models.Category(name="Tutoring", is_skill_category=True)]
+    db.add_all(children + skills)
+    db.flush()
+    categories = parents + children
+    start = datetime(2025, 1, 1)
+    for i in range(count):
+        words = rng.sample(WORDS, 4)
+        is_skill = rng.random() < 0.15
+        listing = models.Listing(
+            seller_id=rng.choice(sellers).user_id,
+            category_id=(skills[0] if is_skill else rng.choice(categories)).category_id,
+            title=" ".join(words[:2]).title(),
+            description=" ".join(words) + f" listing number {i}",
+            search_keywords=", ".join(words[1:3]),
+            price=None if is_skill else round(rng.uniform(1, 500), 2),
+            rate=round(rng.uniform(10, 60), 2) if is_skill else None,
+            rate_type="hourly" if is_skill else None,
+            is_skill_sharing=is_skill,
+            item_condition=rng.choice(CONDITIONS),
+            status="approved" if rng.random() < 0.9 else "pending_approval",
+            views_count=rng.randint(0, 500),
+            created_at=start + timedelta(minutes=i),
+        )
+        listing.images = [models.ListingImage(
+            image_path=f"/static/images/listings/{i}/img.jpg",
+            thumbnail_path=f"/static/images/listings/{i}/thumbs/img.jpg",
+            is_primary=True,
+        )]
+        db.add(listing)
+    db.commit()
+    db.close()
+
+
+@contextmanager
+def count_statements(engine):
+    """Collect the SQL statements executed on `engine` inside the block."""
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def timed(fn, repeat: int):
+    """Run fn `repeat` times and return the mean wall time in milliseconds."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) * 1000 / repeat
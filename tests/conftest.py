@@ -0,0 +1,85 @@
+"""
+Shared test database setup.
+
+Every test module works on one in-memory SQLite database (StaticPool: every session, the TestClient
+and the background flushers share a single connection). A module's own `db` fixture asks for
+`empty_db` (or `api_db` when it sends requests through the app), seeds the rows its tests need and
+yields the session. Modules that run each test against both search paths also ask for
+`search_backend` and call `start_search_backend` once the rows are in.
+"""
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Add application root to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from application.app import app
+from application.database.database import Base, get_db
+from application import search_engine
+from application.trending import trending_recorder
+from application.view_counter import view_counter
+
+# --- Test Database Setup ---
+engine = create_engine(
+    "sqlite:///:memory:",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def override_get_db():
+    database = TestingSessionLocal()
+    try:
+        yield database
+    finally:
+        database.close()
+
+
+def flush_buffered_writes():
+    """Write out the views and trending events buffered for the shared engine, so none reach the next test."""
+    view_counter.flush()
+    trending_recorder.flush()
+
+
+@pytest.fixture
+def empty_db():
+    """A session on freshly created, empty tables; the in-memory search engine is cleared afterwards."""
+    flush_buffered_writes()
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = TestingSessionLocal()
+    yield session
+    flush_buffered_writes()
+    search_engine.listing_engine.clear()
+    session.close()
+
+
+@pytest.fixture
+def api_db(empty_db):
+    """
+    empty_db, also serving the app's requests. Dependency overrides the test adds (signed-in users)
+    are dropped afterwards, and any override installed before it (tests/test_app.py) comes back.
+    """
+    previous_overrides = dict(app.dependency_overrides)
+    app.dependency_overrides[get_db] = override_get_db
+    yield empty_db
+    app.dependency_overrides.clear()
+    app.dependency_overrides.update(previous_overrides)
+
+
+@pytest.fixture(params=["database", "memory"])
+def search_backend(request):
+    """Runs a test once against the database search and once against the in-memory search engine."""
+    return request.param
+
+
+def start_search_backend(backend: str) -> None:
+    """Build the in-memory engine from the rows seeded so far when the test runs against it."""
+    if backend == "memory":
+        search_engine.build_search_engine(engine)
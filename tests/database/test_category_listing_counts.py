@@ -0,0 +1,94 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from application.app import app
+from application.database import crud, models
+
+from conftest import engine
+
+
+@pytest.fixture
+def db(empty_db):
+    seller = models.User(username="seller", email="seller@sfsu.edu", hashed_password="x")
+    electronics, books = models.Category(name="Electronics"), models.Category(name="Books")
+    empty_db.add_all([seller, electronics, books])
+    empty_db.commit()
+    empty_db.add(models.Category(name="Phones", parent_id=electronics.category_id))
+    empty_db.commit()
+    for title, category, status in [
+        ("Laptop charger", "Electronics", "approved"),
+        ("Phone case", "Phones", "approved"),
+        ("Phone stand", "Phones", "approved"),
+        ("Old phone", "Phones", "pending_approval"),
+        ("Novel", "Books", "approved"),
+    ]:
+        empty_db.add(models.Listing(seller_id=seller.user_id, category_id=category_id(empty_db, category), title=title,
+                                    description="for sale", item_condition="good", price=10, status=status))
+    empty_db.commit()
+    yield empty_db
+
+
+def category_id(db, name):
+    return db.query(models.Category).filter_by(name=name).one().category_id
+
+
+def listing(db, title):
+    return db.query(models.Listing).filter_by(title=title).one()
+
+
+def counts(db):
+    """{name: (listing_count, subtree_listing_count)} from the maintained counters."""
+    by_id = crud.get_category_listing_counts(db)
+    return {
+        category.name: (by_id[category.category_id]["listing_count"], by_id[category.category_id]["subtree_listing_count"])
+        for category in db.query(models.Category)
+    }
+
+
+def recounted(db):
+    with engine.begin() as connection:
+        models.rebuild_category_listing_counts(connection)
+    return counts(db)
+
+
+def test_counts_cover_direct_and_subtree_listings(db):
+    assert counts(db) == {"Electronics": (1, 3), "Phones": (2, 2), "Books": (1, 1)}
+
+
+def test_counts_follow_listing_writes(db):
+    seller_id = db.query(models.User).first().user_id
+    crud.update_listing_status_by_admin(db, listing(db, "Old phone").listing_id, "approved")
+    assert counts(db)["Phones"] == (3, 3)
+
+    # Editing an approved listing sends it back to moderation, so it stops counting
+    crud.update_listing(db, listing(db, "Phone case").listing_id, seller_id, {"category_id": category_id(db, "Books")})
+    assert counts(db) == {"Electronics": (1, 3), "Phones": (2, 2), "Books": (1, 1)}
+    crud.update_listing_status(db, listing(db, "Phone case").listing_id, "approved")
+    assert counts(db)["Books"] == (2, 2)
+
+    crud.update_listing(db, listing(db, "Novel").listing_id, seller_id, {"status": "available"})
+    crud.delete_listing(db, listing(db, "Laptop charger").listing_id, seller_id)
+    assert counts(db) == {"Electronics": (0, 2), "Phones": (2, 2), "Books": (1, 1)}
+    assert recounted(db) == counts(db)
+
+
+def test_rebuild_repairs_drift(db):
+    expected = counts(db)
+    db.execute(models.CategoryListingCount.__table__.update().values(approved_count=7))
+    db.commit()
+    assert counts(db) != expected
+    assert recounted(db) == expected
+
+
+def test_categories_endpoint_reads_counters_not_listings(db, api_db):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        response = TestClient(app).get("/api/categories")
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert response.status_code == 200
+    assert {c["name"]: (c["listing_count"], c["subtree_listing_count"]) for c in response.json()} == counts(db)
+    assert not any("FROM listings" in statement for statement in statements)
@@ -0,0 +1,90 @@
+import pytest
+from sqlalchemy import select
+
+from application.database import crud, models
+from application.schemas import CategoryCreate
+
+from conftest import engine, start_search_backend
+
+
+@pytest.fixture
+def db(empty_db, search_backend):
+    seller = models.User(username="seller", email="seller@sfsu.edu", hashed_password="x")
+    electronics = models.Category(name="Electronics")
+    empty_db.add_all([seller, electronics])
+    empty_db.commit()
+    # Added directly rather than through crud.create_category, like seed.py does
+    phones, books = models.Category(name="Phones", parent_id=electronics.category_id), models.Category(name="Books")
+    empty_db.add_all([phones, books])
+    empty_db.commit()
+    for title, category in [("Laptop charger", electronics), ("Phone case", phones), ("Novel", books)]:
+        empty_db.add(models.Listing(seller_id=seller.user_id, category_id=category.category_id, title=title,
+                                    description="for sale", item_condition="good", price=10, status="approved"))
+    empty_db.commit()
+    start_search_backend(search_backend)
+    yield empty_db
+
+
+def category_id(db, name):
+    return db.query(models.Category).filter_by(name=name).one().category_id
+
+
+def titles(db, **filters):
+    page, total, _ = crud.search_listings(db, limit=100, **filters)
+    assert total == len(page)
+    return sorted(listing.title for listing in page)
+
+
+def closure_pairs(db):
+    return set(db.execute(select(models.CategoryClosure.ancestor_id, models.CategoryClosure.descendant_id,
+                                 models.CategoryClosure.depth)).all())
+
+
+def test_include_descendants_covers_the_subtree(db):
+    electronics = category_id(db, "Electronics")
+    assert titles(db, category_id=electronics) == ["Laptop charger"]
+    assert titles(db, category_id=electronics, include_descendants=True) == ["Laptop charger", "Phone case"]
+    assert titles(db, category_id=electronics, include_descendants=True, search="case") == ["Phone case"]
+    assert titles(db, category_id=category_id(db, "Phones"), include_descendants=True) == ["Phone case"]
+
+
+def test_create_category_extends_the_closure(db):
+    phones = category_id(db, "Phones")
+    cases = crud.create_category(db, CategoryCreate(name="Phone cases", parent_id=phones))
+    electronics = category_id(db, "Electronics")
+    assert {(electronics, cases.category_id, 2), (phones, cases.category_id, 1), (cases.category_id, cases.category_id, 0)} \
+        <= closure_pairs(db)
+    listing = db.query(models.Listing).filter_by(title="Phone case").one()
+    crud.update_listing(db, listing.listing_id, listing.seller_id, {"category_id": cases.category_id})
+    crud.update_listing_status(db, listing.listing_id, "approved")
+    assert titles(db, category_id=electronics, include_descendants=True, search="phone") == ["Phone case"]
+
+
+def test_category_moves_renames_and_deletes_reach_subtree_searches(db):
+    electronics, phones, books = category_id(db, "Electronics"), category_id(db, "Phones"), category_id(db, "Books")
+    titles(db, category_id=electronics, include_descendants=True, search="case") # Warms the engine's subtrees
+    db.get(models.Category, phones).parent_id = books
+    db.commit()
+    assert titles(db, category_id=electronics, include_descendants=True, search="case") == []
+    assert titles(db, category_id=books, include_descendants=True, search="case") == ["Phone case"]
+
+    chargers = models.Category(name="Chargers", parent_id=phones)
+    db.add(chargers)
+    db.commit()
+    assert crud.get_search_suggestions(db, "charg") == ["Chargers", "Laptop charger"]
+    db.get(models.Category, chargers.category_id).name = "Cables"
+    db.commit()
+    assert crud.get_search_suggestions(db, "charg") == ["Laptop charger"]
+
+    db.delete(db.get(models.Category, chargers.category_id))
+    db.commit()
+    assert crud.get_search_suggestions(db, "cabl") == []
+    assert titles(db, category_id=books, include_descendants=True, search="case") == ["Phone case"]
+
+
+def test_rebuild_matches_incremental_closure(db):
+    expected = closure_pairs(db)
+    with engine.begin() as connection:
+        connection.execute(models.CategoryClosure.__table__.delete())
+    models.ensure_category_closure(engine)
+    assert closure_pairs(db) == expected
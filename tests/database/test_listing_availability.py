@@ -0,0 +1,141 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, select
+
+from application.app import app
+from application.availability import parse_availability, parse_available_at
+from application.database import crud, models
+from application.schemas import ListingCreate
+from application import search_engine
+from application.search_engine.intervals import IntervalIndex
+
+from conftest import engine, start_search_backend
+
+
+TUE, THU, SAT = 1, 3, 5
+
+
+def create_skill(db, title, availability=None, slots=None):
+    listing = crud.create_listing(db, ListingCreate(
+        title=title, description="lessons", category_id=1, is_skill_sharing=True, rate=20, rate_type="hourly",
+        item_condition="good", availability=availability, availability_slots=slots,
+    ), seller_id=1)
+    return crud.update_listing_status(db, listing.listing_id, "approved")
+
+
+@pytest.fixture
+def db(empty_db, search_backend):
+    empty_db.add_all([
+        models.User(username="seller", email="seller@sfsu.edu", hashed_password="x"),
+        models.Category(name="Tutoring", is_skill_category=True),
+    ])
+    empty_db.commit()
+    create_skill(empty_db, "Guitar lessons", "Tuesday and Thursday evenings")
+    create_skill(empty_db, "Guitar repair", "By appointment")
+    create_skill(empty_db, "Guitar theory", "ignored when slots are given", slots=[
+        {"day_of_week": TUE, "start_minute": 8 * 60, "end_minute": 10 * 60},
+        {"day_of_week": SAT, "start_minute": 0, "end_minute": 24 * 60},
+    ])
+    start_search_backend(search_backend)
+    yield empty_db
+
+
+def titles(db, when, search="guitar"):
+    page, total, _ = crud.search_listings(db, search=search, available_at=parse_available_at(when), limit=100)
+    assert total == len(page)
+    return sorted(listing.title for listing in page)
+
+
+def test_free_text_availability_is_parsed_into_weekly_slots():
+    assert parse_availability("Tuesday and Thursday evenings") == [(TUE, 1020, 1320), (THU, 1020, 1320)]
+    assert parse_availability("Weekends") == [(SAT, 0, 1440), (6, 0, 1440)]
+    assert len(parse_availability("Mornings")) == 7
+    assert parse_availability("By appointment") == [] and parse_availability(None) == []
+    assert parse_available_at("tue 18:30") == (TUE, 1110)
+    assert parse_available_at("2025-05-08T09:15") == (THU, 555) # A Thursday
+    for value in ("weekends 10:00", "tue 25:00", "soon"):
+        with pytest.raises(ValueError):
+            parse_available_at(value)
+
+
+def test_interval_index_stabbing():
+    index = IntervalIndex()
+    index.add(1, [(TUE, 0, 1440)])
+    index.add(2, [(TUE, 1020, 1320)])
+    index.add(3, [(TUE, 1080, 1140), (THU, 600, 660)])
+    assert index.stab(TUE, 1019) == {1}
+    assert index.stab(TUE, 1100) == {1, 2, 3}
+    assert index.stab(TUE, 1140) == {1, 2} # Ends are exclusive
+    index.add(3, [(THU, 600, 660)])
+    index.remove(1)
+    assert index.stab(TUE, 1100) == {2} and index.stab(THU, 600) == {3}
+
+
+def test_available_at_filter(db):
+    assert titles(db, "tue 18:30") == ["Guitar lessons"]
+    assert titles(db, "tue 09:00") == ["Guitar theory"]
+    assert titles(db, "thu 22:00") == []
+    assert titles(db, "sat 23:59") == ["Guitar theory"]
+    assert titles(db, "wed 18:30") == []
+
+
+def test_slots_follow_listing_writes(db):
+    lessons = db.query(models.Listing).filter_by(title="Guitar lessons").one()
+    crud.update_listing(db, lessons.listing_id, 1, {"availability": "Weekend mornings"})
+    crud.update_listing_status(db, lessons.listing_id, "approved")
+    assert titles(db, "tue 18:30") == [] and titles(db, "sun 09:00") == ["Guitar lessons"]
+
+    theory = db.query(models.Listing).filter_by(title="Guitar theory").one()
+    # Resending the unchanged text keeps explicit slots
+    crud.update_listing(db, theory.listing_id, 1, {"availability": theory.availability, "rate": 25})
+    crud.update_listing_status(db, theory.listing_id, "approved")
+    assert titles(db, "tue 09:00") == ["Guitar theory"]
+
+    crud.delete_listing(db, theory.listing_id, 1)
+    assert db.execute(select(models.ListingAvailability).where(models.ListingAvailability.listing_id == theory.listing_id)).first() is None
+
+
+def test_ensure_backfills_listings_without_slots(db):
+    # As in a database that predates the slots: text only
+    db.execute(models.ListingAvailability.__table__.delete())
+    db.execute(models.Listing.__table__.update().values(availability_slots_set=False))
+    db.commit()
+    assert models.ensure_listing_availability(engine) == 2 # Tuesday and Thursday evenings; "ignored when..." has no days
+    assert models.ensure_listing_availability(engine) == 0
+    if search_engine.get_search_engine(db) is not None:
+        search_engine.build_search_engine(engine)
+    assert titles(db, "thu 21:00") == ["Guitar lessons"]
+
+
+def test_ensure_keeps_explicitly_empty_slots(db):
+    create_skill(db, "Guitar jam", "Thursday evenings", slots=[])
+    assert models.ensure_listing_availability(engine) == 0 # Not on this startup, nor any later one
+    assert titles(db, "thu 21:00") == ["Guitar lessons"]
+
+
+def test_available_at_is_an_index_range(db):
+    if search_engine.get_search_engine(db) is not None:
+        pytest.skip("Query plans only apply to the database search")
+    statements = []
+    listener = lambda conn, cursor, statement, parameters, *args: statements.append((statement, parameters))
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        crud.search_listings(db, available_at=(TUE, 1110))
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    statement, parameters = statements[0]
+    plan = " | ".join(row[-1] for row in db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters))
+    assert "SCAN listing_availability" not in plan, plan
+    assert "listing_availability USING COVERING INDEX ix_listing_availability_day_start" in plan, plan
+
+
+def test_search_endpoint_available_at(db, api_db):
+    client = TestClient(app)
+    response = client.get("/api/search", params={"q": "guitar", "available_at": "Saturday 12:00"})
+    assert response.status_code == 200
+    assert [listing["title"] for listing in response.json()["results"]] == ["Guitar theory"]
+    assert client.get("/api/search", params={"available_at": "someday"}).status_code == 400
+    bad_slot = {"day_of_week": 1, "start_minute": 600, "end_minute": 600}
+    assert client.post("/api/search/batch", json={"searches": [{"available_at": "tue"}]}).status_code == 400
+    with pytest.raises(ValueError):
+        ListingCreate(title="x", description="x", category_id=1, availability_slots=[bad_slot])
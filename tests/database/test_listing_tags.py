@@ -0,0 +1,101 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, select
+
+from application.app import app
+from application.database import crud, models
+from application import search_engine
+
+from conftest import engine, start_search_backend
+
+
+@pytest.fixture
+def db(empty_db, search_backend):
+    seller = models.User(username="seller", email="seller@sfsu.edu", hashed_password="x")
+    category = models.Category(name="Books")
+    empty_db.add_all([seller, category])
+    empty_db.commit()
+    for title, keywords, status in [
+        ("Calculus textbook", "Math, calculus, textbook", "approved"),
+        ("Graphing calculator", "math,  Graphing Calculator", "approved"),
+        ("Physics textbook", "physics, textbook", "approved"),
+        ("Math notes", "math, notes", "pending_approval"),
+        ("Desk lamp", None, "approved"),
+    ]:
+        empty_db.add(models.Listing(seller_id=seller.user_id, category_id=category.category_id, title=title,
+                                    description="for sale", search_keywords=keywords, item_condition="good",
+                                    price=10, status=status))
+    empty_db.commit()
+    start_search_backend(search_backend)
+    yield empty_db
+
+
+def titles(db, **filters):
+    page, total, _ = crud.search_listings(db, limit=100, **filters)
+    assert total == len(page)
+    return sorted(listing.title for listing in page)
+
+
+def popular(db):
+    return {row["tag"]: row["listing_count"] for row in crud.get_popular_tags(db, limit=100)}
+
+
+def test_keywords_are_parsed_into_normalized_tags():
+    assert models.parse_tags(" Math,calculus,, MATH , Graphing  Calculator") == ["math", "calculus", "graphing calculator"]
+    assert models.parse_tags(None) == []
+
+
+def test_tag_filter_intersects_tags(db):
+    assert titles(db, tags=["math"]) == ["Calculus textbook", "Graphing calculator"]
+    assert titles(db, tags=["Math", "TEXTBOOK"]) == ["Calculus textbook"]
+    assert titles(db, tags=["math", "physics"]) == []
+    assert titles(db, tags=["textbook"], search="physics") == ["Physics textbook"]
+
+
+def test_tags_and_popularity_follow_listing_writes(db):
+    assert popular(db) == {"math": 2, "textbook": 2, "calculus": 1, "graphing calculator": 1, "physics": 1}
+    seller_id = db.query(models.User).first().user_id
+    notes = db.query(models.Listing).filter_by(title="Math notes").one()
+    crud.update_listing_status_by_admin(db, notes.listing_id, "approved")
+    assert popular(db)["math"] == 3 and popular(db)["notes"] == 1
+    assert "Math notes" in titles(db, tags=["notes"])
+
+    lamp = db.query(models.Listing).filter_by(title="Desk lamp").one()
+    crud.update_listing(db, lamp.listing_id, seller_id, {"search_keywords": "lighting, desk"})
+    crud.update_listing_status(db, lamp.listing_id, "approved")
+    assert titles(db, tags=["lighting"]) == ["Desk lamp"]
+
+    crud.delete_listing(db, notes.listing_id, seller_id)
+    assert "notes" not in popular(db)
+    assert db.execute(select(models.ListingTag).where(models.ListingTag.listing_id == notes.listing_id)).first() is None
+
+    expected = (set(db.execute(select(models.ListingTag.tag, models.ListingTag.listing_id)).all()), popular(db))
+    with engine.begin() as connection:
+        models.rebuild_listing_tags(connection)
+    assert (set(db.execute(select(models.ListingTag.tag, models.ListingTag.listing_id)).all()), popular(db)) == expected
+
+
+def test_tag_filter_is_an_index_lookup(db):
+    if search_engine.get_search_engine(db) is not None:
+        pytest.skip("Query plans only apply to the database search")
+    statements = []
+    listener = lambda conn, cursor, statement, parameters, *args: statements.append((statement, parameters))
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        crud.search_listings(db, tags=["math", "textbook"])
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    statement, parameters = statements[0]
+    plan = " | ".join(row[-1] for row in db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters))
+    assert "SCAN listing_tags" not in plan, plan
+    assert "listing_tags USING COVERING INDEX" in plan, plan
+
+
+def test_popular_tags_endpoint(db, api_db):
+    client = TestClient(app)
+    response = client.get("/api/tags/popular", params={"limit": 2})
+    assert response.status_code == 200
+    assert response.json() == [{"tag": "math", "listing_count": 2}, {"tag": "textbook", "listing_count": 2}]
+    assert [row["tag"] for row in client.get("/api/tags/popular", params={"prefix": "Gra"}).json()] == ["graphing calculator"]
+    search = client.get("/api/search", params={"tags": "math, textbook"}).json()
+    assert [listing["title"] for listing in search["results"]] == ["Calculus textbook"]
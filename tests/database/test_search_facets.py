@@ -0,0 +1,56 @@
+import pytest
+from sqlalchemy import event
+
+from application.database import crud, models
+
+from conftest import engine
+
+
+@pytest.fixture
+def db(empty_db):
+    seller = models.User(username="seller", email="seller@sfsu.edu", hashed_password="x")
+    books = models.Category(name="Books")
+    tutoring = models.Category(name="Tutoring")
+    empty_db.add_all([seller, books, tutoring])
+    empty_db.commit()
+    rows = [
+        # (category, title, condition, price, skill sharing, status)
+        (books, "Calculus textbook", "good", 5, False, "approved"),
+        (books, "Physics textbook", "like_new", 30, False, "approved"),
+        (books, "Chemistry textbook", "good", 300, False, "approved"),
+        (books, "Old textbook", "fair", 20, False, "pending"),
+        (tutoring, "Calculus tutoring", "new", None, True, "approved"),
+    ]
+    for category, title, condition, price, skill, status in rows:
+        empty_db.add(models.Listing(
+            seller_id=seller.user_id, category_id=category.category_id, title=title,
+            description=title, item_condition=condition, price=price, is_skill_sharing=skill, status=status,
+        ))
+    empty_db.commit()
+    yield empty_db
+
+
+def test_facets_count_every_dimension(db):
+    books, tutoring = db.query(models.Category).order_by(models.Category.category_id).all()
+    facets = crud.get_search_facets(db)
+    assert facets["category"] == {str(books.category_id): 3, str(tutoring.category_id): 1}
+    assert facets["item_condition"] == {"good": 2, "like_new": 1, "new": 1}
+    assert facets["is_skill_sharing"] == {"false": 3, "true": 1}
+    assert facets["price"] == {"0-10": 1, "25-50": 1, "250+": 1, "none": 1}
+
+
+def test_facets_follow_filters_and_selection(db):
+    facets = crud.get_search_facets(db, facets=["item_condition"], search="textbook", max_price=100)
+    assert facets == {"item_condition": {"good": 1, "like_new": 1}}
+
+
+def test_facets_use_one_query(db):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        crud.get_search_facets(db, search="calculus")
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert len(statements) == 1
+    assert "GROUP BY" in statements[0]
@@ -0,0 +1,60 @@
+import pytest
+from sqlalchemy import text
+
+from application.database.database import fulltext_available, FULLTEXT_SQLITE_TABLE
+from application.database import crud, models
+
+from conftest import engine
+
+
+@pytest.fixture
+def db(empty_db):
+    seller = models.User(username="seller", email="seller@sfsu.edu", hashed_password="x")
+    category = models.Category(name="Books")
+    empty_db.add_all([seller, category])
+    empty_db.commit()
+    empty_db.add_all([
+        models.Listing(seller_id=seller.user_id, category_id=category.category_id, title="Calculus Textbook",
+                       description="Used for MATH 226", item_condition="good", price=40, status="approved"),
+        models.Listing(seller_id=seller.user_id, category_id=category.category_id, title="Desk Lamp",
+                       description="Bright LED lamp", search_keywords="lighting, study", item_condition="new",
+                       price=15, status="approved"),
+        models.Listing(seller_id=seller.user_id, category_id=category.category_id, title="Graphing calculator",
+                       description="TI-84", item_condition="like_new", price=60, status="pending_approval"),
+    ])
+    empty_db.commit()
+    yield empty_db
+
+
+def titles(listings):
+    return sorted(listing.title for listing in listings)
+
+
+def test_fulltext_index_created_with_tables(db):
+    assert fulltext_available(engine)
+    fts_rows = db.execute(text(f"SELECT count(*) FROM {FULLTEXT_SQLITE_TABLE}")).scalar()
+    assert fts_rows == 3
+
+
+def test_search_matches_substrings_case_insensitively(db):
+    assert titles(crud.get_listings(db, search="CALCUL", status=None)) == ["Calculus Textbook", "Graphing calculator"]
+    assert titles(crud.get_listings(db, search="calcul")) == ["Calculus Textbook"]
+    assert crud.count_search_results(db, search="calcul", status="approved") == 1
+    # search_keywords and description are indexed too
+    assert titles(crud.get_listings(db, search="lighting")) == ["Desk Lamp"]
+    assert titles(crud.get_listings(db, search="math 226")) == ["Calculus Textbook"]
+
+
+def test_short_queries_fall_back_to_ilike(db):
+    assert titles(crud.get_listings(db, search="84", status=None)) == ["Graphing calculator"]
+    assert crud.count_search_results(db, search="84") == 1
+
+
+def test_index_follows_listing_updates_and_deletes(db):
+    lamp = db.query(models.Listing).filter(models.Listing.title == "Desk Lamp").first()
+    crud.update_listing(db, listing_id=lamp.listing_id, seller_id=lamp.seller_id, update_data={"title": "Floor Lamp"})
+    assert crud.count_search_results(db, search="desk") == 0
+    assert crud.count_search_results(db, search="floor") == 1
+
+    crud.delete_listing(db, listing_id=lamp.listing_id, seller_id=lamp.seller_id)
+    assert crud.count_search_results(db, search="lamp") == 0
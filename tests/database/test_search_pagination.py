@@ -0,0 +1,127 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import event
+
+from application.database import crud, models
+
+from conftest import engine
+
+
+@pytest.fixture
+def db(empty_db):
+    seller = models.User(username="seller", email="seller@sfsu.edu", hashed_password="x")
+    category = models.Category(name="Electronics")
+    empty_db.add_all([seller, category])
+    empty_db.commit()
+    base_time = datetime(2025, 5, 1, 12, 0, 0)
+    for i in range(23):
+        empty_db.add(models.Listing(
+            seller_id=seller.user_id, category_id=category.category_id,
+            title=f"Phone charger {i}" if i % 3 == 0 else f"Item {i}",
+            description="works with any phone", item_condition="good", price=10 + i, status="approved",
+            # Several listings share a timestamp so the listing_id tiebreaker matters
+            created_at=base_time + timedelta(minutes=i // 4),
+        ))
+    empty_db.commit()
+    yield empty_db
+
+
+def collect_pages(db, page_size, **filters):
+    seen, cursor = [], None
+    while True:
+        page, total, cursor = crud.search_listings(db, limit=page_size, cursor=cursor, **filters)
+        assert total == crud.count_search_results(db, status="approved", **filters)
+        seen.extend(listing.listing_id for listing in page)
+        if cursor is None:
+            return seen
+
+
+@pytest.mark.parametrize("filters", [{}, {"search": "phone"}, {"search": "charger", "min_price": 12}])
+def test_cursor_pages_match_offset_order(db, filters):
+    expected = [listing.listing_id for listing in crud.get_listings(db, limit=100, **filters)]
+    assert expected
+    assert collect_pages(db, 5, **filters) == expected
+
+
+def test_offset_page_returns_cursor_for_following_page(db):
+    first_page, _, cursor = crud.search_listings(db, limit=10, skip=0)
+    second_page, _, _ = crud.search_listings(db, limit=10, cursor=cursor)
+    offset_second_page, _, _ = crud.search_listings(db, limit=10, skip=10)
+    assert [l.listing_id for l in second_page] == [l.listing_id for l in offset_second_page]
+
+
+def test_last_page_has_no_cursor(db):
+    page, total, cursor = crud.search_listings(db, limit=50)
+    assert len(page) == total == 23
+    assert cursor is None
+
+
+def test_total_is_known_past_the_last_page(db):
+    page, total, cursor = crud.search_listings(db, limit=10, skip=40, search="charger")
+    assert page == [] and cursor is None
+    assert total == 8
+
+
+def test_page_and_total_come_from_one_query(db):
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        crud.search_listings(db, limit=5, search="phone")
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert len(statements) == 1
+
+
+def test_compact_view_selects_hits_in_one_query(db):
+    listing = db.query(models.Listing).filter(models.Listing.title == "Phone charger 3").one()
+    db.add_all([
+        models.ListingImage(listing_id=listing.listing_id, image_path="a.jpg", thumbnail_path="a_thumb.jpg", display_order=0),
+        models.ListingImage(listing_id=listing.listing_id, image_path="b.jpg", thumbnail_path="b_thumb.jpg", display_order=1, is_primary=True),
+    ])
+    db.commit()
+    full, total, cursor = crud.search_listings(db, limit=100, search="phone")
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        hits, compact_total, compact_cursor = crud.search_listings(db, limit=100, search="phone", view="compact")
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert len(statements) == 1
+    assert (compact_total, compact_cursor) == (total, cursor)
+    assert [hit["listing_id"] for hit in hits] == [l.listing_id for l in full]
+    assert all(hit["seller_username"] == "seller" for hit in hits)
+    thumbnails = {hit["listing_id"]: hit["thumbnail_path"] for hit in hits}
+    assert thumbnails[listing.listing_id] == "b_thumb.jpg" # Primary image wins
+    with pytest.raises(ValueError):
+        crud.search_listings(db, view="tiny")
+
+
+def test_invalid_cursors_are_rejected(db):
+    with pytest.raises(ValueError):
+        crud.search_listings(db, cursor="not-a-cursor")
+    _, _, cursor = crud.search_listings(db, limit=5, search="phone")
+    with pytest.raises(ValueError):
+        crud.search_listings(db, cursor=cursor) # Cursor from a search used without the search
+
+
+@pytest.mark.parametrize("filters", [{}, {"search": "phone"}, {"sort": "price_asc"}])
+def test_count_limit_caps_the_total(db, filters):
+    _, exact_total, _ = crud.search_listings(db, limit=5, **filters)
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        page, total, cursor = crud.search_listings(db, limit=5, count_limit=4, **filters)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert len(statements) == 1 and len(page) == 5
+    assert total == 5 < exact_total # count_limit + 1: "more than 4"
+    assert crud.search_listings(db, limit=5, cursor=cursor, count_limit=4, **filters)[1] == 5
+    assert crud.search_listings(db, limit=5, cursor=cursor, **filters)[1] == exact_total # Capped cursor, exact count asked: recounted
+    assert crud.search_listings(db, limit=5, count_limit=exact_total, **filters)[1] == exact_total
+    assert crud.count_search_results(db, status="approved", count_limit=4, search=filters.get("search")) == 5
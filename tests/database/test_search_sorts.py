@@ -0,0 +1,132 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import event
+
+from application.database import crud, models
+
+from conftest import engine
+
+
+SORT_INDEXES = {
+    "price_asc": "ix_listings_status_effective_price",
+    "price_desc": "ix_listings_status_effective_price",
+    "newest": "ix_listings_status_created",
+    "views": "ix_listings_status_views",
+    "seller_rating": "ix_listings_status_seller_rating",
+}
+
+
+@pytest.fixture
+def db(empty_db):
+    sellers = [models.User(username=f"seller{i}", email=f"seller{i}@sfsu.edu", hashed_password="x") for i in range(3)]
+    buyer = models.User(username="buyer", email="buyer@sfsu.edu", hashed_password="x")
+    category = models.Category(name="Electronics")
+    empty_db.add_all([*sellers, buyer, category])
+    empty_db.commit()
+    base_time = datetime(2025, 5, 1, 12, 0, 0)
+    for i in range(30):
+        skill = i % 5 == 0
+        empty_db.add(models.Listing(
+            seller_id=sellers[i % 3].user_id, category_id=category.category_id,
+            title=f"Phone charger {i}" if i % 2 else f"Tutoring {i}",
+            description="for sale", item_condition="good",
+            # Skill listings are priced by their rate; one listing has neither
+            price=None if skill else (i * 7) % 40, rate=None if i == 25 else (15 + i if skill else None),
+            is_skill_sharing=skill, views_count=(i * 11) % 9, status="approved" if i % 7 else "pending_approval",
+            created_at=base_time + timedelta(minutes=i // 4),
+        ))
+    empty_db.commit()
+    listings = empty_db.query(models.Listing).order_by(models.Listing.listing_id).all()
+    for seller, rating in [(sellers[0], 5), (sellers[1], 3)]: # sellers[2] has no reviews
+        listing = next(listing for listing in listings if listing.seller_id == seller.user_id)
+        empty_db.add(models.Review(listing_id=listing.listing_id, reviewer_id=buyer.user_id,
+                                   reviewee_id=seller.user_id, rating=rating))
+    empty_db.commit()
+    yield empty_db
+
+
+def expected_order(db, sort, search=None):
+    """The order each sort promises, computed in Python; NULLs first ascending, last descending."""
+    listings = [l for l in db.query(models.Listing).filter_by(status="approved") if not search or search in l.title.lower()]
+    average = {}
+    for review in db.query(models.Review):
+        average[review.reviewee_id] = float(review.rating)
+    keys = {
+        "price_asc": lambda l: (l.price if l.price is not None else l.rate, l.listing_id),
+        "price_desc": lambda l: (l.price if l.price is not None else l.rate, l.listing_id),
+        "newest": lambda l: (l.created_at, l.listing_id),
+        "views": lambda l: (l.views_count, l.listing_id),
+        "seller_rating": lambda l: (average.get(l.seller_id), l.listing_id),
+    }
+    descending = sort != "price_asc"
+    def null_safe(listing):
+        value, listing_id = keys[sort](listing)
+        return (value is not None, value if value is not None else 0, listing_id)
+    return [listing.listing_id for listing in sorted(listings, key=null_safe, reverse=descending)]
+
+
+@pytest.mark.parametrize("sort", list(SORT_INDEXES))
+@pytest.mark.parametrize("search", [None, "charger"])
+def test_sorted_pages_follow_the_sort_key(db, sort, search):
+    expected = expected_order(db, sort, search)
+    page, total, _ = crud.search_listings(db, limit=100, sort=sort, search=search)
+    assert [listing.listing_id for listing in page] == expected
+    assert total == len(expected)
+    # Keyset pages walk the same order, across NULL sort keys too
+    seen, cursor = [], None
+    while True:
+        page, _, cursor = crud.search_listings(db, limit=4, cursor=cursor, sort=sort, search=search)
+        seen.extend(listing.listing_id for listing in page)
+        if cursor is None:
+            break
+    assert seen == expected
+
+
+def test_sort_keys_follow_listing_and_review_writes(db):
+    listing = db.query(models.Listing).filter(models.Listing.price.is_(None), models.Listing.rate.isnot(None)).first()
+    assert listing.effective_price == listing.rate
+    listing.price = 1.5
+    db.commit()
+    assert listing.effective_price == 1.5
+
+    unrated = db.query(models.User).filter_by(username="seller2").one()
+    assert {l.seller_rating for l in unrated.listings} == {None}
+    review = models.Review(listing_id=unrated.listings[0].listing_id, reviewer_id=db.query(models.User).filter_by(username="buyer").one().user_id,
+                           reviewee_id=unrated.user_id, rating=4)
+    db.add(review)
+    db.commit()
+    db.expire_all()
+    assert {l.seller_rating for l in unrated.listings} == {4.0}
+    db.delete(review)
+    db.commit()
+    db.expire_all()
+    assert {l.seller_rating for l in unrated.listings} == {None}
+
+
+def query_plans(db, **filters):
+    """EXPLAIN QUERY PLAN of every statement a search issues (the page query and its count subquery)."""
+    statements = []
+    listener = lambda conn, cursor, statement, parameters, *args: statements.append((statement, parameters))
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        crud.search_listings(db, limit=20, **filters)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    connection = db.connection()
+    return [
+        " | ".join(row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all())
+        for statement, parameters in statements
+    ]
+
+
+@pytest.mark.parametrize("sort", list(SORT_INDEXES))
+def test_every_sort_mode_is_an_index_scan(db, sort):
+    for cursor_mode in (False, True):
+        cursor = None
+        if cursor_mode:
+            _, _, cursor = crud.search_listings(db, limit=3, sort=sort)
+        plans = query_plans(db, sort=sort, cursor=cursor)
+        page_plan = plans[0]
+        # Sorting the whole filtered table shows up as a temp b-tree; the index must deliver the order instead
+        assert "TEMP B-TREE" not in page_plan, page_plan
+        assert SORT_INDEXES[sort] in page_plan, page_plan
@@ -0,0 +1,47 @@
+import os
+import sys
+
+# Add application to Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from application import cache
+
+
+def test_lru_evicts_least_recently_used():
+    lru = cache.TTLCache("test_lru", maxsize=2, ttl=60)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1 # 'a' is now most recently used
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert lru.get("a") == 1 and lru.get("c") == 3
+    assert lru.stats()["evictions"] == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    ttl_cache = cache.TTLCache("test_ttl", maxsize=10, ttl=5)
+    ttl_cache.set("key", "value")
+    now[0] += 4
+    assert ttl_cache.get("key") == "value"
+    now[0] += 2
+    assert ttl_cache.get("key") is None
+    assert ttl_cache.stats()["expirations"] == 1
+
+
+def test_stats_count_hits_and_misses():
+    stats_cache = cache.TTLCache("test_stats", maxsize=10, ttl=60)
+    stats_cache.get("missing")
+    stats_cache.set("present", True)
+    stats_cache.get("present")
+    stats_cache.get("present")
+    stats = cache.all_cache_stats()["test_stats"]
+    assert (stats["hits"], stats["misses"], stats["size"]) == (2, 1, 1)
+    assert stats["hit_ratio"] == round(2 / 3, 4)
+
+
+def test_generation_bump_changes_generation():
+    before = cache.get_generation("test_table")
+    assert cache.bump_generation("test_table") == before + 1
+    assert cache.get_generation("test_table") == before + 1
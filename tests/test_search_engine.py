@@ -0,0 +1,352 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import event, select
+
+from application.database import crud, models
+from application import search_engine
+from application.search_engine import TrigramIndex, BM25Index, PrefixIndex, Vocabulary, suggest
+
+from conftest import engine, TestingSessionLocal
+
+
+WORDS = ["calculus", "textbook", "calculator", "desk", "lamp", "charger", "laptop", "notes"]
+
+
+@pytest.fixture
+def db(empty_db):
+    seller = models.User(username="seller", email="seller@sfsu.edu", hashed_password="x")
+    books, tech = models.Category(name="Books"), models.Category(name="Tech")
+    empty_db.add_all([seller, books, tech])
+    empty_db.commit()
+    base_time = datetime(2025, 5, 1, 12, 0, 0)
+    for i in range(40):
+        empty_db.add(models.Listing(
+            seller_id=seller.user_id,
+            category_id=(books if i % 2 else tech).category_id,
+            title=f"{WORDS[i % 8].title()} {WORDS[(i + 3) % 8]}",
+            description=f"{WORDS[(i + 5) % 8]} in good shape",
+            search_keywords=WORDS[(i + 1) % 8] if i % 3 == 0 else None,
+            item_condition="good" if i % 4 else "new",
+            price=5 + i * 3,
+            status="approved" if i % 5 else "pending_approval",
+            created_at=base_time + timedelta(minutes=i // 3),
+        ))
+    empty_db.commit()
+    yield empty_db
+
+
+def database_search(db, **filters):
+    search_engine.listing_engine.clear()
+    try:
+        return crud.search_listings(db, limit=100, **filters)
+    finally:
+        search_engine.build_search_engine(engine)
+
+
+@pytest.mark.parametrize("filters", [
+    {"search": "calc"},
+    {"search": "LAMP"},
+    {"search": "desk lamp"},
+    {"search": "good shape", "max_price": 60},
+    {"search": "note", "category_id": 2, "item_condition": "good"},
+    {"search": "zzz"},
+])
+def test_engine_matches_database_search(db, filters):
+    expected, expected_total, _ = database_search(db, **filters)
+    search_engine.build_search_engine(engine)
+    page, total, _ = crud.search_listings(db, limit=100, **filters)
+    assert total == expected_total
+    assert [listing.listing_id for listing in page] == [listing.listing_id for listing in expected]
+
+
+def test_engine_cursor_pages_cover_all_matches(db):
+    expected, _, _ = database_search(db, search="calc")
+    seen, cursor = [], None
+    while True:
+        page, total, cursor = crud.search_listings(db, limit=4, cursor=cursor, search="calc")
+        assert total == len(expected)
+        seen.extend(listing.listing_id for listing in page)
+        if cursor is None:
+            break
+    assert seen == [listing.listing_id for listing in expected]
+
+
+def test_engine_follows_listing_writes(db):
+    search_engine.build_search_engine(engine)
+    def found(query):
+        page, _, _ = crud.search_listings(db, search=query)
+        return [listing.listing_id for listing in page]
+
+    seller = db.query(models.User).first()
+    listing = models.Listing(seller_id=seller.user_id, category_id=1, title="Graphing Zeta Calculator",
+                             description="TI-84", item_condition="like_new", price=60, status="pending_approval")
+    db.add(listing)
+    db.commit()
+    crud.update_listing_status(db, listing.listing_id, "approved")
+    assert found("zeta") == [listing.listing_id]
+
+    # Editing an approved listing sends it back to moderation, so it leaves the index
+    crud.update_listing(db, listing.listing_id, seller.user_id, {"title": "Graphing Omega Calculator"})
+    assert found("zeta") == [] and found("omega") == []
+    crud.update_listing_status_by_admin(db, listing.listing_id, "approved")
+    assert found("omega") == [listing.listing_id]
+
+    crud.delete_listing(db, listing.listing_id, seller.user_id)
+    assert found("omega") == []
+
+
+def test_engine_catches_up_with_writes_made_by_other_workers(db):
+    search_engine.build_search_engine(engine)
+    def found(query):
+        page, _, _ = crud.search_listings(db, search=query)
+        return [listing.listing_id for listing in page]
+
+    # Plain ORM writes publish no listing events, like writes handled by another worker
+    other = TestingSessionLocal()
+    listing = models.Listing(seller_id=1, category_id=1, title="Graphing Zeta Calculator",
+                             description="TI-84", item_condition="like_new", price=60, status="approved")
+    other.add(listing)
+    other.commit()
+    assert found("zeta") == [listing.listing_id]
+
+    other.get(models.Listing, listing.listing_id).title = "Graphing Omega Calculator"
+    other.commit()
+    assert found("zeta") == [] and found("omega") == [listing.listing_id]
+
+    statements = []
+    listener = lambda conn, cursor, statement, parameters, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        assert search_engine.listing_engine.catch_up(db) == 0
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert len(statements) == 1 # The listings version, unchanged since the last catch-up
+
+    other.delete(other.get(models.Listing, listing.listing_id))
+    other.commit()
+    other.close()
+    assert found("omega") == []
+    assert search_engine.listing_engine.listings_version == crud.get_table_versions(db, (models.LISTINGS_VERSION,))[0]
+
+
+def test_short_and_non_approved_searches_use_the_database(db):
+    search_engine.build_search_engine(engine)
+    assert search_engine.get_search_engine(db) is search_engine.listing_engine
+    assert not search_engine.listing_engine.supports(search="ca")
+    assert not search_engine.listing_engine.supports(search="calc", status=None)
+    assert search_engine.listing_engine.supports(search="calc")
+
+
+def test_trigram_index_add_remove_and_report():
+    index = TrigramIndex()
+    index.add(7, ("Desk Lamp", "bright", None))
+    index.add(3, ("Lamp shade", "", "lighting"))
+    assert index.search("LAMP") == [3, 7]
+    assert index.search("shade") == [3]
+    assert index.search("lampbright") == [] # Fields are indexed separately
+    index.remove(3)
+    assert index.search("lamp") == [7]
+    assert index.memory_usage()["postings"] == len({"des", "esk", "sk ", "k l", " la", "lam", "amp", "bri", "rig", "igh", "ght"})
+
+
+def test_bm25_weights_fields_and_requires_every_term():
+    index = BM25Index()
+    index.add(1, ("Desk lamp", None, "bright light for a study desk"))
+    index.add(2, ("Study chair", "desk", "ergonomic"))
+    index.add(3, ("Bookshelf", None, "fits next to a desk"))
+    index.add(4, ("Lamp", None, "no desk mentioned here... or is it"))
+    scores = index.search(["desk"])
+    assert scores[1] > scores[2] > scores[3] # title > search_keywords > description
+    assert set(index.search(["desk", "lamp"])) == {1, 4}
+    assert index.search(["desk", "sofa"]) == {}
+    # Term statistics follow removals: with fewer documents containing 'desk' its idf grows
+    index.remove(3)
+    assert index.search(["desk"])[1] > scores[1]
+    assert 3 not in index.search(["desk"])
+    # Re-adding a document replaces its terms; the terms only it used are gone
+    index.add(2, ("Sofa", None, "ergonomic"))
+    assert 2 not in index.search(["desk"]) and set(index.search(["sofa"])) == {2}
+    assert "chair" not in index._postings and "study" in index._postings # Still in listing 1's description
+
+
+def test_relevance_sort_from_engine_and_database(db):
+    expected_first = db.query(models.Listing).filter(models.Listing.status == "approved",
+                                                     models.Listing.title.ilike("%desk%")).all()
+    for use_engine in (False, True):
+        if use_engine:
+            search_engine.build_search_engine(engine)
+        page, total, _ = crud.search_listings(db, limit=100, search="desk good", sort="relevance")
+        ids = [listing.listing_id for listing in page]
+        assert total == len(ids) > len(expected_first)
+        # Listings with 'desk' in the title rank above those that only mention it in the description
+        assert set(ids[:len(expected_first)]) == {listing.listing_id for listing in expected_first}
+        assert all("desk" in f"{l.title} {l.description} {l.search_keywords}".lower() for l in page)
+
+
+def test_relevance_ranking_agrees_where_the_database_score_can_tell(db):
+    # Without the engine the score is field weights only; these listings differ in which fields
+    # match, so BM25 and the degraded score must give the same order
+    for title, keywords, description in [
+        ("Pine chair", None, "walnut easel"),
+        ("Walnut frame", None, "easel included"),
+        ("Walnut stool", "easel", "sturdy wood"),
+        ("Walnut easel", None, "sturdy wood"),
+    ]:
+        db.add(models.Listing(seller_id=1, category_id=1, title=title, search_keywords=keywords, description=description,
+                              item_condition="good", price=5, status="approved"))
+    db.commit()
+    expected = ["Walnut easel", "Walnut stool", "Walnut frame", "Pine chair"]
+    page, _, _ = database_search(db, search="easel walnut", sort="relevance")
+    assert [listing.title for listing in page] == expected
+    page, _, _ = crud.search_listings(db, limit=100, search="easel walnut", sort="relevance")
+    assert [listing.title for listing in page] == expected
+
+    # Both match whole words: "easels" is a different term
+    db.add(models.Listing(seller_id=1, category_id=1, title="Walnut easels", description="pair",
+                          item_condition="good", price=5, status="approved"))
+    db.commit()
+    page, _, _ = database_search(db, search="easel walnut", sort="relevance")
+    assert "Walnut easels" not in [listing.title for listing in page]
+    page, _, _ = crud.search_listings(db, limit=100, search="easel walnut", sort="relevance")
+    assert "Walnut easels" not in [listing.title for listing in page]
+
+
+@pytest.mark.parametrize("fuzzy", [False, True])
+@pytest.mark.parametrize("search", ["calc", "text", "desk", "lamp good", "good shape notes", "a b c", "desk desk", "calculater shap", "textbok"])
+def test_relevance_matches_the_same_listings_in_engine_and_database(db, search, fuzzy):
+    expected, expected_total, _ = database_search(db, search=search, sort="relevance", fuzzy=fuzzy)
+    page, total, _ = crud.search_listings(db, limit=100, search=search, sort="relevance", fuzzy=fuzzy)
+    assert total == expected_total
+    assert {listing.listing_id for listing in page} == {listing.listing_id for listing in expected}
+
+
+def test_relevance_cursor_pages_match_single_page(db):
+    search_engine.build_search_engine(engine)
+    expected, _, _ = crud.search_listings(db, limit=100, search="lamp", sort="relevance")
+    seen, cursor = [], None
+    while True:
+        page, _, cursor = crud.search_listings(db, limit=3, cursor=cursor, search="lamp", sort="relevance")
+        seen.extend(listing.listing_id for listing in page)
+        if cursor is None:
+            break
+    assert seen == [listing.listing_id for listing in expected]
+
+
+def test_unknown_sort_is_rejected(db):
+    with pytest.raises(ValueError):
+        crud.search_listings(db, search="desk", sort="cheapest")
+
+
+def test_prefix_index_ranks_and_forgets_phrases():
+    index = PrefixIndex()
+    index.add("Calculus Textbook")
+    index.add("calculus  textbook") # Same phrase: one suggestion, weight 2
+    index.add("Graphing Calculator")
+    index.add("Calculators", weight=5)
+    assert index.complete("calc") == ["Calculators", "Calculus Textbook", "Graphing Calculator"]
+    assert index.complete("calc", limit=1) == ["Calculators"]
+    assert index.complete("textbook") == ["Calculus Textbook"]
+    index.remove("Calculus Textbook")
+    assert index.complete("text") == ["Calculus Textbook"]
+    index.remove("calculus textbook")
+    assert index.complete("text") == []
+    assert len(index) == 2
+
+
+def test_prefix_tables_follow_writes(monkeypatch):
+    monkeypatch.setattr(suggest, "TABLE_MIN_KEYS", 4) # Table every prefix of more than a handful of keys
+    index, phrases = PrefixIndex(), {}
+    def expected(prefix, limit=10):
+        ranked = sorted(
+            (-weight, not phrase.lower().startswith(prefix), phrase.lower(), phrase)
+            for phrase, weight in phrases.items()
+            if weight > 0 and any(word.startswith(prefix) for word in phrase.lower().split())
+        )
+        return [rank[3] for rank in ranked[:limit]]
+    def write(phrase, weight):
+        (index.add if weight > 0 else index.remove)(phrase, abs(weight))
+        phrases[phrase] = phrases.get(phrase, 0) + weight
+
+    for i in range(60):
+        write(f"{WORDS[i % 8].title()} {WORDS[(i * 3 + 1) % 8]} {i % 7}", 1 + i % 3)
+    for prefix in ("c", "ca", "calc", "l", "la", "n", "t"):
+        assert index.complete(prefix) == expected(prefix)
+    assert index._tables # The short prefixes were tabled
+    write("Calculus notes 1", 9) # Reweighted, new and removed phrases drop the tables they can change
+    write("Chalk", 4)
+    write(f"{WORDS[1].title()} {WORDS[4]} 1", -2)
+    for prefix in ("c", "ca", "calc", "ch", "l", "la", "n", "t"):
+        assert index.complete(prefix) == expected(prefix)
+    assert index.complete("c", limit=20) == expected("c", 20)
+
+
+def test_vocabulary_corrects_unknown_terms_within_bounded_edits():
+    vocabulary = Vocabulary()
+    vocabulary.add({"calculator", "graphing"})
+    vocabulary.add({"calculator", "textbook"})
+    vocabulary.add({"calculators", "textbook", "desk"})
+    assert vocabulary.corrections("calculater") == ["calculator", "calculators"] # 1 edit, then 2
+    assert vocabulary.corrections("texbook") == ["textbook"]
+    assert vocabulary.corrections("textbook") == [] # Known terms are left alone
+    assert vocabulary.corrections("dsk") == [] # Too short to correct
+    assert vocabulary.corrections("grafing") == [] # 2 edits, but 7 characters only allow one
+    vocabulary.remove({"calculator"})
+    assert vocabulary.corrections("calculater") == ["calculator", "calculators"]
+    vocabulary.remove({"calculator", "graphing"})
+    assert vocabulary.corrections("calculater") == ["calculators"]
+    assert len(vocabulary) == 3
+
+
+@pytest.mark.parametrize("use_engine", [False, True])
+def test_fuzzy_search_matches_misspelled_terms(db, use_engine):
+    if use_engine:
+        search_engine.build_search_engine(engine)
+    exact, exact_total, _ = crud.search_listings(db, limit=100, search="calculator shape", sort="relevance")
+    assert exact_total > 0
+    assert crud.search_listings(db, search="calculater shap", sort="relevance")[1] == 0
+    page, total, _ = crud.search_listings(db, limit=100, search="calculater shape", fuzzy=True)
+    assert total == exact_total
+    assert {listing.listing_id for listing in page} == {listing.listing_id for listing in exact}
+    assert crud.get_search_correction(db, "Calculater texbook") == "calculator textbook"
+    assert crud.get_search_correction(db, "calculator") is None
+
+
+def test_database_vocabulary_follows_listing_writes(db):
+    assert crud.get_search_correction(db, "zetaphone") is None
+    seller = db.query(models.User).first()
+    listing = models.Listing(seller_id=seller.user_id, category_id=1, title="Zetaphone speaker",
+                             description="loud", item_condition="good", price=30, status="pending_approval")
+    db.add(listing)
+    db.commit()
+    crud.update_listing_status(db, listing.listing_id, "approved")
+    statements = []
+    listener = lambda conn, cursor, statement, parameters, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        assert crud.get_search_correction(db, "zetafone") == "zetaphone"
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert len(statements) == 2 and not any("FROM listings" in statement for statement in statements) # Known term, then candidates
+
+    crud.update_listing(db, listing.listing_id, seller_id=seller.user_id, update_data={"title": "Zetaphone"}) # Back to moderation
+    assert crud.get_search_correction(db, "zetafone") is None
+    maintained = sorted(db.execute(select(models.ListingTerm.__table__)).all())
+    with engine.begin() as connection:
+        models.rebuild_listing_terms(connection)
+    assert sorted(db.execute(select(models.ListingTerm.__table__)).all()) == maintained
+
+
+def test_term_postings_follow_listing_writes(db):
+    postings = models.ListingTermPosting.__table__
+    listing = db.query(models.Listing).filter(models.Listing.status == "pending_approval").first()
+    listing.title, listing.search_keywords, listing.description = "Walnut easel", "easel, walnut", "Sturdy walnut"
+    db.commit()
+    assert dict(db.execute(select(postings.c.term, postings.c.fields).where(postings.c.listing_id == listing.listing_id)).all()) == {
+        "walnut": 0b111, "easel": 0b011, "sturdy": 0b100, # Bits in FIELD_WEIGHTS order: title, search_keywords, description
+    }
+    db.delete(db.query(models.Listing).filter(models.Listing.status == "approved").first())
+    db.commit()
+    maintained = sorted(db.execute(select(postings)).all())
+    with engine.begin() as connection:
+        models.rebuild_listing_term_postings(connection)
+    assert sorted(db.execute(select(postings)).all()) == maintained